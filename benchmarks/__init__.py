@@ -0,0 +1 @@
+"""Benchmarks for the image processing pipeline. Run with ``python -m benchmarks.<name>``."""
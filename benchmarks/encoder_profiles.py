@@ -0,0 +1,80 @@
+"""Encode time and output size of each encoder profile per output format.
+
+Encodes a seeded synthetic image with Pillow's defaults and with every
+encoder profile, and reports the time per megapixel, the encoded size and
+the bytes saved relative to the defaults::
+
+    python -m benchmarks.encoder_profiles --size 4000x3000 --json encoders.json
+"""
+
+import argparse
+import io
+import json
+import time
+
+from benchmarks.resample_filters import parse_size, synthetic_image
+from image_handler.encoders import ENCODER_PROFILES, encoder_options
+
+FORMATS = ("JPEG", "PNG", "TIFF", "WEBP")
+
+
+def time_encode(img, pil_format, options, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        buffer = io.BytesIO()
+        start = time.perf_counter()
+        img.save(buffer, pil_format, **options)
+        best = min(best, time.perf_counter() - start)
+    return best, buffer.tell()
+
+
+def run(width, height, formats, repeat, seed=0):
+    img = synthetic_image(width, height, seed=seed)
+    megapixels = width * height / 1e6
+    results = []
+    for pil_format in formats:
+        # Untimed warm-up, so loading the plugin and codec does not count against the defaults
+        img.save(io.BytesIO(), pil_format)
+        default_seconds, default_bytes = time_encode(img, pil_format, {}, repeat)
+        for profile in (None,) + ENCODER_PROFILES:
+            options = encoder_options(pil_format, profile)
+            if profile is None:
+                seconds, size = default_seconds, default_bytes
+            else:
+                seconds, size = time_encode(img, pil_format, options, repeat)
+            results.append({
+                "format": pil_format,
+                "profile": profile or "default",
+                "options": options,
+                "ms_per_megapixel": round(seconds * 1000 / megapixels, 3),
+                "bytes": size,
+                "bytes_saved_pct": round(100 * (default_bytes - size) / default_bytes, 2),
+                "time_vs_default": round(seconds / default_seconds, 3),
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default=(3000, 2000), help="image size, WxH (default: 3000x2000)")
+    parser.add_argument("--formats", nargs="+", type=str.upper, choices=FORMATS, default=list(FORMATS),
+                        help="output formats to test (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best is kept")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic image (default: 0)")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.size[0], args.size[1], args.formats, args.repeat, args.seed)
+
+    print(f"{'format':<6} {'profile':<9} {'ms/MP':>9} {'time':>7} {'bytes':>11} {'saved':>8}")
+    for row in results:
+        print(f"{row['format']:<6} {row['profile']:<9} {row['ms_per_megapixel']:>9.3f} "
+              f"{row['time_vs_default']:>6.2f}x {row['bytes']:>11} {row['bytes_saved_pct']:>7.2f}%")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
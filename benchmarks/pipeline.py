@@ -0,0 +1,223 @@
+"""Throughput of the whole pipeline per resize mode, output format and engine.
+
+Generates a reproducible synthetic corpus in every supported input format
+(.jpg, .png, .tif, .webp) at several resolutions, then runs ``run_batch``
+over it for each combination of resize mode, output format and execution
+engine. Results are written as JSON so two commits can be compared::
+
+    python -m benchmarks.pipeline --json before.json
+    git checkout my-branch
+    python -m benchmarks.pipeline --json after.json --compare before.json
+
+Everything runs offline on the CPU; ``--corpus DIR`` keeps the generated
+images between runs instead of rebuilding them in a temporary folder.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import PIL
+from PIL import Image
+
+from benchmarks.resample_filters import parse_size, synthetic_image
+from image_handler.core import JobSpec, find_images, run_batch
+from image_handler.engine import ENGINE_MODES, create_engine, default_workers
+from image_handler.timing import BatchStats
+
+CORPUS_FORMATS = {
+    "jpg": dict(quality=90),
+    "png": dict(),
+    "tif": dict(compression="tiff_lzw"),
+    "webp": dict(quality=85),
+}
+
+# Resize modes exercised for every run, as JobSpec options
+RESIZE_MODES = {
+    "none": dict(),
+    "exact": dict(width=800, height=600),
+    "percentage": dict(percentage=50),
+    "aspect": dict(aspect_ratio="16:9"),
+}
+
+# "" keeps each image's own format
+OUTPUT_FORMATS = ("", "JPG", "PNG", "TIF", "WEBP")
+
+DEFAULT_SIZES = ((640, 480), (1920, 1080), (4000, 3000))
+
+
+def build_corpus(folder, sizes, count, seed=0):
+    """Write ``count`` images per size and format into ``folder``
+
+    Images are derived from ``seed``, so the same arguments always produce
+    the same pixels; existing files are kept, which lets a corpus be reused.
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    for width, height in sizes:
+        for index in range(count):
+            image = None
+            for extension, options in CORPUS_FORMATS.items():
+                path = folder / f"synthetic_{width}x{height}_{index}.{extension}"
+                if path.exists():
+                    continue
+                if image is None:
+                    image = synthetic_image(width, height, seed=f"{seed}:{width}x{height}:{index}")
+                image.save(path, **options)
+    return folder
+
+
+def corpus_stats(folder):
+    files = find_images(folder)
+    megapixels = 0.0
+    for path in files:
+        with Image.open(path) as img:
+            megapixels += img.size[0] * img.size[1] / 1e6
+    return files, megapixels, sum(path.stat().st_size for path in files)
+
+
+def run_case(files, megapixels, output_path, spec, engine, repeat):
+    """Best-of-``repeat`` run of one scenario; returns a result row"""
+    best = None
+    for _ in range(max(1, repeat)):
+        shutil.rmtree(output_path, ignore_errors=True)
+        output_path.mkdir(parents=True)
+        stats = BatchStats()
+        for _, _, task in run_batch(files, output_path, spec, engine):
+            stats.add(task)
+        stats.stop()
+        if best is None or stats.elapsed < best.elapsed:
+            best = stats
+    report = best.to_dict()
+    return {
+        "images": report["images"],
+        "failed": report["failed"],
+        "seconds": round(report["elapsed"], 4),
+        "images_per_sec": round(report["images_per_sec"], 3),
+        "megapixels_per_sec": round(megapixels / report["elapsed"], 3) if report["elapsed"] else 0.0,
+        "mb_read_per_sec": round(report["mb_read_per_sec"], 3),
+        "mb_written_per_sec": round(report["mb_written_per_sec"], 3),
+        "bytes_out": report["bytes_out"],
+        "stage_p50_ms": {stage: round(values["p50"] * 1000, 3) for stage, values in report["stages"].items()},
+        "stage_p95_ms": {stage: round(values["p95"] * 1000, 3) for stage, values in report["stages"].items()},
+    }
+
+
+def git_commit():
+    """Commit hash of the working tree, when run from a git checkout"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def run(files, megapixels, resize_modes, output_formats, engines, workers, repeat):
+    """Yield a result row per engine, resize mode and output format"""
+    with tempfile.TemporaryDirectory(prefix="image_handler_bench_") as scratch:
+        output_path = Path(scratch) / "out"
+        for engine_mode in engines:
+            engine = create_engine(engine_mode, workers)
+            for resize in resize_modes:
+                for output_format in output_formats:
+                    spec = JobSpec(format=output_format, **RESIZE_MODES[resize])
+                    row = {
+                        "engine": engine.mode,
+                        "workers": engine.workers,
+                        "resize": resize,
+                        "format": output_format or "original",
+                    }
+                    row.update(run_case(files, megapixels, output_path, spec, engine, repeat))
+                    yield row
+
+
+def scenario_key(row):
+    return row["engine"], row["workers"], row["resize"], row["format"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=list(DEFAULT_SIZES),
+                        help="corpus resolutions, WxH (default: 640x480 1920x1080 4000x3000)")
+    parser.add_argument("--count", type=int, default=2, help="images per resolution and format (default: 2)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpus (default: 0)")
+    parser.add_argument("--corpus", help="folder to build (or reuse) the corpus in; default: a temporary folder")
+    parser.add_argument("--resize", nargs="+", choices=list(RESIZE_MODES), default=list(RESIZE_MODES),
+                        help="resize modes to run (default: all)")
+    format_names = [fmt or "ORIGINAL" for fmt in OUTPUT_FORMATS]
+    parser.add_argument("--formats", nargs="+", type=str.upper, choices=format_names, default=format_names,
+                        help="output formats, ORIGINAL keeps each image's format (default: all)")
+    parser.add_argument("--engines", nargs="+", choices=ENGINE_MODES, default=list(ENGINE_MODES),
+                        help="execution engines (default: all)")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="workers for the thread and process engines (default: CPU count)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario, the fastest is kept")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="print the speed-up against an earlier --json file")
+    args = parser.parse_args(argv)
+
+    output_formats = ["" if fmt == "ORIGINAL" else fmt for fmt in args.formats]
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {scenario_key(row): row for row in json.load(f)["results"]}
+
+    temporary = None
+    corpus = args.corpus
+    if corpus is None:
+        temporary = tempfile.TemporaryDirectory(prefix="image_handler_corpus_")
+        corpus = temporary.name
+    try:
+        start = time.perf_counter()
+        build_corpus(corpus, args.sizes, args.count, args.seed)
+        files, megapixels, total_bytes = corpus_stats(corpus)
+        print(f"Corpus: {len(files)} images, {megapixels:.1f} MP, {total_bytes / 1024 ** 2:.1f} MB "
+              f"(built in {time.perf_counter() - start:.1f}s)")
+
+        print(f"{'engine':<8} {'resize':<11} {'format':<9} {'seconds':>8} {'img/s':>8} {'MP/s':>8} "
+              f"{'MB/s in':>8}{'  vs base' if baseline else ''}")
+        results = []
+        for row in run(files, megapixels, args.resize, output_formats, args.engines, args.workers, args.repeat):
+            results.append(row)
+            line = (f"{row['engine']:<8} {row['resize']:<11} {row['format']:<9} {row['seconds']:>8.3f} "
+                    f"{row['images_per_sec']:>8.2f} {row['megapixels_per_sec']:>8.2f} {row['mb_read_per_sec']:>8.2f}")
+            before = baseline.get(scenario_key(row))
+            if before is not None and row["seconds"]:
+                line += f"  {before['seconds'] / row['seconds']:>6.2f}x"
+            if row["failed"]:
+                line += f"  ({row['failed']} failed)"
+            print(line)
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+
+    if args.json:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "pillow": PIL.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "sizes": [f"{width}x{height}" for width, height in args.sizes],
+                "count": args.count,
+                "seed": args.seed,
+                "images": len(files),
+                "megapixels": round(megapixels, 3),
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Time per megapixel and quality of each resampling filter.
+
+Resizes synthetic images with every filter at several size ratios and
+reports the time per source megapixel plus the PSNR against a LANCZOS
+reference, so the cheapest filter that meets a quality bar can be picked::
+
+    python -m benchmarks.resample_filters --size 4000x3000 --ratios 0.5 0.25 0.1 --json filters.json
+"""
+
+import argparse
+import json
+import math
+import random
+import time
+
+from PIL import Image, ImageChops, ImageStat
+
+from image_handler.resample import RESAMPLE_FILTERS
+
+
+def synthetic_image(width, height, seed=None):
+    """Build an RGB test image with gradients, detail and noise
+
+    The noise is random unless a ``seed`` is given, which makes the image
+    byte-for-byte reproducible.
+    """
+    gradient = Image.linear_gradient("L").resize((width, height))
+    radial = Image.radial_gradient("L").resize((width, height))
+    detail = Image.effect_mandelbrot((width, height), (-2.0, -1.2, 0.8, 1.2), 64)
+    if seed is None:
+        noise = Image.effect_noise((width, height), 48)
+    else:
+        # Uniform noise of the same strength as effect_noise, from a fixed seed
+        noise = Image.frombytes("L", (width, height), random.Random(seed).randbytes(width * height))
+        noise = noise.point(lambda value: 128 + (value - 128) * 48 // 128)
+    return Image.merge("RGB", (gradient, ImageChops.add(radial, noise, scale=2.0), detail))
+
+
+def psnr(reference, image):
+    """Peak signal-to-noise ratio in dB between two same-sized images (None if identical)"""
+    stat = ImageStat.Stat(ImageChops.difference(reference, image))
+    mse = sum(rms ** 2 for rms in stat.rms) / len(stat.rms)
+    if mse == 0:
+        return None
+    return round(10 * math.log10(255 ** 2 / mse), 2)
+
+
+def time_resize(img, size, resample, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = img.resize(size, resample)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(width, height, ratios, repeat):
+    img = synthetic_image(width, height)
+    img.load()
+    megapixels = width * height / 1e6
+    results = []
+    for ratio in ratios:
+        size = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+        reference = img.resize(size, RESAMPLE_FILTERS["LANCZOS"])
+        for name, resample in RESAMPLE_FILTERS.items():
+            seconds, result = time_resize(img, size, resample, repeat)
+            results.append({
+                "filter": name,
+                "ratio": ratio,
+                "source": f"{width}x{height}",
+                "target": f"{size[0]}x{size[1]}",
+                "ms_per_megapixel": round(seconds * 1000 / megapixels, 3),
+                "psnr_vs_lanczos": psnr(reference, result),
+            })
+    return results
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default=(3000, 2000), help="source size, WxH (default: 3000x2000)")
+    parser.add_argument("--ratios", type=float, nargs="+", default=[2.0, 0.75, 0.5, 0.25, 0.1],
+                        help="output/input size ratios to test")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best is kept")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = run(args.size[0], args.size[1], args.ratios, args.repeat)
+
+    print(f"{'ratio':>6}  {'filter':<9} {'target':>11} {'ms/MP':>9} {'PSNR dB':>8}")
+    for row in results:
+        quality = "ref" if row["psnr_vs_lanczos"] is None else f"{row['psnr_vs_lanczos']:.2f}"
+        print(f"{row['ratio']:>6}  {row['filter']:<9} {row['target']:>11} "
+              f"{row['ms_per_megapixel']:>9.3f} {quality:>8}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
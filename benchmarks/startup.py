@@ -0,0 +1,191 @@
+"""Cold start time of the command line and the GUI, with a regression gate.
+
+Every scenario runs in a fresh interpreter, like a user launching the tool,
+and is timed end to end; the bare interpreter start-up is reported alongside
+so the share of the time spent in this package stays visible. The run fails
+(exit status 1) when a scenario's median exceeds its budget, or when
+importing the CLI or the GUI module loads one of the heavy modules that
+should only be imported on first use (Pillow, multiprocessing, ctypes)::
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --json before.json
+    python -m benchmarks.startup --compare before.json --budget cli-help=150
+
+Bytecode is compiled up front, so a stale ``__pycache__`` does not count
+against the first run. The GUI window is only timed when a display is
+available.
+"""
+
+import argparse
+import compileall
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.pipeline import git_commit
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Scenario -> Python arguments; the GUI ones run from the project root
+SCENARIOS = {
+    "python": ["-c", "pass"],
+    "cli-help": ["-m", "image_handler", "--help"],
+    "cli-run": ["-m", "image_handler", "{input}", "{output}", "--format", "WEBP", "--percentage", "50", "-q"],
+    "gui-import": ["-c", "import main"],
+    "gui-window": ["-c", "import tkinter, main; root = tkinter.Tk(); main.ImageProcessorApp(root); "
+                         "root.update(); root.destroy()"],
+}
+
+# Median milliseconds a scenario may take before the gate fails
+DEFAULT_BUDGETS = {
+    "cli-help": 200,
+    "cli-run": 200,
+    "gui-import": 200,
+}
+
+# Modules that importing the CLI or the GUI must not load
+HEAVY_MODULES = ("PIL", "multiprocessing", "ctypes", "concurrent.futures.process")
+
+IMPORT_CHECKS = {
+    "image_handler.cli": "import image_handler.cli",
+    "main": "import main",
+}
+
+
+def parse_budget(value):
+    name, _, milliseconds = value.partition("=")
+    if name not in SCENARIOS or not milliseconds:
+        raise argparse.ArgumentTypeError(f"expected SCENARIO=MS with a scenario from: {', '.join(SCENARIOS)}")
+    return name, float(milliseconds)
+
+
+def _environment():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def time_scenario(arguments, repeat, env):
+    """Wall time in seconds of each of ``repeat`` runs, after one untimed warm-up"""
+    times = []
+    for run in range(repeat + 1):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *arguments], cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        elapsed = time.perf_counter() - start
+        if result.returncode:
+            raise RuntimeError(f"{' '.join(arguments)} failed: {result.stderr.decode(errors='replace').strip()}")
+        if run:
+            times.append(elapsed)
+    return times
+
+
+def heavy_imports(statement, env):
+    """Heavy modules loaded by ``statement`` in a fresh interpreter"""
+    check = (f"import sys, json; {statement}; "
+             f"print(json.dumps([name for name in {list(HEAVY_MODULES)!r} if name in sys.modules]))")
+    result = subprocess.run([sys.executable, "-c", check], cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"{statement} failed: {result.stderr.strip()}")
+    return json.loads(result.stdout)
+
+
+def _has_display():
+    if sys.platform in ("win32", "darwin"):
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="scenarios to time (default: all; gui-window needs a display)")
+    parser.add_argument("--repeat", type=int, default=10, help="timed runs per scenario (default: 10)")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[], metavar="SCENARIO=MS",
+                        help="median budget of a scenario in ms, repeatable (defaults: "
+                             + ", ".join(f"{name}={ms}" for name, ms in DEFAULT_BUDGETS.items()) + ")")
+    parser.add_argument("--no-gate", action="store_true", help="report only, always exit with status 0")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="JSON", help="print the change against an earlier --json file")
+    args = parser.parse_args(argv)
+
+    budgets = dict(DEFAULT_BUDGETS, **dict(args.budget))
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {row["scenario"]: row for row in json.load(f)["results"]}
+
+    compileall.compile_dir(ROOT / "image_handler", quiet=1)
+    compileall.compile_file(ROOT / "main.py", quiet=1)
+    env = _environment()
+    failures = []
+    results = []
+    with tempfile.TemporaryDirectory(prefix="image_handler_startup_") as scratch:
+        from PIL import Image
+
+        input_path = Path(scratch) / "in"
+        input_path.mkdir()
+        Image.new("RGB", (64, 48), (200, 120, 40)).save(input_path / "startup.jpg", quality=90)
+
+        print(f"{'scenario':<12} {'min ms':>8} {'median ms':>10} {'max ms':>8} {'budget':>8}"
+              f"{'  vs base' if baseline else ''}")
+        for name in args.scenarios:
+            if name == "gui-window" and not _has_display():
+                print(f"{name:<12} skipped (no display)")
+                continue
+            arguments = [argument.format(input=input_path, output=Path(scratch) / "out")
+                         for argument in SCENARIOS[name]]
+            times = [seconds * 1000 for seconds in time_scenario(arguments, max(1, args.repeat), env)]
+            row = {
+                "scenario": name,
+                "min_ms": round(min(times), 1),
+                "median_ms": round(statistics.median(times), 1),
+                "max_ms": round(max(times), 1),
+                "budget_ms": budgets.get(name),
+            }
+            results.append(row)
+            budget = budgets.get(name)
+            line = (f"{name:<12} {row['min_ms']:>8.1f} {row['median_ms']:>10.1f} {row['max_ms']:>8.1f} "
+                    f"{budget if budget is not None else '-':>8}")
+            before = baseline.get(name)
+            if before is not None:
+                line += f"  {row['median_ms'] - before['median_ms']:>+7.1f} ms"
+            if budget is not None and row["median_ms"] > budget:
+                line += "  OVER BUDGET"
+                failures.append(f"{name}: median {row['median_ms']:.1f} ms exceeds the {budget:g} ms budget")
+            print(line)
+
+    imports = {}
+    for module, statement in IMPORT_CHECKS.items():
+        loaded = imports[module] = heavy_imports(statement, env)
+        print(f"import {module}: {'loads ' + ', '.join(loaded) if loaded else 'no heavy modules'}")
+        if loaded:
+            failures.append(f"import {module} loads {', '.join(loaded)} eagerly")
+
+    if args.json:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+            },
+            "results": results,
+            "heavy_imports": imports,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures and not args.no_gate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    # Pillow plugins are imported by name on first use (image_handler.core.PILLOW_PLUGINS)
+    hiddenimports=['PIL.JpegImagePlugin', 'PIL.PngImagePlugin', 'PIL.TiffImagePlugin', 'PIL.WebPImagePlugin'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,57 @@
+"""Image Handler processing library.
+
+Exports are imported on first access, so ``python -m image_handler`` and the
+GUI do not load every module (and Pillow) before they have anything to do.
+"""
+
+import importlib
+
+# ``prescan`` is both a module and a function: importing the module (as the
+# CLI does) would rebind the package attribute, so it is imported up front
+from .prescan import BatchPlan, prescan
+
+# Exported name -> module it is defined in
+_EXPORTS = {
+    "ArchiveWriter": "archive",
+    "is_archive": "archive",
+    "scan_archive": "archive",
+    "FORMAT_MAP": "core",
+    "OUTPUT_FORMATS": "core",
+    "SUPPORTED_EXTENSIONS": "core",
+    "ArchiveMember": "core",
+    "JobPlan": "core",
+    "JobSpec": "core",
+    "Rendition": "core",
+    "ScanEntry": "core",
+    "find_images": "core",
+    "parse_renditions": "core",
+    "process_image": "core",
+    "run_batch": "core",
+    "ENCODER_PROFILES": "encoders",
+    "ENGINE_MODES": "engine",
+    "ProcessPoolEngine": "engine",
+    "SerialEngine": "engine",
+    "ThreadPoolEngine": "engine",
+    "create_engine": "engine",
+    "default_workers": "engine",
+    "parse_size": "scanner",
+    "scan_images": "scanner",
+    "BatchStats": "timing",
+    "FolderWatcher": "watch",
+    "watch_folder": "watch",
+}
+
+__all__ = sorted([*_EXPORTS, "BatchPlan", "prescan"])
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # Later lookups skip this function
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
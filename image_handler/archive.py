@@ -0,0 +1,143 @@
+"""Streaming ZIP/TAR input and output.
+
+Images are read straight from archive members, without extracting them to
+disk, and results can be written into an output archive as they complete
+instead of as loose files. TAR input is read as a stream, so even compressed
+multi-GB tarballs are scanned front to back in a single pass.
+"""
+
+import io
+import os
+import tarfile
+import time
+import zipfile
+from pathlib import PurePosixPath
+
+from .core import SUPPORTED_EXTENSIONS, ArchiveMember
+from .scanner import is_excluded, name_matches, size_matches
+
+# Suffixes recognised as archives, longest first so ".tar.gz" wins over ".gz"
+TAR_SUFFIXES = {
+    ".tar.gz": "gz", ".tgz": "gz",
+    ".tar.bz2": "bz2", ".tbz2": "bz2",
+    ".tar.xz": "xz", ".txz": "xz",
+    ".tar": "",
+}
+ARCHIVE_SUFFIXES = (".zip",) + tuple(sorted(TAR_SUFFIXES, key=len, reverse=True))
+
+
+def archive_suffix(path):
+    """Return the archive suffix of ``path`` (e.g. ``".tar.gz"``), or None"""
+    name = os.fspath(path).lower()
+    for suffix in ARCHIVE_SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+def is_archive(path):
+    return archive_suffix(path) is not None
+
+
+def _wanted(relative, size, include, exclude, min_size, max_size, extensions):
+    # Excluded folders apply to every member below them
+    if any(is_excluded(parent, exclude) for parent in relative.parents if parent != PurePosixPath()):
+        return False
+    return name_matches(relative, include, exclude, extensions) and size_matches(size, min_size, max_size)
+
+
+def _member_path(name):
+    # Drop absolute and parent parts so a member can never escape the output folder
+    parts = [part for part in PurePosixPath(name.replace("\\", "/")).parts if part not in ("/", "..", ".")]
+    return PurePosixPath(*parts) if parts else None
+
+
+def scan_archive(archive_path, include=(), exclude=(), min_size=None, max_size=None,
+                 extensions=SUPPORTED_EXTENSIONS):
+    """Yield an ArchiveMember for every matching image in a ZIP or TAR archive
+
+    The archive counterpart of ``scanner.scan_images``: members are read into
+    memory one at a time as the consumer asks for them, so only the images in
+    flight are held at once. The whole archive is always scanned, with the
+    same include/exclude patterns and size limits as folders.
+    """
+    suffix = archive_suffix(archive_path)
+    if suffix is None:
+        raise ValueError(f"Not a supported archive: {archive_path}")
+    filters = (include, exclude, min_size, max_size, extensions)
+
+    if suffix == ".zip":
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                relative = _member_path(info.filename)
+                if info.is_dir() or relative is None or not _wanted(relative, info.file_size, *filters):
+                    continue
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                yield ArchiveMember(relative, archive.read(info), mtime)
+    else:
+        # "r|" reads the archive as a non-seekable stream, member by member
+        with tarfile.open(archive_path, f"r|{TAR_SUFFIXES[suffix] or '*'}") as archive:
+            for info in archive:
+                relative = _member_path(info.name)
+                if not info.isfile() or relative is None or not _wanted(relative, info.size, *filters):
+                    continue
+                yield ArchiveMember(relative, archive.extractfile(info).read(), info.mtime)
+
+
+class ArchiveWriter:
+    """Write results into a ZIP or TAR archive as they complete
+
+    Pass it to ``core.run_batch`` in place of the output folder: images are
+    then encoded in memory and appended in order, without ever touching the
+    disk as loose files. TAR archives are written as a stream; ZIP members
+    are stored uncompressed since image data does not deflate well.
+    """
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        suffix = archive_suffix(self.path)
+        if suffix is None:
+            raise ValueError(f"Not a supported archive: {self.path}")
+        self.count = 0
+        if suffix == ".zip":
+            self._archive = zipfile.ZipFile(self.path, "w", zipfile.ZIP_STORED, allowZip64=True)
+            self._tar = False
+        else:
+            self._archive = tarfile.open(self.path, f"w|{TAR_SUFFIXES[suffix]}")
+            self._tar = True
+        self._names = set()
+
+    def _unique_name(self, arcname):
+        # Two inputs can map to one output name (a.png and a.jpg converted to JPG)
+        candidate = arcname
+        number = 1
+        while candidate.as_posix() in self._names:
+            candidate = arcname.with_name(f"{arcname.stem}_{number}{arcname.suffix}")
+            number += 1
+        self._names.add(candidate.as_posix())
+        return candidate
+
+    def add(self, arcname, data):
+        """Append ``data`` as ``arcname`` and return the member name used"""
+        arcname = self._unique_name(PurePosixPath(arcname))
+        now = time.time()
+        if self._tar:
+            info = tarfile.TarInfo(arcname.as_posix())
+            info.size = len(data)
+            info.mtime = now
+            self._archive.addfile(info, io.BytesIO(data))
+        else:
+            info = zipfile.ZipInfo(arcname.as_posix(), time.localtime(now)[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            self._archive.writestr(info, data)
+        self.count += 1
+        return arcname.as_posix()
+
+    def close(self):
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,128 @@
+"""Content-addressed cache of encoded outputs, for duplicate input images."""
+
+import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+
+from .fastcopy import atomic_output
+from .manifest import file_digest
+
+CACHE_DIRNAME = ".image_handler_cache"
+DEFAULT_CACHE_SIZE = 1024 ** 3  # 1 GiB
+CACHE_VERSION = 1
+
+
+def link_or_copy(source, target):
+    """Hard-link ``source`` to ``target``, copying when linking is not possible"""
+    try:
+        if os.path.samefile(source, target):
+            return  # Linked by an earlier run already
+    except OSError:
+        pass  # No target yet
+    with atomic_output(target) as temp:
+        try:
+            os.link(source, temp)
+        except OSError:
+            shutil.copyfile(source, temp)
+
+
+class ResultCache:
+    """LRU cache of encoded outputs keyed on input content digest + job fingerprint
+
+    Objects are hard links (or copies) of earlier outputs kept in
+    ``cache_dir``. When an identical image is processed again with the same
+    settings the cached output is linked into place instead of re-encoding.
+    The total size of cached objects is capped at ``max_bytes``; the least
+    recently used objects are evicted first.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.index_path = self.cache_dir / "index.json"
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> {"file", "bytes", "task"}, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+        self._evict()
+
+    def _load(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                for key, entry in data["entries"]:
+                    self.entries[key] = entry
+                    self.total_bytes += entry["bytes"]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def key_for(self, source_path, fingerprint):
+        """Cache key of ``source_path`` processed with the given job fingerprint"""
+        return hashlib.sha1(f"{file_digest(source_path)}:{fingerprint}".encode("ascii")).hexdigest()
+
+    def lookup(self, key):
+        """Return the entry for ``key`` (counting a hit or miss)"""
+        entry = self.entries.get(key)
+        if entry is not None and not (self.objects_dir / entry["file"]).exists():
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def restore(self, entry, output_file):
+        """Place the cached object of ``entry`` at ``output_file``"""
+        link_or_copy(self.objects_dir / entry["file"], output_file)
+
+    def store(self, key, output_file, task):
+        """Add a freshly encoded output to the cache"""
+        if key in self.entries:
+            return
+        size = os.path.getsize(output_file)
+        if size > self.max_bytes:
+            return
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        name = key + Path(output_file).suffix
+        link_or_copy(output_file, self.objects_dir / name)
+        self.entries[key] = {
+            "file": name,
+            "bytes": size,
+            "task": {k: task[k] for k in ("original_size", "new_size", "changes")},
+        }
+        self.total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        # Least recently used entries are first
+        while self.total_bytes > self.max_bytes and self.entries:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, key):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry["bytes"]
+        try:
+            os.unlink(self.objects_dir / entry["file"])
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        """Write the index atomically (temp file + rename)"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": CACHE_VERSION, "entries": list(self.entries.items())}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self):
+        """Summary used in the [END] log line"""
+        return f"Cache: {self.hits} hit(s), {self.misses} miss(es)"
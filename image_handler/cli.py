@@ -0,0 +1,273 @@
+"""Command line interface: ``python -m image_handler INPUT OUTPUT [options]``"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from .archive import ARCHIVE_SUFFIXES, ArchiveWriter, is_archive, scan_archive
+from .core import OUTPUT_FORMATS, JobSpec, Rendition, run_batch
+from .cache import CACHE_DIRNAME, DEFAULT_CACHE_SIZE, ResultCache
+from .encoders import ENCODER_PROFILES
+from .engine import BATCH_ENGINE_MODES, DISTRIBUTED_MODE, WorkerError, create_engine, default_workers
+from .journal import BatchJournal
+from .manifest import Manifest, plan_fingerprint
+from .prescan import calibrate_throughput, prescan
+from .resample import RESAMPLE_FILTERS
+from .scanner import parse_size, scan_images
+from .timing import BatchStats
+from .watch import DEFAULT_SETTLE, watch_folder
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m image_handler",
+        description="Batch resize, convert and re-stamp the DPI of images without a GUI.",
+    )
+    parser.add_argument("input", help="folder or ZIP/TAR archive containing the images to process")
+    parser.add_argument("output", help="folder where processed images are written, or an archive to write them "
+                                       f"into ({', '.join(ARCHIVE_SUFFIXES)})")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="also process sub-folders, mirroring them in the output folder")
+    parser.add_argument("--include", action="append", default=[], metavar="PATTERN",
+                        help="only process files matching this glob (name or relative path); repeatable")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="skip files and folders matching this glob; repeatable")
+    parser.add_argument("--min-size", type=parse_size, help="skip files smaller than this, e.g. 10K")
+    parser.add_argument("--max-size", type=parse_size, help="skip files larger than this, e.g. 50M")
+    parser.add_argument("--format", default="", type=str.upper, choices=[""] + list(OUTPUT_FORMATS),
+                        help="output format (default: keep original)")
+    parser.add_argument("--dpi", type=int, help="DPI to apply to the output images")
+    parser.add_argument("--width", type=int, help="output width in pixels (requires --height)")
+    parser.add_argument("--height", type=int, help="output height in pixels (requires --width)")
+    parser.add_argument("--percentage", type=float, help="scale images by this percentage")
+    parser.add_argument("--aspect", dest="aspect_ratio", help="aspect ratio to apply, e.g. 16:9")
+    parser.add_argument("--resample", type=str.upper, choices=list(RESAMPLE_FILTERS),
+                        help="resampling filter (default: Pillow's default for the image mode)")
+    parser.add_argument("--encoder", type=str.lower, choices=list(ENCODER_PROFILES),
+                        help="encoder profile for the output format (default: Pillow's save defaults)")
+    parser.add_argument("--fast-downscale", action="store_true",
+                        help="decode JPEGs at reduced scale and use reducing_gap when shrinking")
+    parser.add_argument("--memory-budget", type=parse_size, metavar="SIZE",
+                        help="large-image mode: per-worker memory budget, e.g. 512M; huge TIFFs are resized "
+                             "strip by strip and fewer images run at once when they would not fit")
+    parser.add_argument("--rendition", action="append", default=[], metavar="NAME:SPEC",
+                        help="write an extra output per image from the same decode, e.g. "
+                             "'thumb:width=200,height=150,format=WEBP' (keys: format, dpi, width, height, size, "
+                             "percentage, aspect, encoder); repeatable, replaces --format/--dpi and the resize options")
+    parser.add_argument("--engine", default="serial", choices=BATCH_ENGINE_MODES,
+                        help="execution engine (default: serial); 'distributed' serves work units to worker "
+                             "processes, started locally and/or with 'python -m image_handler.distributed'")
+    parser.add_argument("--workers", type=int,
+                        help="number of workers for the thread and process engines, or local worker processes "
+                             "for the distributed engine (default: CPU count, 0 with --listen)")
+    parser.add_argument("--listen", metavar="HOST:PORT",
+                        help="with --engine distributed, accept remote workers on this address, e.g. 0.0.0.0:7463")
+    parser.add_argument("--secret",
+                        help="with --listen, secret remote workers must present (default: $IMAGE_HANDLER_SECRET)")
+    parser.add_argument("--prefetch", type=parse_size, metavar="SIZE",
+                        help="read upcoming files into memory in a reader thread, up to SIZE ahead, e.g. 256M")
+    parser.add_argument("--write-behind", type=parse_size, metavar="SIZE",
+                        help="encode in memory and write outputs from a writer thread, up to SIZE queued, e.g. 256M")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and process images as they are added to or changed in INPUT "
+                             "(inotify on Linux, polling elsewhere); stop with Ctrl+C")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE, metavar="SECONDS",
+                        help=f"with --watch, how long a file must stay unchanged before it is processed "
+                             f"(default: {DEFAULT_SETTLE:g})")
+    parser.add_argument("--poll", action="store_true", help="with --watch, poll the folder instead of using inotify")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the interrupted batch journaled in OUTPUT, skipping the images it finished "
+                             "(pass the same options as the interrupted run)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip images whose output is up to date according to the output folder manifest")
+    parser.add_argument("--force", action="store_true",
+                        help="with --incremental, reprocess every image but still update the manifest")
+    parser.add_argument("--hash", action="store_true",
+                        help="with --incremental, store content hashes so touched but unchanged files are skipped")
+    parser.add_argument("--cache", nargs="?", const="", metavar="DIR",
+                        help=f"reuse outputs for byte-identical inputs; cache folder defaults to OUTPUT/{CACHE_DIRNAME}")
+    parser.add_argument("--cache-size", type=parse_size, default=DEFAULT_CACHE_SIZE,
+                        help="maximum size of the cache, least recently used outputs are evicted (default: 1G)")
+    parser.add_argument("--plan", action="store_true",
+                        help="only pre-scan the image headers and print the batch plan (dry run)")
+    parser.add_argument("--plan-json", metavar="FILE", help="also write the batch plan to FILE as JSON")
+    parser.add_argument("--largest-first", action="store_true",
+                        help="pre-scan the headers and process the largest images first (input folders only)")
+    parser.add_argument("--stats-json", metavar="FILE",
+                        help="write per-stage timings (p50/p95/max) and throughput of the batch to FILE as JSON")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print the summary")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Same precedence as the GUI: only one resize mode applies per run
+    resize_modes = [name for name, value in (("--width/--height", args.width or args.height),
+                                             ("--percentage", args.percentage),
+                                             ("--aspect", args.aspect_ratio)) if value]
+    if len(resize_modes) > 1:
+        parser.error(f"choose only one resize mode, got: {', '.join(resize_modes)}")
+
+    try:
+        spec = JobSpec(
+            format=args.format,
+            dpi=args.dpi,
+            width=args.width,
+            height=args.height,
+            percentage=args.percentage,
+            aspect_ratio=args.aspect_ratio,
+            resample=args.resample,
+            fast_downscale=args.fast_downscale,
+            encoder=args.encoder,
+            memory_budget=args.memory_budget,
+            renditions=tuple(Rendition.parse(value) for value in args.rendition),
+        )
+        plan = spec.compile()
+        if args.engine == DISTRIBUTED_MODE:
+            engine = create_engine(args.engine, args.workers, listen=args.listen, secret=args.secret)
+        elif args.listen:
+            raise ValueError("--listen needs --engine distributed")
+        else:
+            engine = create_engine(args.engine, args.workers or default_workers())
+    except ValueError as e:
+        parser.error(str(e))
+
+    input_path = Path(args.input)
+    output_path = Path(args.output)
+    input_archive = is_archive(input_path) and input_path.is_file()
+    output_archive = is_archive(output_path)
+    if not input_archive and not input_path.is_dir():
+        parser.error(f"Input folder does not exist: {input_path}")
+    if output_archive and (args.incremental or args.cache is not None):
+        parser.error("--incremental and --cache need an output folder, not an archive")
+    if args.rendition and args.cache is not None:
+        parser.error("--cache cannot be used with --rendition")
+    if args.watch and (input_archive or output_archive):
+        parser.error("--watch needs an input and an output folder, not an archive")
+    if args.watch and (args.plan or args.plan_json or args.largest_first):
+        parser.error("--watch cannot be combined with --plan, --plan-json or --largest-first")
+    if args.largest_first and input_archive:
+        parser.error("--largest-first needs an input folder: archive members are read in archive order")
+    if args.resume and (output_archive or args.watch):
+        parser.error("--resume needs an output folder and cannot be combined with --watch")
+    if args.watch and input_path.resolve() == output_path.resolve():
+        parser.error("--watch needs an output folder other than the input folder")
+    if not args.plan:
+        (output_path.parent if output_archive else output_path).mkdir(parents=True, exist_ok=True)
+
+    log = (lambda message: None) if args.quiet else print
+    if engine.mode == DISTRIBUTED_MODE:
+        log(f"[CONFIG] Engine: distributed ({engine.local_workers} local worker(s)"
+            + (f", listening on {args.listen} for remote workers)" if args.listen else ")"))
+    else:
+        log(f"[CONFIG] Engine: {engine.mode} ({engine.workers} worker(s))")
+    if args.memory_budget:
+        log(f"[CONFIG] Large-image mode: {args.memory_budget // 1024 ** 2} MiB per worker")
+    if args.prefetch or args.write_behind:
+        log(f"[CONFIG] Staged I/O: prefetch {(args.prefetch or 0) // 1024 ** 2} MiB, "
+            f"write-behind {(args.write_behind or 0) // 1024 ** 2} MiB")
+    if plan.renditions:
+        log(f"[CONFIG] Renditions: {', '.join(output.name for output in plan.renditions)}")
+    scan_options = dict(include=args.include, exclude=args.exclude, min_size=args.min_size, max_size=args.max_size)
+    if args.watch:
+        image_files = None  # Files are picked up by the watcher
+    elif input_archive:
+        image_files = scan_archive(input_path, **scan_options)
+    else:
+        image_files = scan_images(input_path, recursive=args.recursive, **scan_options)
+
+    if args.plan or args.plan_json or args.largest_first:
+        batch_plan = prescan(image_files, plan, calibrate_throughput(plan), engine.workers)
+        for line in batch_plan.summary_lines():
+            print(line) if args.plan else log(line)
+        if args.plan_json:
+            with open(args.plan_json, "w", encoding="utf-8") as f:
+                json.dump(batch_plan.to_dict(), f, indent=2)
+        if args.plan:
+            return 0
+        if args.largest_first:
+            image_files = batch_plan.ordered()
+        elif input_archive:
+            image_files = scan_archive(input_path, **scan_options)  # The plan does not keep member data
+        else:
+            image_files = [image.item for image in batch_plan.images]
+
+    journal = None
+    if not output_archive and not args.watch:
+        # Progress journal in the output folder, so an interrupted batch can be resumed
+        journal = BatchJournal.open(output_path, resume=args.resume, input_path=input_path)
+        if args.resume:
+            if not journal.resumable:
+                parser.error(f"--resume: no interrupted batch in {output_path}")
+            if not journal.same_input(input_path):
+                parser.error(f"--resume: the interrupted batch read {journal.input_path}, not {input_path}")
+            if journal.header["fingerprint"] != plan_fingerprint(plan):
+                parser.error("--resume: the options differ from the interrupted batch")
+            log(f"[RESUME] Resuming the batch from {journal.input_path}: {len(journal.done)} image(s) already done")
+
+    manifest = Manifest.load(output_path, use_hash=args.hash) if args.incremental else None
+    cache = None
+    if args.cache is not None:
+        cache = ResultCache(args.cache or output_path / CACHE_DIRNAME, args.cache_size)
+
+    total = 0
+    failed = 0
+    skipped = 0
+    aborted = False
+    writer = ArchiveWriter(output_path) if output_archive else None
+    stats = BatchStats()
+    batch_options = dict(manifest=manifest, force=args.force, cache=cache, prefetch_bytes=args.prefetch,
+                         write_behind_bytes=args.write_behind)
+    if args.watch:
+        on_watch = lambda watcher: log(f"[WATCH] Watching {input_path} ({watcher.backend}), press Ctrl+C to stop")
+        results = watch_folder(input_path, output_path, plan, engine, recursive=args.recursive, settle=args.settle,
+                               use_inotify=False if args.poll else None, on_watch=on_watch, **scan_options,
+                               **batch_options)
+    else:
+        results = run_batch(image_files, writer or output_path, plan, engine, journal=journal, **batch_options)
+    try:
+        for image_file, log_lines, task in results:
+            total += 1
+            log(f"[PROCESS] [{total}] Processing: {task['filename']}")
+            for line in log_lines:
+                log(line)
+            stats.add(task)
+            if task["status"].startswith("✗"):
+                failed += 1
+            elif "Skipped" in task["status"]:
+                skipped += 1
+    except KeyboardInterrupt:
+        if not args.watch:
+            raise
+        results.close()  # Saves the manifest and cache
+    except WorkerError as e:
+        print(f"[ERROR] Processing aborted: {e}", file=sys.stderr)
+        aborted = True
+    finally:
+        if writer is not None:
+            writer.close()
+        stats.stop()
+    if args.watch:
+        log(f"[WATCH] Stopped after {total} image(s)")
+    else:
+        log(f"[SCAN] Found {total} image(s) in input {'archive' if input_archive else 'folder'}")
+
+    if journal is not None and journal.resumed:
+        log(f"[RESUME] Skipped {journal.resumed} image(s) finished before the interruption")
+
+    summary = f"[END] Processed {total - failed - skipped} of {total} images ({skipped} up to date, {failed} failed)"
+    if cache is not None:
+        summary += f". {cache.stats()}"
+    print(summary)
+    for line in stats.summary_lines():
+        log(line)
+    if args.stats_json:
+        stats.save_json(args.stats_json)
+    return 1 if failed or aborted else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1056 @@
+"""GUI-free image processing pipeline.
+
+Everything needed to resize, convert and re-stamp the DPI of a folder of
+images lives here so it can be used from the Tk app, the command line or any
+other script without a display.
+"""
+
+import importlib
+import io
+import os
+import re
+from collections import deque, namedtuple
+from dataclasses import dataclass, replace
+from functools import partial
+from pathlib import Path, PurePath, PurePosixPath
+from typing import Optional
+
+from .encoders import encoder_options, encoder_profile
+from .fastcopy import atomic_output, clone_or_copy
+from .largeimage import image_bytes, needs_strips, resize_in_strips
+from .manifest import plan_fingerprint
+from .metadata import set_dpi, sniff_format
+from .resample import DEFAULT_REDUCING_GAP, draft_image, resample_filter, resize_image
+from .timing import StageTimer
+
+# Only supported formats (PNG, JPEG, JPG, TIFF, WEBP)
+SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp'}
+
+# Output formats offered to the user (both .tif and .tiff, .jpg and .jpeg)
+OUTPUT_FORMATS = ("JPG", "JPEG", "PNG", "TIF", "TIFF", "WEBP")
+
+# User-facing format names to the format names Pillow expects
+FORMAT_MAP = {
+    'JPG': 'JPEG',
+    'JPEG': 'JPEG',
+    'PNG': 'PNG',
+    'TIF': 'TIFF',
+    'TIFF': 'TIFF',
+    'WEBP': 'WEBP'
+}
+
+# Pillow plugin of every supported format. Pillow is imported on first use and
+# only these plugins are loaded: anything that makes Pillow look up a format it
+# has not seen yet (``Image.registered_extensions``, saving to a buffer, opening
+# a buffer that is not one of its five common formats) imports every plugin it
+# ships, which costs more than the rest of Pillow's startup
+PILLOW_PLUGINS = {
+    'JPEG': 'JpegImagePlugin',
+    'PNG': 'PngImagePlugin',
+    'TIFF': 'TiffImagePlugin',
+    'WEBP': 'WebPImagePlugin',
+}
+
+# ``path`` is the file to process, ``relative`` its path below the scan root,
+# used to mirror the folder structure into the output folder
+ScanEntry = namedtuple("ScanEntry", ["path", "relative"])
+
+
+class ArchiveMember(namedtuple("ArchiveMember", ["relative", "data", "mtime"])):
+    """An image read from a ZIP/TAR archive (see ``archive.scan_archive``)
+
+    ``relative`` is the member path inside the archive and ``data`` its bytes,
+    so it can be shipped to worker processes like a plain path. Prefetched
+    files (see ``pipeline.load_file``) are held the same way.
+    """
+
+    __slots__ = ()
+
+    @property
+    def name(self):
+        return self.relative.name
+
+    @property
+    def stem(self):
+        return self.relative.stem
+
+
+# Placeholder texts the GUI shows in the width/height fields
+AUTO_SIZE_PLACEHOLDERS = ("Auto-calculated per image", "Will be calculated")
+
+
+def _parse_positive_int(name, value):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name} value: '{value}'. Must be a positive integer")
+    if number <= 0:
+        raise ValueError(f"Invalid {name} value: '{value}'. Must be a positive integer")
+    return number
+
+
+@dataclass(frozen=True)
+class JobSpec:
+    """Options for one batch, mirroring the fields of the GUI
+
+    ``format`` is the output format chosen by the user (empty keeps the
+    original). Resizing uses width/height when both are set, otherwise the
+    percentage, otherwise the aspect ratio (``"16:9"``). ``resample`` names a
+    Pillow filter (empty uses Pillow's default) and ``fast_downscale`` enables
+    JPEG draft decoding and reducing_gap resampling for shrinking jobs.
+    ``memory_budget`` (bytes per worker) enables large-image mode: TIFFs that
+    would not fit are resized strip by strip, and fewer images are run at
+    once when their projected memory would exceed the budget.
+    ``renditions`` (Rendition tuple) replace the single output described by
+    format, DPI and resize options with several outputs per decoded image.
+    ``encoder`` names an encoder profile (fast, balanced, smallest) applied
+    to whatever format is written; empty keeps Pillow's save defaults.
+    """
+
+    format: str = ""
+    dpi: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    percentage: Optional[float] = None
+    aspect_ratio: Optional[str] = None
+    resample: Optional[str] = None
+    fast_downscale: bool = False
+    memory_budget: Optional[int] = None
+    renditions: tuple = ()
+    encoder: Optional[str] = None
+
+    def __post_init__(self):
+        if self.format and self.format.upper() not in OUTPUT_FORMATS:
+            raise ValueError(f"Invalid format: '{self.format}'. Must be one of: {', '.join(OUTPUT_FORMATS)}")
+        if self.dpi is not None:
+            _parse_positive_int("DPI", self.dpi)
+        if self.width is not None:
+            _parse_positive_int("width", self.width)
+        if self.height is not None:
+            _parse_positive_int("height", self.height)
+        if (self.width is None) != (self.height is None):
+            raise ValueError("Please provide both Width and Height values, or leave both empty")
+        if self.percentage is not None and self.percentage <= 0:
+            raise ValueError(f"Invalid percentage value: '{self.percentage}'. Must be a positive number")
+        if self.aspect_ratio:
+            if ':' not in self.aspect_ratio:
+                raise ValueError(f"Invalid aspect ratio format: '{self.aspect_ratio}'. "
+                                 "Must be in format 'width:height' (e.g., 16:9)")
+            try:
+                ar_w, ar_h = map(int, self.aspect_ratio.split(':'))
+            except ValueError:
+                ar_w = ar_h = 0
+            if ar_w <= 0 or ar_h <= 0:
+                raise ValueError(f"Invalid aspect ratio value: '{self.aspect_ratio}'. "
+                                 "Must be two positive integers separated by ':'")
+        resample_filter(self.resample)
+        encoder_profile(self.encoder)
+        if self.memory_budget is not None and self.memory_budget <= 0:
+            raise ValueError(f"Invalid memory budget: '{self.memory_budget}'. Must be a positive size")
+        if self.renditions:
+            if self.format or self.dpi or self.width or self.percentage or self.aspect_ratio:
+                raise ValueError("Renditions replace the format, DPI and resize options; leave those empty")
+            names = [rendition.name for rendition in self.renditions]
+            if len(set(names)) != len(names):
+                raise ValueError(f"Rendition names must be unique, got: {', '.join(names)}")
+
+    @classmethod
+    def from_strings(cls, format="", dpi="", width="", height="", percentage="", aspect_ratio="",
+                     resample="", fast_downscale=False, memory_budget="", renditions="", encoder=""):
+        """Build a spec from raw text field values, as typed in the GUI"""
+        from .scanner import parse_size
+
+        dpi = dpi.strip()
+        width = width.strip()
+        height = height.strip()
+        percentage = percentage.strip()
+        aspect_ratio = aspect_ratio.strip()
+
+        if width in AUTO_SIZE_PLACEHOLDERS:
+            width = ""
+        if height in AUTO_SIZE_PLACEHOLDERS:
+            height = ""
+
+        if percentage:
+            try:
+                percentage_float = float(percentage)
+            except ValueError:
+                raise ValueError(f"Invalid percentage value: '{percentage}'. Must be a positive number")
+        else:
+            percentage_float = None
+
+        return cls(
+            format=format.strip(),
+            dpi=_parse_positive_int("DPI", dpi) if dpi else None,
+            width=_parse_positive_int("width", width) if width else None,
+            height=_parse_positive_int("height", height) if height else None,
+            percentage=percentage_float,
+            aspect_ratio=aspect_ratio or None,
+            resample=resample.strip().upper() or None,
+            fast_downscale=bool(fast_downscale),
+            memory_budget=parse_size(memory_budget) if memory_budget.strip() else None,
+            renditions=parse_renditions(renditions),
+            encoder=encoder.strip().lower() or None,
+        )
+
+    def compile(self):
+        """Precompute everything the per-image hot path needs"""
+        return JobPlan.from_spec(self)
+
+
+_RENDITION_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Keys accepted by Rendition.parse, with the JobSpec.from_strings argument they set
+_RENDITION_KEYS = {
+    "format": "format",
+    "dpi": "dpi",
+    "width": "width",
+    "height": "height",
+    "percentage": "percentage",
+    "aspect": "aspect_ratio",
+    "encoder": "encoder",
+}
+
+
+@dataclass(frozen=True)
+class Rendition:
+    """One output of a multi-output job
+
+    ``name`` is appended to the output file name (``photo_thumb.webp``); the
+    other fields mean the same as in JobSpec. Resampling, fast downscale and
+    the memory budget are shared by all renditions of a job; the job's
+    encoder profile applies unless the rendition names its own.
+    """
+
+    name: str
+    format: str = ""
+    dpi: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    percentage: Optional[float] = None
+    aspect_ratio: Optional[str] = None
+    encoder: Optional[str] = None
+
+    def __post_init__(self):
+        if not _RENDITION_NAME.match(self.name or ""):
+            raise ValueError(f"Invalid rendition name: '{self.name}'. Use letters, digits, '-' and '_'")
+        resize_modes = [value for value in (self.width or self.height, self.percentage, self.aspect_ratio) if value]
+        if len(resize_modes) > 1:
+            raise ValueError(f"Rendition '{self.name}' must use only one of width/height, percentage or aspect")
+        self.spec()
+
+    def spec(self, parent=None):
+        """JobSpec of this rendition, sharing the processing options of ``parent``"""
+        return JobSpec(
+            format=self.format,
+            dpi=self.dpi,
+            width=self.width,
+            height=self.height,
+            percentage=self.percentage,
+            aspect_ratio=self.aspect_ratio,
+            resample=parent.resample if parent else None,
+            fast_downscale=parent.fast_downscale if parent else False,
+            memory_budget=parent.memory_budget if parent else None,
+            encoder=self.encoder or (parent.encoder if parent else None),
+        )
+
+    @classmethod
+    def parse(cls, text):
+        """Parse ``"name:key=value,..."``, e.g. ``"thumb:width=200,height=150,format=WEBP"``
+
+        Keys are format, dpi, width, height, percentage, aspect and encoder,
+        plus ``size=WxH`` as a shorthand for width and height.
+        """
+        name, _, options = text.partition(":")
+        values = {}
+        for option in options.split(","):
+            if not option.strip():
+                continue
+            key, sep, value = option.partition("=")
+            key = key.strip().lower()
+            if key == "size" and sep:
+                width, _, height = value.strip().lower().partition("x")
+                values["width"], values["height"] = width, height
+            elif key in _RENDITION_KEYS and sep:
+                values[_RENDITION_KEYS[key]] = value
+            else:
+                raise ValueError(f"Invalid rendition option: '{option.strip()}'. "
+                                 f"Use key=value with keys: {', '.join(_RENDITION_KEYS)}, size")
+        spec = JobSpec.from_strings(**values)
+        return cls(name=name.strip(), format=spec.format, dpi=spec.dpi, width=spec.width, height=spec.height,
+                   percentage=spec.percentage, aspect_ratio=spec.aspect_ratio, encoder=spec.encoder)
+
+
+def parse_renditions(value):
+    """Parse a ``;`` separated list of renditions, as typed in the GUI"""
+    return tuple(Rendition.parse(text) for text in value.split(";") if text.strip())
+
+
+# Resize kinds of a compiled plan
+RESIZE_NONE = None
+RESIZE_EXACT = "size"
+RESIZE_PERCENTAGE = "percentage"
+RESIZE_ASPECT = "aspect"
+
+
+@dataclass(frozen=True)
+class JobPlan:
+    """Immutable, precompiled form of a JobSpec
+
+    Built once per batch so that processing an image only reads plain
+    attributes: no string parsing, validation or format lookups per file.
+    """
+
+    resize: Optional[str] = RESIZE_NONE
+    size: Optional[tuple] = None  # (w, h) for RESIZE_EXACT
+    percentage: Optional[float] = None
+    aspect: Optional[tuple] = None  # (ar_w, ar_h) for RESIZE_ASPECT
+    aspect_label: str = ""
+    format_label: str = ""  # user-selected format, e.g. "JPG"; empty keeps the original
+    pil_format: Optional[str] = None
+    extension: str = ""
+    convert_rgb: bool = False
+    dpi: Optional[int] = None
+    dpi_tuple: Optional[tuple] = None
+    resample: Optional[int] = None  # Pillow filter constant, None for Pillow's default
+    fast_downscale: bool = False
+    reducing_gap: float = DEFAULT_REDUCING_GAP
+    memory_budget: Optional[int] = None  # bytes per worker, None disables large-image mode
+    encoder: Optional[str] = None  # encoder profile, None keeps Pillow's save defaults
+    dpi_only: bool = False  # only the DPI changes, so the file can be copied with new metadata
+    passthrough: bool = False  # nothing changes, so same-format outputs are plain file copies
+    name: str = ""  # rendition name, appended to output file names
+    renditions: tuple = ()  # JobPlan per rendition, replacing the single output
+
+    @classmethod
+    def from_spec(cls, spec):
+        if spec.width and spec.height:
+            resize = RESIZE_EXACT
+        elif spec.percentage:
+            resize = RESIZE_PERCENTAGE
+        elif spec.aspect_ratio:
+            resize = RESIZE_ASPECT
+        else:
+            resize = RESIZE_NONE
+
+        format_label = spec.format
+        format_upper = format_label.upper()
+        return cls(
+            resize=resize,
+            size=(spec.width, spec.height) if resize == RESIZE_EXACT else None,
+            percentage=spec.percentage if resize == RESIZE_PERCENTAGE else None,
+            aspect=tuple(map(int, spec.aspect_ratio.split(':'))) if resize == RESIZE_ASPECT else None,
+            aspect_label=spec.aspect_ratio if resize == RESIZE_ASPECT else "",
+            format_label=format_label,
+            pil_format=FORMAT_MAP.get(format_upper, format_upper) if format_label else None,
+            # Keep user's chosen extension (.jpg or .jpeg, .tif or .tiff)
+            extension=format_label.lower(),
+            convert_rgb=format_upper in ('JPEG', 'JPG'),
+            dpi=spec.dpi,
+            dpi_tuple=(spec.dpi, spec.dpi) if spec.dpi else None,
+            resample=resample_filter(spec.resample),
+            fast_downscale=spec.fast_downscale,
+            memory_budget=spec.memory_budget,
+            encoder=encoder_profile(spec.encoder),
+            dpi_only=bool(spec.dpi) and resize == RESIZE_NONE and not spec.encoder and not spec.renditions,
+            passthrough=not spec.dpi and resize == RESIZE_NONE and not spec.encoder and not spec.renditions,
+            renditions=tuple(replace(cls.from_spec(rendition.spec(spec)), name=rendition.name)
+                             for rendition in spec.renditions),
+        )
+
+    def output_size(self, size):
+        """Size an image of ``size`` is resized to, or ``size`` when not resizing"""
+        w, h = size
+        if self.resize == RESIZE_EXACT:
+            return self.size
+        if self.resize == RESIZE_PERCENTAGE:
+            return int(w * self.percentage / 100), int(h * self.percentage / 100)
+        if self.resize == RESIZE_ASPECT:
+            ar_w, ar_h = self.aspect
+            return w, int(w * ar_h / ar_w)
+        return size
+
+
+def _resize(img, size, plan, log):
+    if plan.memory_budget and needs_strips(img, plan.memory_budget):
+        resized, bands = resize_in_strips(img, size, plan.resample, plan.memory_budget)
+        if resized is not None:
+            log(f"  [RESIZE] Large image decoded in {bands} strip band(s) to stay within the memory budget")
+            return resized
+    img, draft_scale = resize_image(img, size, plan.resample, plan.fast_downscale, plan.reducing_gap)
+    if draft_scale > 1:
+        log(f"  [RESIZE] Fast decode at 1/{draft_scale} scale")
+    return img
+
+
+def output_file_for(image_file, output_path, plan):
+    """Path the output of ``image_file`` is written to
+
+    With no ``output_path`` this is just the file name, as used for members
+    of an output archive.
+    """
+    if output_path is None:
+        output_path = PurePosixPath()
+    suffix = f"_{plan.name}" if plan.name else ""
+    if plan.pil_format:
+        # FIX 4: Use the user-selected format for extension, not the PIL format
+        return output_path / f"{image_file.stem}{suffix}.{plan.extension}"
+    if suffix:
+        return output_path / f"{image_file.stem}{suffix}{PurePath(image_file.name).suffix}"
+    return output_path / image_file.name
+
+
+def _write(data, output_file):
+    # Never truncate the old output in place (see fastcopy.atomic_output)
+    with atomic_output(output_file) as temp:
+        with open(temp, "wb") as f:
+            f.write(data)
+
+
+def pillow(pil_format=None):
+    """Return ``PIL.Image``, importing it and the plugin for ``pil_format`` on first use"""
+    from PIL import Image
+
+    plugin = PILLOW_PLUGINS.get(pil_format)
+    if plugin is not None:
+        importlib.import_module(f"PIL.{plugin}")
+    return Image
+
+
+def pil_format_for(path):
+    """Pillow format name of a supported file extension, None for any other"""
+    return FORMAT_MAP.get(PurePath(path).suffix[1:].upper())
+
+
+def _encode(img, output_file, format=None, **kwargs):
+    # Encode in memory, so encoding and writing are timed separately and
+    # output archives get the bytes; without a file name to go by, the
+    # format has to be named explicitly
+    format = format or pil_format_for(output_file)
+    pillow(format)
+    buffer = io.BytesIO()
+    img.save(buffer, format, **kwargs)
+    return buffer.getvalue()
+
+
+def find_images(input_path):
+    """Return the supported image files directly inside ``input_path``"""
+    from .scanner import scan_images
+    return [entry.path for entry in scan_images(input_path)]
+
+
+def open_image(image_file):
+    """Lazily open a path or ArchiveMember; pixels are decoded on first use"""
+    if isinstance(image_file, ArchiveMember):
+        # Pillow picks the plugin by the file name, which a buffer does not have
+        return pillow(pil_format_for(image_file.relative)).open(io.BytesIO(image_file.data))
+    return pillow().open(image_file)
+
+
+def projected_memory(image_file, plan):
+    """Peak memory ``process_image`` is expected to need, from the image header only
+
+    Large-image mode bounds a strip-decoded TIFF to the memory budget plus
+    its output; anything else is decoded whole.
+    """
+    try:
+        with open_image(image_file) as img:
+            size, mode = img.size, img.mode
+            resize = any(p.resize for p in plan.renditions or (plan,))
+            strips = plan.memory_budget and resize and needs_strips(img, plan.memory_budget)
+    except Exception:
+        return 0  # process_image reports unreadable files
+    # Renditions are all held until the last one is encoded
+    output = sum(image_bytes(p.output_size(size), mode) for p in plan.renditions or (plan,) if p.resize)
+    if strips:
+        return min(image_bytes(size, mode), plan.memory_budget) + output
+    return image_bytes(size, mode) + output
+
+
+def _render(img, image_file, output_path, plan, log, changes, timer, size=None):
+    """Resize, convert and save one output of ``img`` according to ``plan``
+
+    ``size`` overrides the output size the plan would compute from ``img``,
+    for renditions resized from another rendition rather than the source.
+    Returns ``(resized, saved, output_file, data)``: the image after resizing
+    (reusable for smaller outputs), the image as saved after any mode
+    conversion, where it was saved and the encoded bytes. ``changes`` is
+    filled in for the results table and ``timer`` times each stage.
+    """
+    # Get DPI
+    if plan.dpi:
+        log(f"  [DPI] Will apply DPI: {plan.dpi}")
+    
+    # Resize
+    resize = plan.resize
+    if resize == RESIZE_EXACT:
+        w, h = size or plan.output_size(img.size)
+        with timer.stage("resize"):
+            img = _resize(img, (w, h), plan, log)
+        changes["size"] = f"{w}x{h}"
+        log(f"  [RESIZE] Resized to {w}x{h}")
+    elif resize == RESIZE_PERCENTAGE:
+        percentage = plan.percentage
+        new_w, new_h = size or plan.output_size(img.size)
+        with timer.stage("resize"):
+            img = _resize(img, (new_w, new_h), plan, log)
+        changes["size"] = f"{percentage}% -> {new_w}x{new_h}"
+        log(f"  [RESIZE] Scaled by {percentage}% -> {new_w}x{new_h}")
+    elif resize == RESIZE_ASPECT:
+        w, new_h = size or plan.output_size(img.size)
+        with timer.stage("resize"):
+            img = _resize(img, (w, new_h), plan, log)
+        changes["size"] = f"aspect {plan.aspect_label} -> {w}x{new_h}"
+        log(f"  [RESIZE] Applied aspect ratio {plan.aspect_label} -> {w}x{new_h}")
+    
+    resized = img
+    
+    # Convert format
+    save_kwargs = {}
+    if plan.dpi_tuple:
+        save_kwargs['dpi'] = plan.dpi_tuple
+    
+    if plan.pil_format:
+        format_val = plan.format_label
+        # FIX 4: Show exact format with correct extension in logs
+        log(f"  [FORMAT] Converting to {format_val}")
+        if plan.convert_rgb and img.mode != 'RGB':
+            with timer.stage("convert"):
+                img = img.convert('RGB')
+            log(f"  [CONVERT] Converted image mode to RGB for {format_val}")
+        
+        output_file = output_file_for(image_file, output_path, plan)
+        
+        # FIX 4: Log with the user-selected format showing correct extension
+        log(f"  [SAVE] Saving as {format_val.upper()} (.{plan.extension}) to {output_file}")
+        pil_format = plan.pil_format
+        changes["format"] = plan.pil_format
+    else:
+        output_file = output_file_for(image_file, output_path, plan)
+        
+        log(f"  [SAVE] Saving with original format to {output_file}")
+        pil_format = pil_format_for(output_file)
+    
+    if plan.encoder:
+        save_kwargs.update(encoder_options(pil_format, plan.encoder))
+        log(f"  [SAVE] Encoder profile: {plan.encoder}")
+        changes["encoder"] = plan.encoder
+    with timer.stage("encode"):
+        data = _encode(img, output_file, pil_format, **save_kwargs)
+    
+    if output_path is not None:
+        with timer.stage("write"):
+            _write(data, output_file)
+    
+    log(f"  [NEW SIZE] {img.size[0]}x{img.size[1]}")
+    
+    # Log DPI info
+    if plan.dpi:
+        log(f"  [DPI] Output DPI applied: {plan.dpi}x{plan.dpi}")
+    else:
+        log(f"  [DPI] Output DPI: unchanged (kept original DPI)")
+    
+    return resized, img, output_file, data
+
+
+def _render_renditions(img, image_file, output_path, plan, log, timer):
+    """Render every rendition of ``plan`` from a single decode of ``img``
+
+    Renditions are produced largest first and each one is resized from the
+    smallest downscaled output rendered so far that is still at least as
+    large, so the source is only decoded (and the big resampling done) once.
+    """
+    sizes = [rendition.output_size(img.size) for rendition in plan.renditions]
+    if plan.fast_downscale:
+        # Draft once for the largest rendition: a draft for the first one
+        # rendered would shrink the source of all the others
+        draft_scale = draft_image(img, (max(w for w, _ in sizes), max(h for _, h in sizes)), plan.reducing_gap)
+        if draft_scale > 1:
+            log(f"  [RESIZE] Fast decode at 1/{draft_scale} scale")
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][0] * sizes[i][1], reverse=True)
+    rendered = []  # Resized images, largest first
+    bytes_out = 0
+    results = [None] * len(sizes)
+    for i in order:
+        rendition = plan.renditions[i]
+        width, height = sizes[i]
+        source = next((candidate for candidate in reversed(rendered)
+                       if candidate.size[0] >= width and candidate.size[1] >= height), img)
+        origin = "source" if source is img else f"{source.size[0]}x{source.size[1]} rendition"
+        log(f"  [RENDITION] {rendition.name}: {width}x{height} from {origin}")
+        changes = {}
+        resized, saved, output_file, data = _render(source, image_file, output_path, rendition, log, changes,
+                                                    timer, size=sizes[i])
+        if resized.size[0] <= img.size[0] and resized.size[1] <= img.size[1]:
+            rendered.append(resized)  # Upscaled outputs would only blur smaller ones
+        results[i] = (rendition.name, saved.size, str(output_file), data, changes)
+        bytes_out += len(data)
+
+    task = {
+        "new_size": ", ".join(f"{w}x{h}" for _, (w, h), _, _, _ in results),
+        "changes": {name: " / ".join(str(value) for value in changes.values()) or "unchanged"
+                    for name, _, _, _, changes in results},
+        "output_file": results[0][2],
+        "output_files": [output_file for _, _, output_file, _, _ in results],
+        "bytes_out": bytes_out,
+    }
+    if output_path is None:
+        task["data"] = [data for _, _, _, data, _ in results]
+    return task
+
+
+def _dpi_label(info):
+    # Get original DPI from input image
+    original_dpi = info.get('dpi', (72, 72))  # Default to 72 if not set
+    if isinstance(original_dpi, (tuple, list)) and len(original_dpi) >= 2:
+        return f"{int(original_dpi[0])}x{int(original_dpi[1])}"
+    return "Default (72)"
+
+
+def _decode_and_render(image_file, output_path, plan, log, timer):
+    """Decode ``image_file`` and write its output(s); returns ``(original_size, outputs)``"""
+    with timer.stage("decode"):
+        img = open_image(image_file)
+        # Fast downscale and large-image mode decode while resizing
+        if not (plan.memory_budget or (plan.fast_downscale and img.format == "JPEG")):
+            img.load()
+    original_size = img.size
+    log(f"  [OPEN] Opened image - Size: {original_size[0]}x{original_size[1]}, Mode: {img.mode}, Format: {img.format}")
+    
+    log(f"  [DPI] Input image DPI: {_dpi_label(img.info)}")
+    
+    if plan.renditions:
+        outputs = _render_renditions(img, image_file, output_path, plan, log, timer)
+    else:
+        changes = {}
+        _, img, output_file, data = _render(img, image_file, output_path, plan, log, changes, timer)
+        outputs = {
+            "new_size": f"{img.size[0]}x{img.size[1]}",
+            "changes": changes,
+            "output_file": str(output_file),
+            "bytes_out": len(data),
+        }
+        if output_path is None:
+            outputs["data"] = [data]
+    return original_size, outputs
+
+
+def _stamp_dpi(image_file, output_path, plan, log, timer):
+    """DPI-only fast path: copy the file with just its resolution fields rewritten
+
+    Returns ``(original_size, outputs)`` like ``_decode_and_render``, or None
+    when the file cannot be edited in place (another format, WEBP, unusual
+    structure) and has to be decoded and re-encoded instead.
+    """
+    with timer.stage("decode"):
+        data = image_file.data if isinstance(image_file, ArchiveMember) else Path(image_file).read_bytes()
+    source_format = sniff_format(data)
+    if source_format is None or plan.pil_format not in (None, source_format):
+        return None
+    with timer.stage("encode"):
+        stamped = set_dpi(data, plan.dpi)
+    if stamped is None:
+        return None
+    # Header only, for the results table; the pixels are never decoded
+    with pillow(source_format).open(io.BytesIO(data)) as img:
+        size, mode, original_dpi = img.size, img.mode, _dpi_label(img.info)
+    log(f"  [OPEN] Opened image - Size: {size[0]}x{size[1]}, Mode: {mode}, Format: {source_format}")
+    log(f"  [DPI] Input image DPI: {original_dpi}")
+    output_file = output_file_for(image_file, output_path, plan)
+    log(f"  [DPI] Metadata only: rewriting the {source_format} resolution to {plan.dpi} without re-encoding")
+    log(f"  [SAVE] Copying pixel data unchanged to {output_file}")
+    if output_path is not None:
+        with timer.stage("write"):
+            _write(stamped, output_file)
+    log(f"  [DPI] Output DPI applied: {plan.dpi}x{plan.dpi}")
+    outputs = {
+        "new_size": f"{size[0]}x{size[1]}",
+        "changes": {"dpi": f"{plan.dpi} (metadata only)"},
+        "output_file": str(output_file),
+        "bytes_out": len(stamped),
+    }
+    if output_path is None:
+        outputs["data"] = [stamped]
+    return size, outputs
+
+
+def _passthrough(image_file, output_path, plan, log, timer):
+    """No-op fast path: copy the source file when no pixel or format change is asked
+
+    Returns ``(original_size, outputs)`` like ``_decode_and_render``, or None
+    when the output format differs from the source's and it has to be
+    converted.
+    """
+    with timer.stage("decode"):
+        # Header only, the pixels are never decoded
+        with open_image(image_file) as img:
+            size, mode, source_format, original_dpi = img.size, img.mode, img.format, _dpi_label(img.info)
+    if plan.pil_format not in (None, source_format):
+        return None
+    log(f"  [OPEN] Opened image - Size: {size[0]}x{size[1]}, Mode: {mode}, Format: {source_format}")
+    log(f"  [DPI] Input image DPI: {original_dpi}")
+    output_file = output_file_for(image_file, output_path, plan)
+    member = isinstance(image_file, ArchiveMember)
+    with timer.stage("write"):
+        if output_path is None:
+            data = image_file.data if member else Path(image_file).read_bytes()
+            method = "copy"
+        elif member:
+            data = image_file.data
+            _write(data, output_file)
+            method = "copy"
+        else:
+            method = clone_or_copy(image_file, output_file)
+    log(f"  [SAVE] Passthrough: {source_format} copied unchanged ({method}, not re-encoded) to {output_file}")
+    log(f"  [DPI] Output DPI: unchanged (kept original DPI)")
+    outputs = {
+        "new_size": f"{size[0]}x{size[1]}",
+        "changes": {"passthrough": method},
+        "output_file": str(output_file),
+        "bytes_out": _source_bytes(image_file),
+    }
+    if output_path is None:
+        outputs["data"] = [data]
+    return size, outputs
+
+
+def _source_bytes(image_file):
+    if isinstance(image_file, ArchiveMember):
+        return len(image_file.data)
+    try:
+        return os.path.getsize(image_file)
+    except OSError:
+        return 0
+
+
+def process_image(image_file, output_path, plan):
+    """Process one image according to a compiled ``plan``
+
+    Never touches Tk so it can be executed by any engine, including worker
+    processes. Returns the log lines and the result task. ``image_file`` may
+    be an ArchiveMember; when ``output_path`` is None the results are encoded
+    in memory and returned as ``task["data"]`` (one entry per output file) for
+    an output archive. Plans with renditions list every file they wrote in
+    ``task["output_files"]``. ``task["timings"]`` holds the seconds spent in
+    each stage (see ``timing.STAGES``) and ``bytes_in``/``bytes_out`` the
+    bytes read and written, for ``timing.BatchStats``.
+    """
+    log_lines = []
+    log = log_lines.append
+    timer = StageTimer()
+    try:
+        copied = None
+        if plan.dpi_only:
+            copied = _stamp_dpi(image_file, output_path, plan, log, timer)
+        elif plan.passthrough:
+            copied = _passthrough(image_file, output_path, plan, log, timer)
+        original_size, outputs = copied or _decode_and_render(image_file, output_path, plan, log, timer)
+        
+        # Add to results
+        task = {
+            "filename": image_file.name,
+            "original_size": f"{original_size[0]}x{original_size[1]}",
+            "new_size": outputs.pop("new_size"),
+            "changes": outputs.pop("changes"),
+            "status": "✓ Completed",
+            **outputs
+        }
+        task["bytes_in"] = _source_bytes(image_file)
+        log(f"  [SUCCESS] Image processed successfully")
+    
+    except Exception as e:
+        failed_lines, task = _failed_task(image_file, e)
+        log_lines.extend(failed_lines)
+    task["timings"] = timer.seconds
+    return log_lines, task
+
+
+def _failed_task(image_file, error):
+    log_lines = [f"  [ERROR] Failed to process: {str(error)}"]
+    task = {
+        "filename": image_file.name,
+        "original_size": "N/A",
+        "new_size": "N/A",
+        "changes": {},
+        "status": f"✗ Failed: {str(error)}"
+    }
+    return log_lines, task
+
+
+def _skipped_task(image_file, entry):
+    log_lines = [f"  [SKIP] Up to date, keeping existing output: {entry['output']}"]
+    task = {
+        "filename": image_file.name,
+        "original_size": entry["original_size"],
+        "new_size": entry["new_size"],
+        "changes": {},
+        "status": "✓ Skipped (up to date)",
+        "output_file": entry["output"]
+    }
+    return log_lines, task
+
+
+def _resumed_task(image_file, record):
+    log_lines = [f"  [SKIP] Already finished before the batch was interrupted, keeping output: {record['output']}"]
+    task = {
+        "filename": image_file.name,
+        "original_size": record["original_size"],
+        "new_size": record["new_size"],
+        "changes": {},
+        "status": "✓ Skipped (already done)",
+        "output_file": record["output"]
+    }
+    if len(record["outputs"]) > 1:
+        task["output_files"] = record["outputs"]
+    return log_lines, task
+
+
+def _cached_task(image_file, output_path, plan, cache, key):
+    """Reuse the cached output for ``key``, or process the image if it is not cached"""
+    entry = cache.lookup(key)
+    if entry is None:
+        return process_image(image_file, output_path, plan)
+    output_file = output_file_for(image_file, output_path, plan)
+    try:
+        cache.restore(entry, output_file)
+    except OSError:
+        return process_image(image_file, output_path, plan)
+    log_lines = [f"  [CACHE] Identical image already processed, reused cached output: {output_file}"]
+    task = dict(entry["task"], filename=image_file.name, status="✓ Completed (cached)",
+                output_file=str(output_file))
+    task["changes"] = dict(task["changes"])
+    return log_lines, task
+
+
+def run_batch(image_files, output_path, plan, engine, should_stop=None, manifest=None, force=False,
+              cache=None, prefetch_bytes=None, write_behind_bytes=None, journal=None):
+    """Process ``image_files`` on ``engine``, yielding results in order
+
+    ``image_files`` may be a lazy iterable of paths or ScanEntry tuples (see
+    ``scanner.scan_images``); it is consumed only as fast as the engine takes
+    work. ScanEntry sub-folders are mirrored below ``output_path``. ``plan``
+    is a JobPlan (a JobSpec is compiled on the fly). Yields
+    ``(image_file, log_lines, task)`` tuples as each image completes.
+
+    With a ``manifest`` (see ``manifest.Manifest``) images whose source and
+    settings are unchanged since the last run are skipped without being
+    decoded, unless ``force`` is set; processed images are recorded in it.
+    With a ``cache`` (see ``cache.ResultCache``) byte-identical inputs reuse
+    the output encoded for the first copy. With a ``journal`` (see
+    ``journal.BatchJournal``) every finished image is appended to the
+    progress journal in the output folder, and a resumed batch skips the
+    images the interrupted one already finished.
+
+    ``image_files`` may also hold ArchiveMember items (see
+    ``archive.scan_archive``), which are always processed. ``output_path``
+    may be an ``archive.ArchiveWriter`` instead of a folder, in which case
+    results are appended to the archive in order and no loose files are
+    written; manifests and caches need loose files and are not supported then.
+
+    With ``prefetch_bytes`` a reader thread loads upcoming files into memory
+    (up to that many bytes ahead, see ``pipeline.Prefetcher``) so workers
+    decode from buffers instead of waiting on the disk. With
+    ``write_behind_bytes`` workers encode in memory and a writer thread
+    flushes the outputs to the folder (see ``pipeline.WriteBehind``); an
+    image is only recorded and yielded once its outputs are on disk, and a
+    failed write stops the batch with its error. Outputs the duplicate cache
+    keeps are written straight away, since later copies link to them.
+
+    A ``remote`` engine (see ``distributed.DistributedEngine``) gets every
+    file's bytes instead of its path and returns the encoded outputs, which
+    are written here.
+    """
+    from .archive import ArchiveWriter
+    from .pipeline import Prefetcher, WriteBehind, load_file
+
+    if isinstance(plan, JobSpec):
+        plan = plan.compile()
+    archive = output_path if isinstance(output_path, ArchiveWriter) else None
+    if archive is not None and (manifest is not None or cache is not None or journal is not None):
+        raise ValueError("Incremental mode, the duplicate cache and the journal cannot write to an output archive")
+    if plan.renditions and cache is not None:
+        raise ValueError("The duplicate cache keeps one output per image and cannot be used with renditions")
+    output_path = Path(output_path) if archive is None else None
+    if output_path is not None:
+        output_path.mkdir(parents=True, exist_ok=True)
+    fingerprint = plan_fingerprint(plan) if any(x is not None for x in (manifest, cache, journal)) else None
+    if journal is not None:
+        journal.start(fingerprint)
+    # Per image in submission order: [image_file, relative_folder, key, stat, cache key, resolve]
+    # where key is the path below the input folder (None when the result is reused as is), and
+    # resolve is None for work sent to the engine, or a callable producing the result here
+    submitted = deque()
+    unwritten = deque()  # (write-behind ticket, entry, result) of finished images not yielded yet
+    created_folders = {PurePath()}
+    inflight_keys = set()  # Cache keys of images currently on the engine
+    exhausted = False  # Every image was handed out, not stopped early
+    writer = WriteBehind(write_behind_bytes) if write_behind_bytes and archive is None else None
+    remote = getattr(engine, "remote", False)  # Workers on other hosts get the bytes and return outputs
+
+    def jobs():
+        nonlocal exhausted
+        for item in image_files:
+            if should_stop is not None and should_stop():
+                return
+            member = isinstance(item, ArchiveMember)
+            if member:
+                image_file, relative = item, PurePath(item.relative)
+            elif isinstance(item, ScanEntry):
+                image_file, relative = Path(item.path), PurePath(item.relative)
+            else:
+                image_file = Path(item)
+                relative = PurePath(image_file.name)
+            relative_folder = relative.parent
+            folder = output_path / relative_folder if archive is None else None
+
+            key = relative.as_posix()
+            stat = None
+            if (manifest is not None or journal is not None) and not member:
+                try:
+                    stat = image_file.stat()
+                except OSError:
+                    stat = None  # Let process_image report the error
+
+            if journal is not None and (stat is not None or member):
+                record = journal.is_done(key, image_file, stat)
+                if record is not None:
+                    journal.resumed += 1
+                    submitted.append([image_file, relative_folder, None, None, None,
+                                      partial(_resumed_task, image_file, record)])
+                    continue
+
+            if manifest is not None and not member:
+                entry = None
+                if stat is not None and not force:
+                    entry = manifest.is_up_to_date(key, image_file, stat, fingerprint)
+                if entry is not None:
+                    submitted.append([image_file, relative_folder, None, None, None,
+                                      partial(_skipped_task, image_file, entry)])
+                    continue
+
+            if archive is None and relative_folder not in created_folders:
+                folder.mkdir(parents=True, exist_ok=True)
+                created_folders.add(relative_folder)
+
+            cache_key = None
+            if cache is not None and not member:
+                try:
+                    cache_key = cache.key_for(image_file, fingerprint)
+                except OSError:
+                    cache_key = None  # Let process_image report the error
+                if cache_key is not None and (cache_key in inflight_keys or cache_key in cache.entries):
+                    # Resolved in order, after any identical image ahead of it has finished
+                    submitted.append([image_file, relative_folder, key, stat, cache_key,
+                                      partial(_cached_task, image_file, folder, plan, cache, cache_key)])
+                    continue
+                if cache_key is not None:
+                    cache.misses += 1
+                    inflight_keys.add(cache_key)
+
+            submitted.append([image_file, relative_folder, key, stat, cache_key, None])
+            if remote and not member and not prefetch_bytes:
+                image_file, _ = load_file(image_file, float("inf"))
+            # Written behind or remote: the worker only encodes, in memory
+            yield image_file, folder if writer is None and not remote else None, plan
+        exhausted = True
+
+    def prefetch(job):
+        image_file, folder, job_plan = job
+        if isinstance(image_file, ArchiveMember):
+            return job, 0  # Already in memory
+        # Remote workers cannot open the file, so it is sent whatever its size
+        image_file, nbytes = load_file(image_file, float("inf") if remote else prefetch_bytes)
+        return (image_file, folder, job_plan), nbytes
+
+    def write_outputs(relative_folder, task, write):
+        folder = output_path / relative_folder
+        names = [folder / name for name in task.get("output_files", [task["output_file"]])]
+        for name, data in zip(names, task.pop("data")):
+            ticket = write(name, data)
+        task["output_file"] = str(names[0])
+        if "output_files" in task:
+            task["output_files"] = [str(name) for name in names]
+        return ticket
+
+    def finish(entry, result):
+        # Stores the outputs; returns the write-behind ticket of the last one, or None
+        image_file, relative_folder, key, stat, cache_key, _ = entry
+        log_lines, task = result
+        succeeded = task["status"].startswith("✓")
+        ticket = None
+        if archive is None and "data" in task:
+            # The cache links the output file, so that one has to exist now
+            ticket = write_outputs(relative_folder, task, writer.write if writer is not None and cache_key is None
+                                   else lambda name, data: _write(data, name))
+        if cache_key is not None:
+            if succeeded:
+                cache.store(cache_key, task["output_file"], task)
+            # Only after storing: a prefetching reader may be checking for duplicates
+            inflight_keys.discard(cache_key)
+        if archive is not None and succeeded:
+            names = task.get("output_files", [task["output_file"]])
+            names = [f"{archive.path}:{archive.add((relative_folder / name).as_posix(), data)}"
+                     for name, data in zip(names, task.pop("data"))]
+            task["output_file"] = names[0]
+            if "output_files" in task:
+                task["output_files"] = names
+        if relative_folder != PurePath():
+            task["filename"] = (relative_folder / image_file.name).as_posix()
+        return ticket
+
+    def complete(entry, result):
+        unwritten.append((finish(entry, result), entry, result))
+        yield from confirmed()
+
+    def confirmed():
+        # Results wait, in order, until the writer has their outputs on disk
+        while unwritten and (unwritten[0][0] is None or writer.flushed(unwritten[0][0])):
+            _, (image_file, _, key, stat, _, _), (log_lines, task) = unwritten.popleft()
+            succeeded = task["status"].startswith("✓")
+            if manifest is not None and key is not None and stat is not None and succeeded:
+                manifest.record(key, image_file, stat, fingerprint, task)
+            if journal is not None and key is not None:
+                journal.record(key, image_file, stat, task)
+            yield image_file, log_lines, task
+
+    def resolved_ready():
+        while submitted and submitted[0][5] is not None:
+            entry = submitted.popleft()
+            yield from complete(entry, entry[5]())
+
+    # Large-image mode admits images by their projected memory, not just the worker count
+    cost = budget = None
+    if plan.memory_budget:
+        cost = lambda job: projected_memory(job[0], plan)
+        budget = plan.memory_budget * engine.workers
+
+    work = jobs()
+    if prefetch_bytes:
+        work = Prefetcher(work, prefetch, prefetch_bytes, should_stop=should_stop)
+
+    finished = False
+    try:
+        # An image that kills every remote worker it is sent to is reported like any other failure
+        on_error = {"on_error": lambda job, error: _failed_task(job[0], error)} if remote else {}
+        for result in engine.map(process_image, work, should_stop=should_stop, cost=cost, budget=budget, **on_error):
+            yield from resolved_ready()
+            yield from complete(submitted.popleft(), result)
+            yield from resolved_ready()
+        yield from resolved_ready()
+        if writer is not None:
+            writer.close()
+            yield from confirmed()
+        finished = True
+    finally:
+        try:
+            if prefetch_bytes:
+                work.close()
+            if writer is not None:
+                writer.close()
+        finally:
+            if journal is not None:
+                journal.close(complete=finished and exhausted)
+            if manifest is not None:
+                manifest.save()
+            if cache is not None:
+                cache.save()
@@ -0,0 +1,482 @@
+"""Coordinator/worker engine that spreads a batch over several machines.
+
+``DistributedEngine`` is an engine like the others in ``engine``: its
+``map`` yields results in order. Instead of running the items itself it
+groups them into work units and serves them over TCP to worker processes,
+which may run on other hosts (``python -m image_handler.distributed
+HOST:PORT``). The connection is ``multiprocessing.connection`` with a shared
+secret, so no external service is needed; with no listen address the engine
+starts its worker processes locally.
+
+Every unit is leased to one worker at a time. A worker reports progress
+after each item, which renews its lease; a unit whose worker disconnects,
+raises or lets the lease run out goes back to the queue. After
+``attempts`` failures a unit is split into single images, so one image that
+kills its worker cannot take the rest of the unit down with it, and an
+image that still fails on its own is reported through ``on_error`` (a
+failed row in ``run_batch``). Local workers that die are started again.
+
+Workers never see the coordinator's disks: ``run_batch`` sends the image
+bytes with every item and writes the returned outputs itself (see
+``remote``).
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from itertools import islice
+from multiprocessing.connection import Client, Listener
+
+from .engine import WorkerError, default_workers
+
+# Images per work unit: enough to amortise a round trip, few enough to balance the load
+DEFAULT_UNIT_SIZE = 4
+# Seconds a worker may go without reporting progress before its unit is handed out again
+DEFAULT_LEASE = 120.0
+DEFAULT_ATTEMPTS = 3
+# Local workers started again after dying without holding a unit (workers
+# that cannot start); those that die on an image are always started again
+DEFAULT_RESTARTS = 5
+DEFAULT_PORT = 7463
+# Environment variable holding the shared secret, so it does not show up in process lists
+SECRET_ENV = "IMAGE_HANDLER_SECRET"
+
+_DONE = object()
+
+
+def parse_address(value, default_host="0.0.0.0"):
+    """Parse ``HOST:PORT``, ``:PORT`` or ``PORT`` into an address tuple"""
+    host, _, port = str(value).strip().rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        port = -1
+    if not 0 <= port <= 65535:
+        raise ValueError(f"Invalid address: '{value}'. Use HOST:PORT, e.g. 0.0.0.0:{DEFAULT_PORT}")
+    return host.strip("[]") or default_host, port
+
+
+class _Unit:
+    __slots__ = ("id", "items", "attempts", "lease", "leased", "deadline", "results", "error", "parts")
+
+    def __init__(self, unit_id, items):
+        self.id = unit_id
+        self.items = items
+        self.attempts = 0
+        self.lease = 0  # Incremented on every lease, so stale reports can be told apart
+        self.leased = False
+        self.deadline = 0.0
+        self.results = None
+        self.error = None
+        self.parts = None  # Single-image units it was split into
+
+    @property
+    def done(self):
+        if self.parts is not None:
+            return all(part.done for part in self.parts)
+        return self.results is not None or self.error is not None
+
+
+class _Coordinator:
+    """Listener and per-connection threads that lease units to workers"""
+
+    def __init__(self, address, authkey, func, lease, attempts):
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.authkey = authkey
+        self.func = func
+        self.lease_seconds = lease
+        self.max_attempts = attempts
+        self.condition = threading.Condition()
+        self.units = {}  # id -> _Unit, until its results are yielded
+        self.queue = deque()  # Unit ids waiting for a worker
+        self.next_id = 0
+        self.connected = 0
+        self.dropped = 0  # Workers that disconnected while holding a unit
+        self.closed = False
+        self._thread = threading.Thread(target=self._accept, name="image-handler-coordinator", daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                if self.closed:
+                    return
+                continue  # Wrong secret, or a client that hung up early
+            if self.closed:
+                conn.close()
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def add(self, items):
+        with self.condition:
+            unit = self._new_unit(items)
+            self.condition.notify_all()
+            return unit
+
+    def _new_unit(self, items):
+        unit_id = self.next_id
+        self.next_id += 1
+        unit = self.units[unit_id] = _Unit(unit_id, items)
+        self.queue.append(unit_id)
+        return unit
+
+    def _lease(self):
+        deadline = time.monotonic() + 2.0
+        with self.condition:
+            while not self.queue and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            if self.closed:
+                return _DONE
+            unit_id = self.queue.popleft()
+            unit = self.units[unit_id]
+            unit.lease += 1
+            unit.leased = True
+            unit.deadline = time.monotonic() + self.lease_seconds
+            return unit_id, unit.lease, unit.items
+
+    def _current(self, unit_id, lease):
+        unit = self.units.get(unit_id)
+        if unit is None or not unit.leased or unit.lease != lease:
+            return None
+        return unit
+
+    def _retry(self, unit, reason):
+        # Called with the condition held
+        unit.leased = False
+        unit.attempts += 1
+        if unit.attempts < self.max_attempts:
+            self.queue.append(unit.id)
+        elif len(unit.items) > 1:
+            unit.parts = [self._new_unit([item]) for item in unit.items]
+        else:
+            image_file = unit.items[0][0]
+            unit.error = f"{reason} ({unit.attempts} attempt(s)): {getattr(image_file, 'relative', image_file)}"
+        self.condition.notify_all()
+
+    def _serve(self, conn):
+        leased = None  # (unit id, lease) held by this worker
+        with self.condition:
+            self.connected += 1
+        try:
+            while True:
+                message = conn.recv()
+                kind = message[0]
+                if kind == "ready":
+                    lease = self._lease()
+                    if lease is _DONE:
+                        conn.send(("done",))
+                        return
+                    if lease is None:
+                        conn.send(("wait",))
+                        continue
+                    unit_id, number, items = lease
+                    leased = (unit_id, number)
+                    conn.send(("unit", unit_id, number, self.func, items))
+                elif kind == "progress":
+                    with self.condition:
+                        unit = self._current(message[1], message[2])
+                        if unit is not None:
+                            unit.deadline = time.monotonic() + self.lease_seconds
+                elif kind == "result":
+                    with self.condition:
+                        unit = self.units.get(message[1])
+                        # A late result from an expired lease is as good as any
+                        if unit is not None and not unit.done and unit.parts is None:
+                            unit.results = message[3]
+                            unit.leased = False
+                            self.queue = deque(unit_id for unit_id in self.queue if unit_id != message[1])
+                        self.condition.notify_all()
+                    leased = None
+                elif kind == "error":
+                    with self.condition:
+                        unit = self._current(message[1], message[2])
+                        if unit is not None:
+                            self._retry(unit, f"Worker error: {message[3]}")
+                    leased = None
+        except (EOFError, OSError):
+            pass  # Worker gone
+        finally:
+            with self.condition:
+                self.connected -= 1
+                if leased is not None:
+                    self.dropped += 1
+                    unit = self._current(*leased)
+                    if unit is not None:
+                        self._retry(unit, "Worker disconnected")
+                self.condition.notify_all()
+            conn.close()
+
+    def expire_leases(self):
+        """Hand out again the units whose worker stopped reporting; call with the condition held"""
+        now = time.monotonic()
+        for unit in list(self.units.values()):
+            if unit.leased and unit.results is None and now > unit.deadline:
+                self._retry(unit, "Lease expired")
+
+    def release(self, unit):
+        """Forget a unit whose results were yielded; call with the condition held"""
+        for part in unit.parts or ():
+            self.release(part)
+        self.units.pop(unit.id, None)
+
+    def discard(self, units):
+        """Drop units nobody will wait for any more (a stopped batch), queued or not"""
+        with self.condition:
+            for unit in units:
+                self.release(unit)
+            self.queue = deque(unit_id for unit_id in self.queue if unit_id in self.units)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        try:
+            # accept() is not interrupted by closing the socket, so wake it up
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            pass
+        self._thread.join(timeout=5)
+        self.listener.close()
+
+
+def _unit_results(unit, on_error):
+    if unit.parts is not None:
+        return [result for part in unit.parts for result in _unit_results(part, on_error)]
+    if unit.error is not None:
+        if on_error is None:
+            raise WorkerError(unit.error)
+        return [on_error(unit.items[0], unit.error)]
+    return unit.results
+
+
+class DistributedEngine:
+    """Serve the items of ``map`` to worker processes over TCP, in work units
+
+    ``workers`` local worker processes are started for every batch (by
+    default one per CPU when there is no ``listen`` address, none when
+    there is), or once for all the batches run inside a ``with`` block. With ``listen`` (``HOST:PORT``) workers on other hosts can
+    connect too, authenticated by ``secret``. A local worker that dies
+    (killed for memory, a crash in a decoder) is started again, unless
+    more than ``restarts`` of them died without holding a unit, i.e. the
+    workers cannot start at all; a worker killed by an image counts toward
+    that image's ``attempts`` instead.
+    """
+
+    mode = "distributed"
+    # Items are sent to other machines: run_batch ships the image bytes and writes the outputs itself
+    remote = True
+
+    def __init__(self, workers=None, listen=None, secret=None, unit_size=DEFAULT_UNIT_SIZE, lease=DEFAULT_LEASE,
+                 attempts=DEFAULT_ATTEMPTS, restarts=DEFAULT_RESTARTS):
+        if workers is None or workers == "":
+            workers = 0 if listen else default_workers()
+        self.local_workers = int(workers)
+        if self.local_workers < 0 or (not listen and self.local_workers == 0):
+            raise ValueError("The distributed engine needs local workers or a listen address for remote ones")
+        if listen:
+            self.address = parse_address(listen)
+            secret = secret or os.environ.get(SECRET_ENV)
+            if not secret:
+                raise ValueError(f"A secret (or the {SECRET_ENV} environment variable) is required "
+                                 f"to accept remote workers")
+            self.authkey = secret.encode("utf-8")
+        else:
+            self.address = ("127.0.0.1", 0)  # Local workers only, on a free port
+            self.authkey = secrets.token_bytes(16)
+        self.workers = max(1, self.local_workers)
+        self.unit_size = max(1, int(unit_size))
+        self.lease = lease
+        self.attempts = max(1, int(attempts))
+        self.restarts = max(0, int(restarts))
+        self.coordinator = None  # Set while a batch or a with block is running
+        self._processes = []
+        self._restarted = 0
+        self._session = False  # Coordinator and workers outlive map calls
+
+    def __enter__(self):
+        if self.coordinator is None:
+            self._open()
+        self._session = True
+        return self
+
+    def __exit__(self, *exc_info):
+        self._session = False
+        if self.coordinator is not None:
+            self._close()
+
+    def _open(self):
+        self.coordinator = _Coordinator(self.address, self.authkey, None, self.lease, self.attempts)
+        self._processes = [self._start_local_worker(self.coordinator.address, number)
+                           for number in range(self.local_workers)]
+        self._restarted = 0
+
+    def _close(self):
+        coordinator, processes = self.coordinator, self._processes
+        self.coordinator, self._processes = None, []
+        coordinator.close()
+        # Workers finish their current unit and exit; a stalled one holds nothing worth waiting for
+        deadline = time.monotonic() + 2.0
+        for process in processes:
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+
+    def _start_local_worker(self, address, number):
+        context = multiprocessing.get_context("spawn")  # Never fork a process running Tk or threads
+        process = context.Process(target=run_worker, args=(address, self.authkey),
+                                  kwargs={"name": f"local-{number + 1}", "exit_when_done": True}, daemon=True)
+        process.start()
+        return process
+
+    def map(self, func, items, should_stop=None, cost=None, budget=None, on_error=None):
+        """Yield ``func(*item)`` for every item, in order
+
+        ``on_error(item, message)`` gives the result of an item that failed
+        on every attempt; without it such an item raises ``WorkerError``.
+        """
+        # Memory budgets apply per worker host; ``cost`` and ``budget`` are not used here
+        if self.coordinator is None:
+            self._open()
+        coordinator = self.coordinator
+        coordinator.func = func
+        processes = self._processes
+        items = iter(items)
+        order = deque()  # Units in submission order
+        in_flight = 0
+        exhausted = False
+        condition = coordinator.condition
+        try:
+            while True:
+                stopping = should_stop is not None and should_stop()
+                window = self.unit_size * 2 * max(self.workers, coordinator.connected)
+                while not stopping and not exhausted and in_flight < window:
+                    batch = list(islice(items, self.unit_size))
+                    if not batch:
+                        exhausted = True
+                        break
+                    order.append(coordinator.add(batch))
+                    in_flight += len(batch)
+                if stopping or not order:
+                    break
+
+                unit = order[0]
+                with condition:
+                    while not unit.done:
+                        if should_stop is not None and should_stop():
+                            break
+                        for number, process in enumerate(processes):
+                            # Deaths while holding a unit are the unit's failures, not the worker's
+                            if not process.is_alive() and self._restarted - coordinator.dropped < self.restarts:
+                                # Its unit is handed out again once the connection drops
+                                processes[number] = self._start_local_worker(coordinator.address, number)
+                                self._restarted += 1
+                        if processes and not coordinator.connected and not any(p.is_alive() for p in processes) \
+                                and not self.address[1]:
+                            raise WorkerError(f"All local workers exited ({self._restarted} restarted)")
+                        condition.wait(0.5)
+                        coordinator.expire_leases()
+                    if not unit.done:
+                        break  # Stopped
+                    order.popleft()
+                    coordinator.release(unit)
+                in_flight -= len(unit.items)
+                yield from _unit_results(unit, on_error)
+        finally:
+            if self._session:
+                coordinator.discard(order)
+            else:
+                self._close()
+
+
+def run_worker(address, authkey, name=None, exit_when_done=False, retry_interval=2.0):
+    """Process work units from the coordinator at ``address`` until it finishes
+
+    A worker started by hand (``exit_when_done`` False) keeps reconnecting,
+    so it serves one batch after another.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        try:
+            conn = Client(tuple(address), authkey=authkey)
+        except multiprocessing.AuthenticationError:
+            print(f"[WORKER] {name}: the coordinator rejected the secret", file=sys.stderr)
+            return
+        except (OSError, EOFError):
+            if exit_when_done:
+                return
+            time.sleep(retry_interval)
+            continue
+        with conn:
+            try:
+                while True:
+                    conn.send(("ready", name))
+                    message = conn.recv()
+                    if message[0] == "done":
+                        break
+                    if message[0] == "wait":
+                        continue
+                    _, unit_id, lease, func, items = message
+                    results = []
+                    try:
+                        for item in items:
+                            results.append(func(*item))
+                            conn.send(("progress", unit_id, lease))
+                    except Exception as e:
+                        conn.send(("error", unit_id, lease, f"{type(e).__name__}: {e}"))
+                        continue
+                    conn.send(("result", unit_id, lease, results))
+            except (EOFError, OSError):
+                pass  # Coordinator went away
+        if exit_when_done:
+            return
+        time.sleep(retry_interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m image_handler.distributed",
+        description="Run Image Handler worker processes for a coordinator started with --engine distributed.",
+    )
+    parser.add_argument("address", help=f"coordinator address, HOST:PORT (default port {DEFAULT_PORT})")
+    parser.add_argument("--secret", help=f"shared secret of the coordinator (default: ${SECRET_ENV})")
+    parser.add_argument("--processes", type=int, default=default_workers(),
+                        help="worker processes to run on this host (default: CPU count)")
+    parser.add_argument("--once", action="store_true", help="exit when the coordinator's batch is done")
+    args = parser.parse_args(argv)
+    try:
+        address = parse_address(args.address if ":" in args.address else f"{args.address}:{DEFAULT_PORT}")
+    except ValueError as e:
+        parser.error(str(e))
+    secret = args.secret or os.environ.get(SECRET_ENV)
+    if not secret:
+        parser.error(f"--secret or ${SECRET_ENV} is required")
+    authkey = secret.encode("utf-8")
+    print(f"[WORKER] {max(1, args.processes)} process(es) working for {address[0]}:{address[1]}")
+    processes = [multiprocessing.Process(target=run_worker, args=(address, authkey),
+                                         kwargs={"exit_when_done": args.once})
+                 for _ in range(max(1, args.processes))]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
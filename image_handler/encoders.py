@@ -0,0 +1,46 @@
+"""Encoder profiles: Pillow save options per output format."""
+
+# Profiles from quickest to smallest output; no profile keeps Pillow's defaults
+ENCODER_PROFILES = ("fast", "balanced", "smallest")
+
+# Pillow format name -> profile -> save options
+_PROFILE_OPTIONS = {
+    "JPEG": {
+        "fast": {"quality": 75, "optimize": False, "progressive": False},
+        "balanced": {"quality": 75, "optimize": True},  # Same pixels, optimized Huffman tables
+        "smallest": {"quality": 70, "optimize": True, "progressive": True},
+    },
+    "WEBP": {
+        "fast": {"quality": 80, "method": 0},
+        "balanced": {"quality": 80, "method": 4},
+        "smallest": {"quality": 75, "method": 6},
+    },
+    "PNG": {
+        # optimize=True is slow and rarely beats plain level 9 on photos
+        "fast": {"compress_level": 1},
+        "balanced": {"compress_level": 6},
+        "smallest": {"compress_level": 9},
+    },
+    "TIFF": {
+        "fast": {"compression": "raw"},
+        "balanced": {"compression": "tiff_lzw"},
+        "smallest": {"compression": "tiff_adobe_deflate"},
+    },
+}
+
+
+def encoder_profile(name):
+    """Return the normalized profile ``name``, or None for Pillow's defaults"""
+    if not name:
+        return None
+    profile = name.strip().lower()
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f"Invalid encoder profile: '{name}'. Must be one of: {', '.join(ENCODER_PROFILES)}")
+    return profile
+
+
+def encoder_options(pil_format, profile):
+    """Save options of ``profile`` for ``pil_format``; empty for other formats or no profile"""
+    if not profile:
+        return {}
+    return _PROFILE_OPTIONS.get(pil_format, {}).get(profile, {})
@@ -0,0 +1,179 @@
+"""Execution engines used to run the per-image work of a batch.
+
+Every engine exposes the same ``map(func, items, should_stop, cost, budget)``
+generator.
+Results are yielded in the same order as ``items`` so the results table and
+the log stay readable, even when workers finish out of order. Only a small
+window of items is submitted ahead of the consumer, which keeps memory flat
+on very large folders and lets the Stop button cancel pending work quickly.
+With a ``cost`` function (bytes an item is expected to need) and a
+``budget``, pool engines also hold items back while the items in flight would
+exceed the budget, so a few huge images do not run side by side.
+
+Pool engines start their workers for every ``map`` call; used as a context
+manager they keep them running across the calls made inside the block, so
+small batches in quick succession (watch mode) do not pay for the start-up
+every time.
+"""
+
+import os
+from collections import deque
+
+ENGINE_MODES = ("serial", "thread", "process")
+# Engines that can run a whole batch; the distributed one has no executor for callers that submit work themselves
+DISTRIBUTED_MODE = "distributed"
+BATCH_ENGINE_MODES = ENGINE_MODES + (DISTRIBUTED_MODE,)
+
+
+class WorkerError(RuntimeError):
+    """The engine lost the workers it needs to go on with the batch"""
+
+
+def default_workers():
+    """Return a sensible default worker count for this machine"""
+    return max(1, os.cpu_count() or 1)
+
+
+class SerialEngine:
+    """Run every item in the calling thread, one at a time"""
+
+    mode = "serial"
+
+    def __init__(self, workers=1):
+        self.workers = 1
+
+    def create_executor(self):
+        """Executor with a single worker, for callers that submit work themselves"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        return ThreadPoolExecutor(max_workers=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def map(self, func, items, should_stop=None, cost=None, budget=None):
+        # One item at a time is already the smallest memory footprint
+        for item in items:
+            if should_stop is not None and should_stop():
+                return
+            yield func(*item)
+
+
+class _PoolEngine:
+    """Shared logic for the executor backed engines"""
+
+    mode = None
+    # Executor class in concurrent.futures, looked up when the engine first
+    # runs: the process pool imports multiprocessing, which is slow to load
+    executor_name = None
+
+    def __init__(self, workers=None):
+        self.workers = max(1, int(workers or default_workers()))
+        # Keep a couple of items queued per worker so no worker sits idle,
+        # without submitting the whole folder up front.
+        self.window = self.workers * 2
+        self._executor = None  # Shared by the map calls inside a with block
+
+    def __enter__(self):
+        if self._executor is None:
+            self._executor = self.create_executor()
+        return self
+
+    def __exit__(self, *exc_info):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def create_executor(self):
+        """Executor backing this engine, for callers that submit work themselves"""
+        import concurrent.futures
+
+        return getattr(concurrent.futures, self.executor_name)(max_workers=self.workers)
+
+    def map(self, func, items, should_stop=None, cost=None, budget=None):
+        executor = self._executor or self.create_executor()
+        pending = deque()  # (future, cost) in submission order
+        items = iter(items)
+        exhausted = False
+        waiting = None  # Next item, held back until it fits in the budget
+        in_flight = 0
+        try:
+            while True:
+                stopping = should_stop is not None and should_stop()
+                while not stopping and len(pending) < self.window:
+                    if waiting is None:
+                        if exhausted:
+                            break
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            exhausted = True
+                            break
+                        waiting = (item, cost(item) if cost is not None else 0)
+                    item, item_cost = waiting
+                    # An item bigger than the whole budget still runs, on its own
+                    if budget is not None and pending and in_flight + item_cost > budget:
+                        break
+                    pending.append((executor.submit(func, *item), item_cost))
+                    in_flight += item_cost
+                    waiting = None
+
+                if stopping or not pending:
+                    break
+
+                future, item_cost = pending.popleft()
+                in_flight -= item_cost
+                yield future.result()
+        finally:
+            # Drop anything that has not started yet; running items finish
+            # on their own but their results are discarded.
+            for future, _ in pending:
+                future.cancel()
+            if executor is not self._executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ThreadPoolEngine(_PoolEngine):
+    """Run items on a pool of threads in this process"""
+
+    mode = "thread"
+    executor_name = "ThreadPoolExecutor"
+
+
+class ProcessPoolEngine(_PoolEngine):
+    """Run items on a pool of worker processes
+
+    ``func`` and every item must be picklable, so it has to be a module-level
+    function and items must not reference Tk objects.
+    """
+
+    mode = "process"
+    executor_name = "ProcessPoolExecutor"
+
+
+_ENGINES = {
+    "serial": SerialEngine,
+    "thread": ThreadPoolEngine,
+    "process": ProcessPoolEngine,
+}
+
+
+def create_engine(mode="serial", workers=None, **options):
+    """Create an engine for the given mode name
+
+    ``options`` are passed to the distributed engine (``listen``,
+    ``secret``, ...) and ignored by the others.
+    """
+    mode = (mode or "serial").strip().lower()
+    if mode == DISTRIBUTED_MODE:
+        from .distributed import DistributedEngine
+
+        return DistributedEngine(workers, **options)
+    try:
+        engine_class = _ENGINES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown engine mode: '{mode}'. Must be one of: {', '.join(BATCH_ENGINE_MODES)}")
+    return engine_class(workers)
@@ -0,0 +1,89 @@
+"""Copy files without passing their bytes through Python, and replace outputs atomically."""
+
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl that makes ``dst`` share the extents of ``src`` (btrfs, XFS, bcachefs...)
+FICLONE = 0x40049409
+
+COPY_CHUNK = 1024 * 1024
+
+
+@contextmanager
+def atomic_output(target):
+    """Yield a temporary path next to ``target`` that replaces ``target`` when the block succeeds
+
+    Readers (and a batch resumed after a crash) only ever see the old file or
+    the complete new one, never a half-written image. The rename also gives
+    the output a fresh inode, so a hard link shared with the result cache is
+    never overwritten in place. The temporary file is hidden and removed on
+    failure, and also when it was a hard link to ``target`` itself, which
+    ``os.replace`` leaves in place.
+    """
+    target = Path(target)
+    temp = target.with_name(f".{target.name}.{os.getpid()}-{threading.get_ident()}.part")
+    try:
+        yield temp
+        os.replace(temp, target)
+    finally:
+        try:
+            os.unlink(temp)
+        except OSError:
+            pass  # Renamed into place
+
+
+def _sendfile(src, dst, size):
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+        if not sent:
+            break
+        offset += sent
+    return offset == size
+
+
+def clone_or_copy(source, target):
+    """Copy ``source`` to a fresh ``target`` file (see ``atomic_output``) and return how it was copied
+
+    Tries a copy-on-write clone first (no data is copied at all), then
+    ``os.sendfile`` (copied inside the kernel), then a plain buffered copy.
+    Returns ``"clone"``, ``"sendfile"`` or ``"copy"``, or ``"in place"``
+    when ``target`` already is ``source``.
+    """
+    try:
+        if os.path.samefile(source, target):
+            return "in place"
+    except OSError:
+        pass  # No target yet
+    with atomic_output(target) as temp:
+        with open(source, "rb") as src, open(temp, "wb") as dst:
+            return _copy(src, dst)
+
+
+def _copy(src, dst):
+    if fcntl is not None and sys.platform.startswith("linux"):
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return "clone"
+        except OSError:
+            pass  # Different filesystems, or no reflink support
+    if hasattr(os, "sendfile"):
+        try:
+            if _sendfile(src, dst, os.fstat(src.fileno()).st_size):
+                return "sendfile"
+        except OSError:
+            pass  # e.g. macOS only sends to sockets
+        dst.seek(0)
+        dst.truncate()
+    src.seek(0)
+    shutil.copyfileobj(src, dst, COPY_CHUNK)
+    return "copy"
@@ -0,0 +1,185 @@
+"""Append-only progress journal, so an interrupted batch can be resumed.
+
+The journal is a JSON-lines file in the output folder. The first line
+describes the batch (input folder, job fingerprint and whatever settings the
+caller wants back on resume); every image that finishes appends one line,
+flushed straight away, so a crash or a closed window loses at most the
+images that were still in flight. The last line marks the batch as complete
+or stopped. Outputs are written through a temporary file and a rename (see
+``fastcopy.atomic_output``), so an image listed as done is always whole.
+
+Resuming reads the journal back and skips every image it lists as done
+with the same source size and modification time and the same settings,
+whose output files still exist; a partially written last line is ignored.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+JOURNAL_NAME = ".image_handler_journal.jsonl"
+JOURNAL_VERSION = 1
+
+# The journal is flushed after every image and fsync'ed this often, in seconds
+SYNC_INTERVAL = 2.0
+
+
+def _source_signature(image_file, stat):
+    if stat is not None:
+        return [stat.st_size, stat.st_mtime_ns]
+    # ArchiveMember items carry their bytes and mtime instead of a stat
+    data = getattr(image_file, "data", None)
+    return [len(data), image_file.mtime] if data is not None else None
+
+
+class BatchJournal:
+    """Progress journal of the batch writing to ``output_path``
+
+    Create it with ``open``, pass it to ``core.run_batch`` and the batch
+    calls ``start``, ``record`` and ``close``. With ``resume`` set, images
+    the previous batch finished are skipped when it ran with the same
+    settings on the same input; otherwise the journal is started afresh. ``input_path`` and
+    ``settings`` (any JSON data, e.g. the GUI form) are stored in the new
+    journal so a later resume can restart the batch the same way.
+    """
+
+    def __init__(self, path, header=None, done=None, complete=False, resume=False, input_path=None,
+                 settings=None):
+        self.path = Path(path)
+        self.header = header  # First line of the journal on disk, None when there is none
+        self.done = done if done is not None else {}  # Key -> record of a finished image
+        self.complete = complete  # Whether the batch on disk ran to the end
+        self.resume = resume
+        self.resumed = 0  # Images skipped because the previous batch finished them
+        self._input_path = input_path
+        self._settings = settings
+        self._file = None
+        self._synced = 0.0
+
+    @classmethod
+    def open(cls, output_path, resume=False, input_path=None, settings=None):
+        """Read the journal of ``output_path``, if any, for a new batch"""
+        path = Path(output_path) / JOURNAL_NAME
+        header = None
+        done = {}
+        complete = False
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Cut short by a crash
+                    if header is None:
+                        if record.get("version") != JOURNAL_VERSION:
+                            break
+                        header = record
+                    elif "key" in record:
+                        if record["status"] == "done":
+                            done[record["key"]] = record
+                        else:
+                            done.pop(record["key"], None)
+                    elif "end" in record:
+                        complete = record["end"] == "complete"
+        except OSError:
+            pass  # No journal yet
+        return cls(path, header, done, complete, resume, input_path, settings)
+
+    @property
+    def input_path(self):
+        """Input folder or archive of the batch in the journal"""
+        return self.header.get("input") if self.header else None
+
+    def same_input(self, input_path):
+        """True when ``input_path`` is the input folder or archive of the batch in the journal"""
+        return self.input_path is not None and \
+            os.path.normcase(os.path.abspath(input_path)) == os.path.normcase(self.input_path)
+
+    @property
+    def settings(self):
+        """Settings the batch in the journal was started with"""
+        return self.header.get("settings", {}) if self.header else {}
+
+    @property
+    def resumable(self):
+        """True when the journal on disk is a batch that stopped before the end"""
+        return self.header is not None and not self.complete
+
+    def _append(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        now = time.monotonic()
+        if now - self._synced >= SYNC_INTERVAL:
+            os.fsync(self._file.fileno())
+            self._synced = now
+
+    def start(self, fingerprint):
+        """Begin the batch: continue the journal on disk when resuming with the same settings
+
+        Returns True when the previous batch is resumed, False when a new
+        journal was started.
+        """
+        resumed = (self.resume and self.header is not None and self.header.get("fingerprint") == fingerprint
+                   and (self._input_path is None or self.same_input(self._input_path)))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if resumed:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                cut_short = f.read(1) != b"\n"
+            self._file = open(self.path, "a", encoding="utf-8")
+            if cut_short:
+                self._file.write("\n")  # End the line a crash cut short
+            self._append({"resumed": time.time()})
+        else:
+            self.done = {}
+            self.complete = False
+            self.header = {
+                "version": JOURNAL_VERSION,
+                "started": time.time(),
+                "input": os.path.abspath(self._input_path) if self._input_path is not None else None,
+                "fingerprint": fingerprint,
+                "settings": self._settings or {},
+            }
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._append(self.header)
+        return resumed
+
+    def is_done(self, key, image_file, stat):
+        """Return the record of ``key`` if the resumed batch already finished it, else None"""
+        record = self.done.get(key)
+        if record is None:
+            return None
+        if record["source"] is None or record["source"] != _source_signature(image_file, stat):
+            return None
+        if not all(os.path.exists(output) for output in record["outputs"]):
+            return None
+        return record
+
+    def record(self, key, image_file, stat, task):
+        """Append the outcome of one image"""
+        succeeded = task["status"].startswith("✓")
+        record = {"key": key, "status": "done" if succeeded else "failed"}
+        if succeeded:
+            outputs = task.get("output_files", [task["output_file"]])
+            record.update({
+                "source": _source_signature(image_file, stat),
+                "output": os.path.abspath(task["output_file"]),
+                "outputs": [os.path.abspath(output) for output in outputs],
+                "original_size": task["original_size"],
+                "new_size": task["new_size"],
+            })
+            self.done[key] = record
+        else:
+            self.done.pop(key, None)
+        self._append(record)
+
+    def close(self, complete):
+        """Mark the batch as complete or stopped and release the file"""
+        if self._file is None:
+            return
+        self.complete = complete
+        self._append({"end": "complete" if complete else "stopped", "time": time.time()})
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
@@ -0,0 +1,187 @@
+"""Memory-bounded resizing of very large TIFFs.
+
+Pillow decodes a compressed TIFF in one go, so resizing a 30k x 20k scan
+needs the whole decoded image in memory before a single output pixel is
+produced. Here the image is decoded a band of strips (or a row of tiles) at
+a time instead: each band is wrapped in a small in-memory TIFF that libtiff
+decodes on its own, resampled into its slice of the output with
+``Image.resize(box=...)`` and dropped. Bands overlap by the filter support,
+so the result matches a full-image resize.
+"""
+
+import io
+import math
+import struct
+
+# Default per-worker memory budget for large-image mode
+DEFAULT_MEMORY_BUDGET = 512 * 1024 ** 2
+
+# Filter support in source pixels at scale 1; None is Pillow's default (BICUBIC)
+_FILTER_SUPPORT = {0: 0.5, 1: 3.0, 2: 1.0, 3: 2.0, 4: 0.5, 5: 1.0, None: 2.0}
+
+# TIFF tags needed to decode a band; everything else (EXIF, XMP, sub-IFDs...)
+# is left out of the in-memory band files
+_DECODE_TAGS = {
+    256, 257, 258, 259, 262, 266, 277, 278, 284, 292, 293, 317, 320, 322, 323,
+    338, 339, 347, 529, 530, 531, 532,
+}
+STRIP_OFFSETS, ROWS_PER_STRIP, STRIP_BYTE_COUNTS = 273, 278, 279
+TILE_WIDTH, TILE_LENGTH, TILE_OFFSETS, TILE_BYTE_COUNTS = 322, 323, 324, 325
+IMAGE_LENGTH, BITS_PER_SAMPLE, COMPRESSION, PLANAR_CONFIGURATION = 257, 258, 259, 284
+LONG = 4
+
+
+def pixel_bytes(mode):
+    """Bytes per pixel Pillow uses to hold an image of ``mode`` in memory"""
+    if mode in ("1", "L", "P"):
+        return 1
+    if mode.startswith("I;16"):
+        return 2
+    return 4
+
+
+def image_bytes(size, mode):
+    """Memory needed to hold a decoded image of ``size`` and ``mode``"""
+    return size[0] * size[1] * pixel_bytes(mode)
+
+
+class StripLayout:
+    """Where the strips or tiles of a TIFF live, grouped into rows
+
+    ``unit`` is the number of image rows per group (RowsPerStrip or
+    TileLength) and ``groups[i]`` the ``(offset, byte_count)`` chunks of the
+    i-th group, left to right.
+    """
+
+    def __init__(self, img):
+        tags = img.tag_v2
+        width, height = img.size
+        if TILE_OFFSETS in tags:
+            offsets, counts = tags[TILE_OFFSETS], tags[TILE_BYTE_COUNTS]
+            self.unit = tags[TILE_LENGTH]
+            across = math.ceil(width / tags[TILE_WIDTH])
+            self.offset_tags = (TILE_OFFSETS, TILE_BYTE_COUNTS)
+        else:
+            offsets, counts = tags[STRIP_OFFSETS], tags[STRIP_BYTE_COUNTS]
+            self.unit = min(tags.get(ROWS_PER_STRIP, height), height)
+            across = 1
+            self.offset_tags = (STRIP_OFFSETS, STRIP_BYTE_COUNTS)
+            if tags.get(COMPRESSION, 1) == 1 and self.unit > 1:
+                # Uncompressed strips (Pillow writes a single one) split into rows
+                row_bytes = math.ceil(width * sum(img.tag_v2[BITS_PER_SAMPLE]) / 8)
+                offsets, counts = zip(*((offset + row * row_bytes, row_bytes)
+                                        for offset in offsets for row in range(self.unit)))
+                offsets, counts = offsets[:height], counts[:height]
+                self.unit = 1
+        chunks = list(zip(offsets, counts))
+        self.groups = [chunks[i:i + across] for i in range(0, len(chunks), across)]
+        if len(self.groups) != math.ceil(height / self.unit):
+            raise ValueError("Strip count does not match the image height")
+        self.img = img
+        self.height = height
+
+    def decode(self, first, last):
+        """Decode groups ``first`` to ``last`` (exclusive) as a separate image"""
+        from PIL import Image, TiffImagePlugin
+
+        img = self.img
+        source = img.tag_v2
+        header = source.prefix + struct.pack("<HL" if source.prefix == b"II" else ">HL", 42, 8)
+        ifd = TiffImagePlugin.ImageFileDirectory_v2(ifh=header)
+        for tag in _DECODE_TAGS & set(source.keys()):
+            ifd.tagtype[tag] = source.tagtype[tag]
+            ifd[tag] = source[tag]
+        ifd[IMAGE_LENGTH] = min(last * self.unit, self.height) - first * self.unit
+        if TILE_OFFSETS not in source:
+            ifd.tagtype[ROWS_PER_STRIP] = LONG
+            ifd[ROWS_PER_STRIP] = self.unit
+
+        chunks = [chunk for group in self.groups[first:last] for chunk in group]
+        offsets_tag, counts_tag = self.offset_tags
+        for tag in self.offset_tags:
+            ifd.tagtype[tag] = LONG
+        # First pass sizes the IFD, the second fills in where the data landed
+        ifd[offsets_tag] = tuple(0 for _ in chunks)
+        ifd[counts_tag] = tuple(count for _, count in chunks)
+        data_start = 8 + len(ifd.tobytes(8))
+        positions = []
+        # Pillow writes StripOffsets relative to the end of the IFD (it lays
+        # out its own files that way), TileOffsets as given
+        position = 0 if offsets_tag == STRIP_OFFSETS else data_start
+        for _, count in chunks:
+            positions.append(position)
+            position += count
+        ifd[offsets_tag] = tuple(positions)
+
+        band = io.BytesIO()
+        band.write(header)
+        band.write(ifd.tobytes(8))
+        fp = img.fp
+        for offset, count in chunks:
+            fp.seek(offset)
+            band.write(fp.read(count))
+        band.seek(0)
+        with Image.open(band) as band_img:
+            band_img.load()
+            return band_img.copy() if band_img.mode == img.mode else band_img.convert(img.mode)
+
+
+def strip_layout(img):
+    """Return the StripLayout of a TIFF that can be decoded in bands, or None"""
+    if img.format != "TIFF" or not hasattr(img, "tag_v2"):
+        return None
+    try:
+        if img.tag_v2.get(PLANAR_CONFIGURATION, 1) != 1:
+            return None
+        layout = StripLayout(img)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return layout if len(layout.groups) > 1 else None
+
+
+def needs_strips(img, memory_budget):
+    """Whether ``img`` is too big to decode at once within ``memory_budget``"""
+    return image_bytes(img.size, img.mode) > memory_budget and img.format == "TIFF"
+
+
+def resize_in_strips(img, size, resample=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Resize a not yet decoded TIFF band by band, returning ``(image, bands)``
+
+    Returns ``(None, 0)`` when the file cannot be decoded in bands (a single
+    strip, separate colour planes...), so the caller can fall back to a
+    normal resize.
+    """
+    from PIL import Image
+
+    layout = strip_layout(img)
+    if layout is None:
+        return None, 0
+    width, height = img.size
+    new_width, new_height = size
+    scale = height / new_height
+    margin = math.ceil(_FILTER_SUPPORT.get(resample, 3.0) * max(scale, 1.0)) + 1
+
+    # Rows per band: half the budget for the decoded band, the rest for the
+    # output and the resampling buffers
+    budget_rows = max(layout.unit, memory_budget // 2 // max(1, width * pixel_bytes(img.mode)))
+    out_rows = max(1, int((budget_rows - 2 * margin) / scale))
+
+    kwargs = {} if resample is None else {"resample": resample}
+    output = Image.new(img.mode, size)
+    bands = 0
+    out_y = 0
+    while out_y < new_height:
+        rows = min(out_rows, new_height - out_y)
+        top = out_y * scale
+        bottom = min(height, (out_y + rows) * scale)
+        first = max(0, math.floor(top) - margin) // layout.unit
+        last = math.ceil(min(height, math.ceil(bottom) + margin) / layout.unit)
+        band = layout.decode(first, last)
+        band_top = first * layout.unit
+        piece = band.resize((new_width, rows), box=(0, top - band_top, width, bottom - band_top), **kwargs)
+        output.paste(piece, (0, out_y))
+        del band, piece
+        bands += 1
+        out_y += rows
+    output.info = img.info.copy()
+    return output, bands
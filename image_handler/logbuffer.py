@@ -0,0 +1,81 @@
+"""Bounded in-memory storage for processing log records."""
+
+from collections import deque
+from itertools import islice
+
+DEFAULT_LOG_CAPACITY = 100000
+
+
+class LogRecord:
+    """One log entry as shown in the log view"""
+
+    __slots__ = ("seq", "msg_type", "content", "timestamp")
+
+    def __init__(self, seq, msg_type, content, timestamp):
+        self.seq = seq
+        self.msg_type = msg_type
+        self.content = content
+        self.timestamp = timestamp
+
+    def format(self, type_width=0):
+        """Render as ``[time] [Type] message``, padding the type to ``type_width``"""
+        return f"[{self.timestamp}] [{self.msg_type:{type_width}s}] {self.content}"
+
+
+class LogBuffer:
+    """Ring buffer of LogRecords that drops the oldest entries past ``capacity``
+
+    Every record gets an increasing sequence number so views can address a
+    window of the buffer even while old records are being evicted.
+    """
+
+    def __init__(self, capacity=DEFAULT_LOG_CAPACITY):
+        self.capacity = max(1, int(capacity))
+        self._records = deque(maxlen=self.capacity)
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    @property
+    def first_seq(self):
+        """Sequence number of the oldest record still held"""
+        return self._next_seq - len(self._records)
+
+    @property
+    def end_seq(self):
+        """Sequence number the next record will get"""
+        return self._next_seq
+
+    def append(self, msg_type, content, timestamp):
+        record = LogRecord(self._next_seq, msg_type, content, timestamp)
+        self._next_seq += 1
+        self._records.append(record)
+        return record
+
+    def clear(self):
+        self._records.clear()
+
+    def get(self, seq):
+        """Return the record with sequence number ``seq`` or None if evicted"""
+        index = seq - self.first_seq
+        if 0 <= index < len(self._records):
+            return self._records[index]
+        return None
+
+    def window(self, start_seq, count):
+        """Return up to ``count`` records starting at sequence ``start_seq``"""
+        start = max(0, start_seq - self.first_seq)
+        if start > len(self._records) // 2:
+            # deque indexing is cheapest from the nearest end
+            tail = len(self._records) - start
+            return list(islice(reversed(self._records), tail))[::-1][:count]
+        return list(islice(self._records, start, start + count))
+
+    def iter_lines(self, type_width=0):
+        """Yield every record formatted as a text line, oldest first"""
+        for record in self._records:
+            yield record.format(type_width)
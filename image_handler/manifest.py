@@ -0,0 +1,118 @@
+"""Manifest of processed images, used to skip unchanged files on re-runs."""
+
+import dataclasses
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_NAME = ".image_handler_manifest.json"
+MANIFEST_VERSION = 1
+
+# Save the manifest after this many new records, so an interrupted run keeps most of its progress
+SAVE_EVERY = 500
+
+_HASH_CHUNK = 1024 * 1024
+
+# JobPlan fields that change how an image is processed but not the result
+_RUNTIME_FIELDS = ("memory_budget",)
+
+
+def _normalised(value):
+    # Numbers as floats, so percentage=50 and percentage=50.0 hash the same
+    if isinstance(value, dict):
+        return {key: _normalised(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalised(item) for item in value]
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def plan_fingerprint(plan):
+    """Stable digest of every JobPlan setting that affects the output"""
+    settings = dataclasses.asdict(plan)
+    for options in (settings, *settings.get("renditions", ())):
+        for name in _RUNTIME_FIELDS:
+            options.pop(name, None)
+    settings = json.dumps(_normalised(settings), sort_keys=True, default=str)
+    return hashlib.sha1(settings.encode("utf-8")).hexdigest()
+
+
+def file_digest(path):
+    """BLAKE2b digest of a file's content"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Source stat, optional content hash and job fingerprint per processed image
+
+    Entries are keyed by the source path relative to the input folder. An
+    image is up to date when its size and mtime (or, with ``use_hash``, its
+    content) match the entry, the job fingerprint is the same and every
+    recorded output file (one per rendition) still exists.
+    """
+
+    def __init__(self, path, entries=None, use_hash=False):
+        self.path = Path(path)
+        self.entries = entries if entries is not None else {}
+        self.use_hash = use_hash
+        self._unsaved = 0
+
+    @classmethod
+    def load(cls, output_path, use_hash=False):
+        """Load the manifest of ``output_path`` (an empty one if missing or unreadable)"""
+        path = Path(output_path) / MANIFEST_NAME
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            entries = data["entries"] if data.get("version") == MANIFEST_VERSION else {}
+        except (OSError, ValueError, KeyError, AttributeError):
+            entries = {}
+        return cls(path, entries, use_hash)
+
+    def is_up_to_date(self, key, source_path, stat, fingerprint):
+        """Return the entry for ``key`` if its output can be reused, else None"""
+        entry = self.entries.get(key)
+        if entry is None or entry["fingerprint"] != fingerprint or entry["size"] != stat.st_size:
+            return None
+        if entry["mtime_ns"] != stat.st_mtime_ns:
+            # Touched but maybe not changed: only the content hash can tell
+            if not (self.use_hash and entry.get("hash") and entry["hash"] == file_digest(source_path)):
+                return None
+            entry["mtime_ns"] = stat.st_mtime_ns
+            self._unsaved += 1
+        if not all(os.path.exists(output) for output in entry.get("outputs", [entry["output"]])):
+            return None
+        return entry
+
+    def record(self, key, source_path, stat, fingerprint, task):
+        """Remember a successfully processed image"""
+        self.entries[key] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": file_digest(source_path) if self.use_hash else None,
+            "fingerprint": fingerprint,
+            "output": os.path.abspath(task["output_file"]),
+            "outputs": [os.path.abspath(output) for output in task.get("output_files", [task["output_file"]])],
+            "original_size": task["original_size"],
+            "new_size": task["new_size"],
+        }
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY:
+            self.save()
+
+    def save(self):
+        """Write the manifest atomically (temp file + rename)"""
+        if not self._unsaved and self.path.exists():
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "entries": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
@@ -0,0 +1,192 @@
+"""Rewrite the DPI of JPEG, PNG and TIFF files without touching the pixels.
+
+``set_dpi`` edits only the resolution fields of the encoded byte stream:
+the JFIF density (and EXIF resolution tags when present) of a JPEG, the
+pHYs chunk of a PNG, and the XResolution/YResolution/ResolutionUnit tags of
+every TIFF page. Compressed pixel data is copied through unchanged, so
+DPI-only jobs are lossless and run at disk speed. Anything it does not
+understand returns None and the caller falls back to a full re-encode.
+"""
+
+import struct
+import zlib
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# TIFF tags and field types used here
+_X_RESOLUTION = 282
+_Y_RESOLUTION = 283
+_RESOLUTION_UNIT = 296
+_SHORT = 3
+_LONG = 4
+_RATIONAL = 5
+_INCH = 2
+
+
+def sniff_format(data):
+    """Pillow format name of an encoded image, for the formats ``set_dpi`` edits"""
+    if data[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if data[:8] == PNG_SIGNATURE:
+        return "PNG"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "TIFF"
+    return None
+
+
+def set_dpi(data, dpi):
+    """Return ``data`` with its resolution set to ``dpi``, or None if unsupported"""
+    editor = {"JPEG": _jpeg_set_dpi, "PNG": _png_set_dpi, "TIFF": _tiff_set_dpi}.get(sniff_format(data))
+    if editor is None:
+        return None
+    try:
+        return editor(data, int(dpi))
+    except (struct.error, IndexError, ValueError):
+        return None  # Truncated or unusual file, let the full path deal with it
+
+
+# --- JPEG ---
+
+def _jpeg_set_dpi(data, dpi):
+    if dpi > 0xFFFF:
+        return None
+    out = bytearray(data)
+    position = 2
+    jfif = False
+    while position + 4 <= len(out):
+        if out[position] != 0xFF:
+            return None
+        marker = out[position + 1]
+        if marker == 0xFF:  # Fill byte
+            position += 1
+            continue
+        if marker in (0xDA, 0xD9):  # Start of scan: no more metadata
+            break
+        length = struct.unpack(">H", out[position + 2:position + 4])[0]
+        segment = position + 4
+        if marker == 0xE0 and out[segment:segment + 5] == b"JFIF\x00" and length >= 16:
+            # units (1 = dots per inch), Xdensity, Ydensity
+            struct.pack_into(">BHH", out, segment + 7, 1, dpi, dpi)
+            jfif = True
+        elif marker == 0xE1 and out[segment:segment + 6] == b"Exif\x00\x00":
+            _tiff_update_tags(out, segment + 6, segment + length - 2, dpi, first_only=True)
+        position = segment + length - 2
+    else:
+        return None
+    if not jfif:
+        # Pillow and most readers take the DPI from JFIF first, so add one
+        # right after SOI, where a JFIF segment has to be
+        app0 = b"\xff\xe0" + struct.pack(">H5sBBBHHBB", 16, b"JFIF\x00", 1, 1, 1, dpi, dpi, 0, 0)
+        out[2:2] = app0
+    return bytes(out)
+
+
+# --- PNG ---
+
+def _png_chunk(kind, payload):
+    return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+
+def _png_set_dpi(data, dpi):
+    pixels_per_meter = int(dpi / 0.0254 + 0.5)  # Same rounding as Pillow
+    phys = _png_chunk(b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+    position = len(PNG_SIGNATURE)
+    while position + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[position:position + 8])
+        end = position + 12 + length
+        if end > len(data):
+            return None
+        if kind == b"pHYs":
+            return data[:position] + phys + data[end:]
+        if kind in (b"IDAT", b"IEND"):
+            # pHYs must come before the image data
+            return data[:position] + phys + data[position:]
+        position = end
+    return None
+
+
+# --- TIFF ---
+
+def _tiff_set_dpi(data, dpi):
+    out = bytearray(data)
+    if not _tiff_update_tags(out, 0, len(out), dpi, first_only=False):
+        return None
+    return bytes(out)
+
+
+def _tiff_update_tags(out, base, end, dpi, first_only):
+    """Set the resolution tags of the TIFF structure at ``out[base:end]`` in place
+
+    Tags that are missing are added by appending a rewritten IFD at the end
+    of the file, which is only possible for a standalone TIFF (not EXIF
+    inside a JPEG, where missing tags are left alone). Returns False when
+    the structure cannot be edited.
+    """
+    order = {b"II": "<", b"MM": ">"}.get(bytes(out[base:base + 2]))
+    if order is None or struct.unpack(order + "H", out[base + 2:base + 4])[0] != 42:
+        return False  # BigTIFF and garbage are not edited
+    pointer = base + 4  # Where the offset of the next IFD is stored
+    offset = struct.unpack(order + "I", out[pointer:pointer + 4])[0]
+    seen = set()
+    while offset and offset not in seen:
+        seen.add(offset)
+        ifd = base + offset
+        if ifd + 2 > end:
+            return False
+        count = struct.unpack(order + "H", out[ifd:ifd + 2])[0]
+        entries = []
+        for index in range(count):
+            entry = ifd + 2 + index * 12
+            entries.append((entry, *struct.unpack(order + "HHI", out[entry:entry + 8])))
+        tags = {tag: (entry, kind, number) for entry, tag, kind, number in entries}
+        next_pointer = ifd + 2 + count * 12
+        missing = [tag for tag in (_X_RESOLUTION, _Y_RESOLUTION, _RESOLUTION_UNIT) if tag not in tags]
+        for tag in (_X_RESOLUTION, _Y_RESOLUTION):
+            if tag in tags:
+                entry, kind, number = tags[tag]
+                if kind != _RATIONAL or number != 1:
+                    return False
+                value = base + struct.unpack(order + "I", out[entry + 8:entry + 12])[0]
+                struct.pack_into(order + "II", out, value, dpi, 1)
+        if _RESOLUTION_UNIT in tags:
+            entry, kind, number = tags[_RESOLUTION_UNIT]
+            if kind == _SHORT:
+                struct.pack_into(order + "HH", out, entry + 8, _INCH, 0)
+            elif kind == _LONG:
+                struct.pack_into(order + "I", out, entry + 8, _INCH)
+            else:
+                return False
+        if missing and not first_only:
+            next_pointer = _tiff_append_ifd(out, order, pointer, ifd, count, entries, missing, dpi)
+        if first_only:
+            break
+        pointer = next_pointer
+        offset = struct.unpack(order + "I", out[pointer:pointer + 4])[0]
+    return True
+
+
+def _tiff_append_ifd(out, order, pointer, ifd, count, entries, missing, dpi):
+    # Copy the IFD with the missing tags to the end of the file and point the
+    # previous link at the copy; the old IFD just becomes unused bytes.
+    # Offsets inside the copied entries are absolute, so they stay valid.
+    # Returns where the copy stores the offset of the next IFD.
+    if len(out) % 2:
+        out.append(0)
+    rationals = len(out)
+    for tag in missing:
+        if tag != _RESOLUTION_UNIT:
+            out += struct.pack(order + "II", dpi, 1)
+    new_entries = [bytes(out[entry:entry + 12]) for entry, _, _, _ in entries]
+    value = rationals
+    for tag in missing:
+        if tag == _RESOLUTION_UNIT:
+            new_entries.append(struct.pack(order + "HHIHH", tag, _SHORT, 1, _INCH, 0))
+        else:
+            new_entries.append(struct.pack(order + "HHII", tag, _RATIONAL, 1, value))
+            value += 8
+    new_entries.sort(key=lambda entry: struct.unpack(order + "H", entry[:2])[0])
+    next_ifd = out[ifd + 2 + count * 12:ifd + 6 + count * 12]
+    new_ifd = len(out)
+    out += struct.pack(order + "H", len(new_entries)) + b"".join(new_entries) + next_ifd
+    struct.pack_into(order + "I", out, pointer, new_ifd)
+    return len(out) - 4
@@ -0,0 +1,185 @@
+"""Read-ahead and write-behind stages around the processing engine.
+
+Without them every image is read, processed and written in strict sequence
+by the same worker, so the disk idles while the CPU works and the other way
+round, which is slow on network shares. ``Prefetcher`` runs the job
+iterator in a reader thread that loads upcoming files into memory, so
+workers decode from buffers; ``WriteBehind`` flushes encoded outputs from a
+writer thread. Both hold at most ``max_bytes`` in their queue and block the
+producer when it is full, which applies backpressure and caps memory.
+"""
+
+import threading
+from collections import deque
+from pathlib import PurePath
+
+from .core import ArchiveMember, _write
+
+
+class Prefetcher:
+    """Iterate over ``jobs`` in a reader thread, loading files ahead of the consumer
+
+    ``load`` turns a job into ``(job, nbytes)``, typically replacing a path
+    with its contents. The reader stops once ``max_bytes`` are buffered (a
+    single larger job is still let through on its own) or ``max_items``
+    jobs are waiting, and resumes as the consumer takes jobs.
+    """
+
+    def __init__(self, jobs, load, max_bytes, max_items=64, should_stop=None):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.should_stop = should_stop
+        self._load = load
+        self._jobs = jobs
+        self._queue = deque()  # (job, nbytes)
+        self._buffered = 0
+        self._done = False
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="image-handler-prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for job in self._jobs:
+                if self.should_stop is not None and self.should_stop():
+                    break
+                job, nbytes = self._load(job)
+                with self._condition:
+                    while not self._closed and self._queue and (
+                            self._buffered + nbytes > self.max_bytes or len(self._queue) >= self.max_items):
+                        self._condition.wait()
+                    if self._closed:
+                        break
+                    self._queue.append((job, nbytes))
+                    self._buffered += nbytes
+                    self._condition.notify_all()
+        except BaseException as e:  # Re-raised in the consumer
+            self._error = e
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self._condition:
+            while not self._queue and not self._done:
+                self._condition.wait()
+            if self._queue:
+                job, nbytes = self._queue.popleft()
+                self._buffered -= nbytes
+                self._condition.notify_all()
+                return job
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        raise StopIteration
+
+    def close(self):
+        """Stop reading ahead and wait for the reader thread"""
+        with self._condition:
+            self._closed = True
+            self._queue.clear()
+            self._buffered = 0
+            self._condition.notify_all()
+        self._thread.join()
+
+
+def load_file(path, max_bytes):
+    """Read ``path`` into an in-memory ArchiveMember, unless it is bigger than ``max_bytes``
+
+    Returns ``(item, nbytes)``; files that are too big (or unreadable) are
+    left as paths for the worker to read itself.
+    """
+    try:
+        stat = path.stat()
+        if stat.st_size > max_bytes:
+            return path, 0
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return path, 0  # Let process_image report the error
+    return ArchiveMember(PurePath(path.name), data, stat.st_mtime), len(data)
+
+
+class WriteBehind:
+    """Write ``(path, data)`` pairs to disk from a writer thread
+
+    ``write`` returns as soon as the data is queued and blocks while more
+    than ``max_bytes`` are waiting. It returns a ticket for ``flushed``, which
+    tells when that write and every one before it are on disk. A failed write
+    is raised from the next ``write``, ``flushed`` or ``close`` call (``close``
+    flushes everything still queued); nothing after it is written.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.count = 0
+        self.written = 0  # Writes on disk, in queue order up to the first failure
+        self._tickets = 0
+        self._queue = deque()
+        self._queued = 0
+        self._closed = False
+        self._error = None
+        self._failed = False  # Stays set once a write failed, unlike _error which is raised once
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="image-handler-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                path, data = self._queue[0]
+            failed = self._failed
+            if not failed:
+                try:
+                    _write(data, path)
+                except BaseException as e:
+                    self._error = e
+                    self._failed = failed = True
+            with self._condition:
+                self.written += not failed
+                self._queue.popleft()
+                self._queued -= len(data)
+                self.count += 1
+                self._condition.notify_all()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def write(self, path, data):
+        """Queue ``data`` to be written to ``path`` and return its ticket"""
+        self._raise_error()
+        with self._condition:
+            while self._queue and self._queued + len(data) > self.max_bytes and not self._failed:
+                self._condition.wait()
+            self._queue.append((path, data))
+            self._queued += len(data)
+            self._tickets += 1
+            self._condition.notify_all()
+            return self._tickets
+
+    def flushed(self, ticket):
+        """True once the write that returned ``ticket`` is on disk"""
+        if self.written >= ticket:
+            return True
+        self._raise_error()
+        return False
+
+    def close(self):
+        """Flush the queue and stop the writer thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._raise_error()
@@ -0,0 +1,228 @@
+"""Header-only pre-scan that plans a batch before any pixel is decoded.
+
+``Image.open`` only parses the header, so size, mode, format and DPI of a
+whole folder can be collected in a fraction of the processing time. The
+resulting BatchPlan totals the work, estimates output sizes and run time,
+lists files that are bound to fail and orders the work largest first, which
+keeps every worker busy until the end of the batch instead of leaving one
+grinding through a huge file that happened to come last.
+"""
+
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from .core import ArchiveMember, ScanEntry, open_image, process_image
+
+# Largest output side each encoder accepts
+MAX_OUTPUT_SIDE = {"JPEG": 65500, "WEBP": 16383}
+
+# Typical encoded bytes per output pixel, used when the output format differs
+# from the source; TIFF is written uncompressed
+_BYTES_PER_PIXEL = {"JPEG": 0.25, "WEBP": 0.2, "PNG": 1.5}
+
+# Size of the synthetic image used to calibrate throughput
+CALIBRATION_SIZE = (2000, 1500)
+
+PlannedImage = namedtuple("PlannedImage", [
+    "item",           # what to hand to run_batch (path or ScanEntry; an ArchiveMember without its data)
+    "name",           # display name, relative to the scan root
+    "file_size",      # bytes on disk
+    "size",           # (w, h) or None when the header could not be read
+    "mode",
+    "format",
+    "dpi",
+    "output_size",    # (w, h) after resizing
+    "output_bytes",   # estimated encoded size
+    "error",          # why the image will fail, or None
+])
+
+
+def _describe(item):
+    if isinstance(item, ArchiveMember):
+        return item.relative.as_posix(), len(item.data)
+    path = Path(item.path) if isinstance(item, ScanEntry) else Path(item)
+    name = item.relative.as_posix() if isinstance(item, ScanEntry) else path.name
+    try:
+        return name, path.stat().st_size
+    except OSError:
+        return name, 0
+
+
+def _output_bytes(plan, source_format, file_size, size, output_size, mode):
+    output_format = plan.pil_format or source_format
+    pixels = output_size[0] * output_size[1]
+    if output_format == source_format and size[0] * size[1]:
+        return int(file_size * pixels / (size[0] * size[1]))
+    if output_format == "TIFF":
+        band_bytes = 2 if mode.startswith("I;16") else 4 if mode in ("I", "F") else 1
+        from PIL import Image
+
+        return pixels * Image.getmodebands(mode) * band_bytes
+    return int(pixels * _BYTES_PER_PIXEL.get(output_format, 1.0))
+
+
+def read_header(item, plan):
+    """Plan one image from its header only"""
+    name, file_size = _describe(item)
+    try:
+        with open_image(item.path if isinstance(item, ScanEntry) else item) as img:
+            size, mode, source_format = img.size, img.mode, img.format
+            dpi = img.info.get("dpi")
+    except Exception as e:
+        return PlannedImage(item, name, file_size, None, None, None, None, None, 0, f"unreadable: {e}")
+
+    error = None
+    output_bytes = 0
+    for output in plan.renditions or (plan,):
+        output_size = output.output_size(size)
+        output_format = output.pil_format or source_format
+        label = f"{output.name}: " if output.name else ""
+        if output_size[0] <= 0 or output_size[1] <= 0:
+            error = f"{label}output size {output_size[0]}x{output_size[1]} is empty"
+        elif max(output_size) > MAX_OUTPUT_SIDE.get(output_format, max(output_size)):
+            error = f"{label}{output_format} cannot store {output_size[0]}x{output_size[1]} pixels"
+        if error:
+            output_bytes = 0
+            break
+        output_bytes += _output_bytes(output, source_format, file_size, size, output_size, mode)
+    # The first output is the one listed in the plan
+    output_size = (plan.renditions[0] if plan.renditions else plan).output_size(size)
+    return PlannedImage(item, name, file_size, size, mode, source_format, dpi, output_size, output_bytes, error)
+
+
+def calibrate_throughput(plan, size=CALIBRATION_SIZE, repeat=2):
+    """Megapixels per second one worker processes with ``plan``
+
+    Measured by running ``process_image`` on a synthetic JPEG, so decoding,
+    resampling and encoding are all part of the figure.
+    """
+    from PIL import Image, ImageChops
+
+    width, height = size
+    noise = Image.effect_noise(size, 48)
+    gradient = Image.linear_gradient("L").resize(size)
+    image = Image.merge("RGB", (gradient, ImageChops.add(gradient, noise, scale=2.0), noise))
+    with tempfile.TemporaryDirectory(prefix="image_handler_calibrate_") as folder:
+        source = Path(folder) / "calibration.jpg"
+        output_path = Path(folder) / "out"
+        output_path.mkdir()
+        image.save(source, quality=90)
+        best = None
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            process_image(source, output_path, plan)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return width * height / 1e6 / max(best, 1e-6)
+
+
+class BatchPlan:
+    """Totals, estimates and largest-first order of a pre-scanned batch"""
+
+    def __init__(self, images, throughput=None, workers=1):
+        self.images = images
+        self.throughput = throughput  # megapixels per second per worker
+        self.workers = max(1, workers)
+        self.failing = [image for image in images if image.error]
+        readable = [image for image in images if image.size]
+        self.megapixels = sum(w * h for w, h in (image.size for image in readable)) / 1e6
+        self.source_bytes = sum(image.file_size for image in images)
+        self.output_bytes = sum(image.output_bytes for image in images)
+
+    def estimated_seconds(self):
+        """Run time with ``workers`` busy workers, or None without a throughput"""
+        if not self.throughput:
+            return None
+        largest = max((w * h for w, h in (image.size for image in self.images if image.size)), default=0) / 1e6
+        # Even a perfect schedule cannot finish before the largest image does
+        return max(self.megapixels / self.workers, largest) / self.throughput
+
+    def ordered(self):
+        """Items to process, largest first, images that will fail last
+
+        Archive members are planned from their headers but not kept in memory,
+        and streamed archives cannot be read out of order, so their batches
+        cannot be reordered; this raises ValueError for them.
+        """
+        if any(isinstance(image.item, ArchiveMember) for image in self.images):
+            raise ValueError("Archive input cannot be processed largest first: members are read in archive order")
+
+        def key(image):
+            return (image.error is not None, -(image.size[0] * image.size[1]) if image.size else 0)
+        return [image.item for image in sorted(self.images, key=key)]
+
+    def summary_lines(self, max_failures=20):
+        """Human readable ``[PLAN]`` log lines"""
+        lines = [
+            f"[PLAN] {len(self.images)} image(s), {self.megapixels:,.1f} MP, {_format_bytes(self.source_bytes)} to read",
+            f"[PLAN] Estimated output: {_format_bytes(self.output_bytes)}",
+        ]
+        seconds = self.estimated_seconds()
+        if seconds is not None:
+            lines.append(f"[PLAN] Estimated time: {_format_duration(seconds)} "
+                         f"({self.throughput:,.1f} MP/s per worker, {self.workers} worker(s))")
+        if self.failing:
+            lines.append(f"[PLAN] {len(self.failing)} image(s) will fail:")
+            for image in self.failing[:max_failures]:
+                lines.append(f"[PLAN]   {image.name}: {image.error}")
+            if len(self.failing) > max_failures:
+                lines.append(f"[PLAN]   ... and {len(self.failing) - max_failures} more")
+        return lines
+
+    def to_dict(self):
+        return {
+            "images": len(self.images),
+            "megapixels": round(self.megapixels, 3),
+            "source_bytes": self.source_bytes,
+            "estimated_output_bytes": self.output_bytes,
+            "throughput_mp_per_second": self.throughput,
+            "workers": self.workers,
+            "estimated_seconds": self.estimated_seconds(),
+            "failing": [{"name": image.name, "error": image.error} for image in self.failing],
+            "files": [{
+                "name": image.name,
+                "size": list(image.size) if image.size else None,
+                "mode": image.mode,
+                "format": image.format,
+                "dpi": list(image.dpi) if image.dpi else None,
+                "output_size": list(image.output_size) if image.output_size else None,
+                "estimated_output_bytes": image.output_bytes,
+            } for image in self.images],
+        }
+
+
+def prescan(items, plan, throughput=None, workers=1, should_stop=None):
+    """Read the header of every item and return a BatchPlan
+
+    The bytes of archive members are dropped once their header is read, so
+    planning a large archive does not hold all of it in memory; the archive
+    is scanned again to process it.
+    """
+    images = []
+    for item in items:
+        if should_stop is not None and should_stop():
+            break
+        image = read_header(item, plan)
+        if isinstance(item, ArchiveMember):
+            image = image._replace(item=item._replace(data=None))
+        images.append(image)
+    return BatchPlan(images, throughput, workers)
+
+
+def _format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:,.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m {seconds:02d}s"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
@@ -0,0 +1,67 @@
+"""Resampling filters and the fast downscale path."""
+
+# Resampling filters from fastest to highest quality, as the values of
+# Pillow's filter constants (the same in every Pillow version, and in
+# Image.Resampling since 9.1), so listing them does not import Pillow
+RESAMPLE_FILTERS = {
+    "NEAREST": 0,
+    "BOX": 4,
+    "BILINEAR": 2,
+    "HAMMING": 5,
+    "BICUBIC": 3,
+    "LANCZOS": 1,
+}
+
+# Keep the intermediate image at least this many times the target size, so
+# the final filter still has enough pixels to work with (same as thumbnail())
+DEFAULT_REDUCING_GAP = 2.0
+
+
+def resample_filter(name):
+    """Return the Pillow filter for ``name``, or None for Pillow's default"""
+    if not name:
+        return None
+    try:
+        return RESAMPLE_FILTERS[name.upper()]
+    except KeyError:
+        raise ValueError(f"Invalid resampling filter: '{name}'. Must be one of: {', '.join(RESAMPLE_FILTERS)}")
+
+
+def draft_image(img, size, reducing_gap=DEFAULT_REDUCING_GAP):
+    """Let a JPEG that has not been decoded yet decode at reduced scale
+
+    The scale is the largest of 1/2, 1/4 or 1/8 that keeps the image at least
+    ``reducing_gap`` times ``size``. Pillow applies only the first draft of an
+    image, so an image shared by several outputs has to be drafted for the
+    largest of them. Returns the decode reduction (1 when nothing changed).
+    """
+    if img.format != "JPEG":
+        return 1
+    original_width = img.size[0]
+    width, height = size
+    # draft() is a no-op for images that are already loaded
+    img.draft(img.mode, (int(width * reducing_gap), int(height * reducing_gap)))
+    return max(1, original_width // img.size[0])
+
+
+def resize_image(img, size, resample=None, fast=False, reducing_gap=DEFAULT_REDUCING_GAP):
+    """Resize ``img`` to ``size`` and return ``(image, draft_scale)``
+
+    With ``fast`` set, JPEGs that have not been decoded yet are decoded at
+    1/2, 1/4 or 1/8 scale through ``Image.draft`` when the target is small
+    enough, and the remaining resampling uses ``reducing_gap`` so most of the
+    work is done by the cheap integer ``reduce``. ``draft_scale`` is the
+    decode reduction that was applied (1 when the full image was decoded).
+    """
+    draft_scale = 1
+    kwargs = {}
+    if resample is not None:
+        kwargs["resample"] = resample
+
+    if fast:
+        width, height = size
+        draft_scale = draft_image(img, size, reducing_gap)
+        if width < img.size[0] and height < img.size[1]:
+            kwargs["reducing_gap"] = reducing_gap
+
+    return img.resize(size, **kwargs), draft_scale
@@ -0,0 +1,99 @@
+"""Streaming folder scanner built on ``os.scandir``."""
+
+import os
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+
+from .core import SUPPORTED_EXTENSIONS, ScanEntry
+
+_SIZE_UNITS = {"": 1, "B": 1, "K": 1024, "KB": 1024, "M": 1024 ** 2, "MB": 1024 ** 2,
+               "G": 1024 ** 3, "GB": 1024 ** 3}
+
+
+def parse_size(value):
+    """Parse a file size such as ``"2048"``, ``"500K"`` or ``"2MB"`` into bytes"""
+    text = str(value).strip().upper()
+    number = text.rstrip("KMGB")
+    unit = text[len(number):]
+    try:
+        size = float(number)
+    except ValueError:
+        size = -1
+    if unit not in _SIZE_UNITS or size < 0:
+        raise ValueError(f"Invalid size value: '{value}'. Use bytes or a K/M/G suffix (e.g. 500K)")
+    return int(size * _SIZE_UNITS[unit])
+
+
+def parse_patterns(value):
+    """Split a comma separated pattern list, as typed in the GUI"""
+    return tuple(p.strip() for p in value.split(",") if p.strip())
+
+
+def _matches(patterns, relative, name):
+    return any(fnmatch(relative, pattern) or fnmatch(name, pattern) for pattern in patterns)
+
+
+def is_excluded(relative, exclude):
+    """True when ``relative`` (a PurePosixPath below the scan root) matches an exclude pattern"""
+    return bool(exclude) and _matches(exclude, relative.as_posix(), relative.name)
+
+
+def name_matches(relative, include=(), exclude=(), extensions=SUPPORTED_EXTENSIONS):
+    """True when a file at ``relative`` passes the extension and pattern filters of ``scan_images``"""
+    if is_excluded(relative, exclude):
+        return False
+    if os.path.splitext(relative.name)[1].lower() not in extensions:
+        return False
+    return not include or _matches(include, relative.as_posix(), relative.name)
+
+
+def size_matches(size, min_size=None, max_size=None):
+    """True when ``size`` bytes is within the ``min_size``/``max_size`` filters of ``scan_images``"""
+    return (min_size is None or size >= min_size) and (max_size is None or size <= max_size)
+
+
+def scan_images(input_path, recursive=False, include=(), exclude=(), min_size=None, max_size=None,
+                extensions=SUPPORTED_EXTENSIONS):
+    """Yield a ScanEntry for every matching image below ``input_path``
+
+    Works as a generator so processing can start on the first file while the
+    rest of the tree is still being scanned. ``include``/``exclude`` are glob
+    patterns matched against the file name and the path relative to
+    ``input_path`` (excluded folders are not descended into). ``min_size`` and
+    ``max_size`` are in bytes. Symlinked folders are not followed.
+    """
+    root = Path(input_path)
+    pending = [(root, PurePosixPath())]
+    while pending:
+        folder, relative_folder = pending.pop()
+        try:
+            with os.scandir(folder) as entries:
+                subfolders = []
+                for entry in entries:
+                    relative = relative_folder / entry.name
+                    if is_excluded(relative, exclude):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                subfolders.append((Path(entry.path), relative))
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if not name_matches(relative, include, (), extensions):
+                        continue  # Exclusions were checked above
+                    if min_size is not None or max_size is not None:
+                        try:
+                            size = entry.stat().st_size
+                        except OSError:
+                            continue
+                        if not size_matches(size, min_size, max_size):
+                            continue
+                    yield ScanEntry(Path(entry.path), relative)
+        except OSError:
+            # Unreadable folder: skip it rather than abort the whole scan
+            continue
+        # Depth first, in the order the folders were listed
+        pending.extend(reversed(subfolders))
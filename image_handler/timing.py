@@ -0,0 +1,153 @@
+"""Per-stage timers for the image hot path and a batch throughput report
+
+``process_image`` times each stage of every image with a ``StageTimer`` and
+returns the seconds in ``task["timings"]``, together with the bytes read and
+written. ``BatchStats`` aggregates those tasks into p50/p95/max per stage and
+images/sec and MB/sec for the whole batch, which shows whether a slow run is
+waiting on the disk (decode, write) or on the CPU (resize, convert, encode).
+"""
+
+import json
+import time
+from contextlib import contextmanager
+
+# Stages of process_image, in hot path order. "decode" covers opening the file
+# and decoding the pixels; when decoding is deferred (fast downscale drafts,
+# large-image strips) it is counted under "resize" instead. The DPI-only fast
+# path reads the file under "decode" and rewrites its header under "encode".
+STAGES = ("decode", "resize", "convert", "encode", "write")
+
+
+class StageTimer:
+    """Accumulate wall-clock seconds per stage for one image"""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of ``values``, which must be sorted"""
+    if not values:
+        return 0.0
+    rank = max(1, round(fraction * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.1f} ms"
+
+
+class BatchStats:
+    """Aggregate the timings of a batch as it runs
+
+    Call ``add`` with every result task; tasks without timings (skipped or
+    cached images) are counted but not timed. The wall-clock time runs from
+    construction to ``stop`` (or to now while the batch is running).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stopped = None
+        self.samples = {stage: [] for stage in STAGES}
+        self.totals = []  # Seconds per timed image
+        self.timed = 0
+        self.reused = 0  # Skipped or cached, no work done
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add(self, task):
+        """Record one result task"""
+        if task["status"].startswith("✗"):
+            self.failed += 1
+        timings = task.get("timings")
+        if not timings:
+            self.reused += 1
+            return
+        self.timed += 1
+        for stage, seconds in timings.items():
+            self.samples.setdefault(stage, []).append(seconds)
+        self.totals.append(sum(timings.values()))
+        self.bytes_in += task.get("bytes_in", 0)
+        self.bytes_out += task.get("bytes_out", 0)
+
+    def stop(self):
+        """Freeze the wall-clock time at the end of the batch"""
+        if self.stopped is None:
+            self.stopped = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return (self.stopped or time.perf_counter()) - self.started
+
+    def _rate(self, amount):
+        elapsed = self.elapsed
+        return amount / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self):
+        """JSON-serialisable report; times in seconds, rates per second"""
+        busy = sum(sum(values) for values in self.samples.values())
+        stages = {}
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            values = sorted(values)
+            stages[stage] = {
+                "count": len(values),
+                "total": sum(values),
+                "share": sum(values) / busy if busy else 0.0,
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "max": values[-1],
+            }
+        totals = sorted(self.totals)
+        return {
+            "images": self.timed + self.reused,
+            "timed": self.timed,
+            "reused": self.reused,
+            "failed": self.failed,
+            "elapsed": self.elapsed,
+            "images_per_sec": self._rate(self.timed),
+            "mb_read_per_sec": self._rate(self.bytes_in / 1024 ** 2),
+            "mb_written_per_sec": self._rate(self.bytes_out / 1024 ** 2),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "per_image": {
+                "p50": percentile(totals, 0.50),
+                "p95": percentile(totals, 0.95),
+                "max": totals[-1] if totals else 0.0,
+            },
+            "stages": stages,
+        }
+
+    def summary_lines(self):
+        """Human readable report, one ``[STATS]`` line per row"""
+        report = self.to_dict()
+        lines = [
+            f"[STATS] {report['timed']} image(s) processed in {report['elapsed']:.2f}s: "
+            f"{report['images_per_sec']:.2f} images/s, {report['mb_read_per_sec']:.2f} MB/s read, "
+            f"{report['mb_written_per_sec']:.2f} MB/s written"
+        ]
+        if report["reused"]:
+            lines.append(f"[STATS] {report['reused']} image(s) skipped or reused without processing")
+        per_image = report["per_image"]
+        if report["timed"]:
+            lines.append(f"[STATS] {'per image':<9} p50 {_ms(per_image['p50']):>10}  "
+                         f"p95 {_ms(per_image['p95']):>10}  max {_ms(per_image['max']):>10}")
+        for stage, values in report["stages"].items():
+            lines.append(f"[STATS] {stage:<9} p50 {_ms(values['p50']):>10}  p95 {_ms(values['p95']):>10}  "
+                         f"max {_ms(values['max']):>10}  ({values['share']:.0%} of busy time)")
+        return lines
+
+    def save_json(self, path):
+        """Write ``to_dict`` to ``path``"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,412 @@
+"""Watch-folder mode: process images as they are dropped into a hot folder.
+
+``FolderWatcher`` reports files that are new or changed below a folder and
+have finished being written. On Linux it listens to inotify events, so
+nothing is rescanned while the folder is quiet; elsewhere (or when inotify
+is unavailable) it polls, and only lists the folders whose modification
+time changed, plus a full rescan now and then to catch files rewritten in
+place. ``watch_folder`` feeds every group of ready files to ``run_batch``
+until it is told to stop.
+
+A file is ready once it has been quiet for a while: ``CLOSE_SETTLE`` after
+the writer closed it or renamed it into place (inotify only), otherwise
+``settle`` seconds without its size or modification time changing. Empty
+files are held back until they get some content.
+"""
+
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path, PurePosixPath
+
+from .core import SUPPORTED_EXTENSIONS, ScanEntry, run_batch
+from .scanner import is_excluded, name_matches, size_matches
+
+# Seconds a file must stay unchanged before it is processed
+DEFAULT_SETTLE = 2.0
+# Quiet time after a writer closed the file or renamed it into place
+CLOSE_SETTLE = 0.2
+DEFAULT_POLL_INTERVAL = 1.0
+# Polling lists every folder this often, for files rewritten in place
+DEFAULT_RESCAN_INTERVAL = 60.0
+
+# inotify(7) constants
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+_WATCH_MASK = (_IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+               | _IN_ONLYDIR)
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len; followed by the name
+
+
+class _Inotify:
+    """Minimal ctypes binding, so no extra package is needed"""
+
+    def __init__(self):
+        import ctypes  # Only where inotify is used: slow to import and not needed by the poller
+        import ctypes.util
+
+        self._errno = ctypes.get_errno
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self._errno(), os.strerror(self._errno()))
+
+    def add_watch(self, path):
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(self._errno(), os.strerror(self._errno()), str(path))
+        return wd
+
+    def rm_watch(self, wd):
+        self._rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        """Events as ``(wd, mask, name)``, waiting up to ``timeout`` seconds for the first"""
+        if not select.select([self.fd], [], [], max(timeout, 0))[0]:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(buffer):
+            wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Folder:
+    __slots__ = ("relative", "wd", "mtime", "files")
+
+    def __init__(self, relative):
+        self.relative = relative
+        self.wd = None
+        self.mtime = None
+        self.files = {}  # Name -> (size, mtime_ns) of the files already reported
+
+
+class _Pending:
+    __slots__ = ("relative", "size", "mtime", "changed_at", "closed")
+
+    def __init__(self, relative, size, mtime, changed_at, closed):
+        self.relative = relative
+        self.size = size
+        self.mtime = mtime
+        self.changed_at = changed_at
+        self.closed = closed
+
+
+class FolderWatcher:
+    """Report files below ``root`` that are new or changed, once fully written
+
+    Files already in the folder when the watcher starts are reported too
+    (those still being written once they settle). ``include``, ``exclude``,
+    ``min_size`` and ``max_size`` filter like ``scanner.scan_images``;
+    folders in ``ignore`` (e.g. an output folder inside the input folder)
+    are not watched. ``use_inotify`` None picks inotify when available.
+    """
+
+    def __init__(self, root, recursive=False, include=(), exclude=(), min_size=None, max_size=None,
+                 settle=DEFAULT_SETTLE, poll_interval=DEFAULT_POLL_INTERVAL,
+                 rescan_interval=DEFAULT_RESCAN_INTERVAL, use_inotify=None, ignore=(),
+                 extensions=SUPPORTED_EXTENSIONS):
+        self.root = Path(root)
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.min_size = min_size
+        self.max_size = max_size
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.extensions = extensions
+        self.ignore = {os.path.realpath(path) for path in ignore}
+        self.folders = {}  # Path -> _Folder
+        self.pending = {}  # Path -> _Pending
+        self._watches = {}  # inotify watch descriptor -> folder Path
+        self._inotify = None
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                self._inotify = None  # No inotify in this libc, or no instances left
+        self._last_poll = self._last_rescan = time.monotonic()
+        try:
+            self._add_folder(self.root, PurePosixPath())
+        except OSError:
+            if self._inotify is None:
+                raise
+            # Out of watches, or a filesystem without inotify support
+            self._inotify.close()
+            self._inotify = None
+            self._watches.clear()
+            self._add_folder(self.root, PurePosixPath())
+
+    @property
+    def backend(self):
+        return "inotify" if self._inotify is not None else "polling"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    # --- Folders ---
+
+    def _add_folder(self, path, relative):
+        """Start watching ``path`` and list what is already in it"""
+        if path in self.folders or os.path.realpath(path) in self.ignore:
+            return
+        folder = _Folder(relative)
+        if self._inotify is not None:
+            folder.wd = self._inotify.add_watch(path)
+            self._watches[folder.wd] = path
+        self.folders[path] = folder
+        self._scan_folder(path)
+
+    def _remove_folder(self, path):
+        for folder_path in [p for p in self.folders if p == path or path in p.parents]:
+            folder = self.folders.pop(folder_path)
+            if folder.wd is not None:
+                self._watches.pop(folder.wd, None)
+                if self._inotify is not None:
+                    self._inotify.rm_watch(folder.wd)
+        for file_path in [p for p in self.pending if path in p.parents]:
+            del self.pending[file_path]
+
+    def _scan_folder(self, path):
+        folder = self.folders[path]
+        try:
+            folder.mtime = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                entries = list(entries)
+        except OSError:
+            self._remove_folder(path)
+            return
+        present = set()
+        for entry in entries:
+            relative = folder.relative / entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive and not is_excluded(relative, self.exclude):
+                        try:
+                            self._add_folder(Path(entry.path), relative)
+                        except OSError:
+                            pass  # No more inotify watches: this folder is not watched
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            present.add(entry.name)
+            # Files modified a while ago are not being written any more
+            age = min(max(time.time() - stat.st_mtime, 0.0), self.settle)
+            self._changed(Path(entry.path), relative, stat, time.monotonic() - age, closed=False)
+        for name in set(folder.files) - present:
+            del folder.files[name]
+
+    # --- Files ---
+
+    def _changed(self, path, relative, stat, changed_at, closed):
+        if not name_matches(relative, self.include, self.exclude, self.extensions):
+            return
+        signature = (stat.st_size, stat.st_mtime_ns)
+        pending = self.pending.get(path)
+        if pending is None:
+            folder = self.folders.get(path.parent)
+            if folder is not None and folder.files.get(path.name) == signature:
+                return  # Already reported and unchanged since
+            self.pending[path] = _Pending(relative, *signature, changed_at, closed)
+        elif (pending.size, pending.mtime) != signature or closed:
+            pending.size, pending.mtime = signature
+            pending.changed_at = changed_at
+            pending.closed = closed
+
+    def _event(self, path, relative, mask):
+        if mask & (_IN_DELETE | _IN_MOVED_FROM):
+            self.pending.pop(path, None)
+            folder = self.folders.get(path.parent)
+            if folder is not None:
+                folder.files.pop(path.name, None)
+            return
+        try:
+            stat = path.stat()
+        except OSError:
+            return  # Gone again already
+        self._changed(path, relative, stat, time.monotonic(), closed=bool(mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO)))
+
+    def _read_events(self, timeout):
+        for wd, mask, name in self._inotify.read(timeout):
+            if mask & _IN_Q_OVERFLOW:
+                # Events were dropped, fall back to listing everything once
+                for path in list(self.folders):
+                    if path in self.folders:
+                        self._scan_folder(path)
+                continue
+            folder_path = self._watches.get(wd)
+            if folder_path is None:
+                continue
+            if mask & _IN_IGNORED:
+                # The folder was deleted or unmounted
+                self._watches.pop(wd, None)
+                self.folders.pop(folder_path, None)
+                continue
+            if not name:
+                continue
+            path = folder_path / name
+            relative = self.folders[folder_path].relative / name
+            if mask & _IN_ISDIR:
+                if mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    self._remove_folder(path)
+                elif self.recursive and not is_excluded(relative, self.exclude):
+                    try:
+                        self._add_folder(path, relative)
+                    except OSError:
+                        pass
+                continue
+            self._event(path, relative, mask)
+
+    def _poll(self):
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+        rescan = now - self._last_rescan >= self.rescan_interval
+        if rescan:
+            self._last_rescan = now
+        for path in list(self.folders):
+            folder = self.folders.get(path)
+            if folder is None:
+                continue  # Removed with its parent
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except OSError:
+                self._remove_folder(path)
+                continue
+            if rescan or mtime != folder.mtime:
+                self._scan_folder(path)
+        # Files that are still being written
+        for path, pending in list(self.pending.items()):
+            try:
+                stat = path.stat()
+            except OSError:
+                del self.pending[path]
+                continue
+            self._changed(path, pending.relative, stat, now, closed=False)
+
+    def _take_ready(self):
+        now = time.monotonic()
+        ready = []
+        for path, pending in list(self.pending.items()):
+            if now - pending.changed_at < (CLOSE_SETTLE if pending.closed else self.settle):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                del self.pending[path]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != (pending.size, pending.mtime) or not stat.st_size:
+                # Still being written (or not yet): wait for it to settle again
+                pending.size, pending.mtime = signature
+                pending.changed_at = now
+                pending.closed = False
+                continue
+            del self.pending[path]
+            folder = self.folders.get(path.parent)
+            if folder is not None:
+                folder.files[path.name] = signature
+            if size_matches(stat.st_size, self.min_size, self.max_size):
+                ready.append(ScanEntry(path, pending.relative))
+        return sorted(ready, key=lambda entry: entry.relative)
+
+    def _next_due(self, now):
+        due = [pending.changed_at + (CLOSE_SETTLE if pending.closed else self.settle) - now
+               for pending in self.pending.values()]
+        return max(min(due), 0.0) if due else None
+
+    def ready(self, timeout):
+        """Wait up to ``timeout`` seconds and return the ScanEntry list of files ready now
+
+        Returns as soon as at least one file is ready, or an empty list when
+        none became ready in time.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            entries = self._take_ready()
+            now = time.monotonic()
+            if entries or now >= deadline:
+                return entries
+            wait = deadline - now
+            due = self._next_due(now)
+            if due is not None:
+                wait = min(wait, due)
+            if self._inotify is not None:
+                self._read_events(wait)
+            else:
+                time.sleep(min(wait, max(self._last_poll + self.poll_interval - now, 0.0)))
+                self._poll()
+
+
+def watch_folder(input_path, output_path, plan, engine, should_stop=None, recursive=False, include=(), exclude=(),
+                 min_size=None, max_size=None, settle=DEFAULT_SETTLE, use_inotify=None, on_watch=None,
+                 **batch_options):
+    """Process images as they arrive below ``input_path`` until ``should_stop`` returns True
+
+    Yields ``(image_file, log_lines, task)`` like ``run_batch``, which runs
+    once per group of files that became ready together; ``batch_options``
+    (manifest, force, cache, prefetch_bytes...) are passed on to it, so an
+    incremental manifest is saved after every group. The engine keeps its
+    workers running for the whole session (see ``engine``). ``on_watch`` is called
+    with the watcher once it is listening, e.g. to log its backend. Without
+    ``should_stop`` it runs until interrupted.
+    """
+    output_path = Path(output_path)
+    if os.path.realpath(output_path) == os.path.realpath(input_path):
+        # Every output would be picked up again as a new input
+        raise ValueError("The output folder of a watched folder must not be the watched folder itself")
+    output_path.mkdir(parents=True, exist_ok=True)
+    with FolderWatcher(input_path, recursive=recursive, include=include, exclude=exclude, min_size=min_size,
+                       max_size=max_size, settle=settle, use_inotify=use_inotify, ignore=(output_path,)) as watcher:
+        if on_watch is not None:
+            on_watch(watcher)
+        # One pool (or set of distributed workers) for the whole session, not one per group of files
+        with engine:
+            while should_stop is None or not should_stop():
+                # Short waits so a stop request is noticed quickly
+                entries = watcher.ready(0.5)
+                if entries:
+                    yield from run_batch(entries, output_path, plan, engine, should_stop=should_stop,
+                                         **batch_options)
@@ -0,0 +1,240 @@
+"""HTTP service behind the htmx front-end in ``templates/index.html``.
+
+Needs the optional web dependencies::
+
+    pip install -r requirements-web.txt
+    python -m image_handler.web --host 0.0.0.0 --port 8000
+
+Uploads are streamed to disk under the data folder and images are processed
+with the same pipeline as the GUI on a bounded worker pool, so request
+handlers never block the event loop. Uploads and results are deleted once
+they have not been used for a while, so a long-running server does not fill
+its disk.
+"""
+
+import argparse
+import asyncio
+import shutil
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List
+
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+
+from .core import SUPPORTED_EXTENSIONS, JobSpec, process_image
+from .engine import ENGINE_MODES, create_engine, default_workers
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_DATA_DIR = "temp"
+UPLOAD_CHUNK = 1024 * 1024
+# Seconds an upload or a result is kept after it was last used
+DEFAULT_TTL = 3600.0
+
+
+def _copy_upload(source, target):
+    """Stream an uploaded file to disk in chunks"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(target, "wb") as out:
+        shutil.copyfileobj(source, out, UPLOAD_CHUNK)
+
+
+def _remove_folders(folders):
+    for folder in folders:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def _stale_folders(parent, known, deadline):
+    """Sub-folders of ``parent`` not in ``known`` and untouched since ``deadline``, e.g. left by an earlier run"""
+    try:
+        children = list(parent.iterdir())
+    except OSError:
+        return []
+    stale = []
+    for child in children:
+        try:
+            if child.name not in known and child.is_dir() and child.stat().st_mtime < deadline:
+                stale.append(child)
+        except OSError:
+            continue
+    return stale
+
+
+def _spec_from_form(dpi, format_change, width, height, percentage, aspect_ratio, total_pixels):
+    if total_pixels.strip():
+        raise ValueError("Resizing by total pixels is not supported yet")
+    resize_modes = [value for value in ((width.strip() or height.strip()), percentage.strip(), aspect_ratio.strip())
+                    if value]
+    if len(resize_modes) > 1:
+        raise ValueError("Please use only one resize option: width/height, percentage or aspect ratio")
+    return JobSpec.from_strings(format=format_change, dpi=dpi, width=width, height=height,
+                                percentage=percentage, aspect_ratio=aspect_ratio)
+
+
+def create_app(data_dir=DEFAULT_DATA_DIR, engine_mode="thread", workers=None, ttl=DEFAULT_TTL):
+    """Build the FastAPI application
+
+    ``data_dir`` holds uploads and outputs. Images are processed on the
+    executor of the given engine mode with at most ``workers`` images in
+    flight; further requests wait for a free slot. Uploads and results not
+    used (processed or downloaded) for ``ttl`` seconds are deleted.
+    """
+    data_dir = Path(data_dir)
+    upload_dir = data_dir / "uploads"
+    output_dir = data_dir / "outputs"
+    engine = create_engine(engine_mode, workers)
+    templates = Jinja2Templates(directory=str(PROJECT_DIR / "templates"))
+
+    files = {}  # file_id -> {"id", "name", "path"}
+    tasks = {}  # task_id -> task dict as rendered by the templates
+    last_used = {}  # file or task id -> time.monotonic() of its upload, processing or download
+    busy = set()  # Ids of uploads being processed, never expired
+
+    async def expire():
+        now = time.monotonic()
+        folders = []
+        for registry, parent in ((files, upload_dir), (tasks, output_dir)):
+            for entry_id in [entry_id for entry_id in registry
+                             if entry_id not in busy and now - last_used[entry_id] > ttl]:
+                del registry[entry_id]
+                del last_used[entry_id]
+                folders.append(parent / entry_id)
+            folders += _stale_folders(parent, registry, time.time() - ttl)
+        await run_in_threadpool(_remove_folders, folders)
+
+    async def expire_periodically():
+        while True:
+            await asyncio.sleep(min(ttl, 60.0))
+            await expire()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.executor = engine.create_executor()
+        app.state.slots = asyncio.Semaphore(engine.workers)
+        await expire()  # Leftovers of an earlier run
+        expiry = asyncio.create_task(expire_periodically())
+        try:
+            yield
+        finally:
+            expiry.cancel()
+            app.state.executor.shutdown(wait=False, cancel_futures=True)
+
+    app = FastAPI(title="Image Handler", lifespan=lifespan)
+    app.mount("/static", StaticFiles(directory=str(PROJECT_DIR / "static")), name="static")
+
+    @app.get("/")
+    async def index(request: Request):
+        return templates.TemplateResponse(request, "index.html", {"tasks": list(tasks.values())})
+
+    @app.post("/upload")
+    async def upload(request: Request, files_in: List[UploadFile] = File(..., alias="files")):
+        uploaded = []
+        rejected = []
+        for upload_file in files_in:
+            name = Path(upload_file.filename or "").name
+            if Path(name).suffix.lower() not in SUPPORTED_EXTENSIONS:
+                rejected.append((name or "(unnamed)", "unsupported file type"))
+                continue
+            file_id = uuid.uuid4().hex
+            path = upload_dir / file_id / name
+            await run_in_threadpool(_copy_upload, upload_file.file, path)
+            await upload_file.close()
+            files[file_id] = {"id": file_id, "name": name, "path": path}
+            last_used[file_id] = time.monotonic()
+            uploaded.append(files[file_id])
+        return templates.TemplateResponse(request, "upload_result.html", {
+            "uploaded": uploaded,
+            "rejected": rejected,
+            "files": list(files.values()),
+            "new_ids": {f["id"] for f in uploaded},
+        })
+
+    async def run_task(file_entry, plan, spec):
+        task_id = uuid.uuid4().hex
+        task_output = output_dir / task_id
+        task_output.mkdir(parents=True, exist_ok=True)
+        busy.add(file_entry["id"])
+        try:
+            async with app.state.slots:
+                future = app.state.executor.submit(process_image, file_entry["path"], task_output, plan)
+                log_lines, result = await asyncio.wrap_future(future)
+        finally:
+            busy.discard(file_entry["id"])
+            last_used[file_entry["id"]] = time.monotonic()
+        changes = dict(result["changes"])
+        if spec.dpi and result["status"].startswith("✓"):
+            changes["dpi"] = f"{spec.dpi}x{spec.dpi}"
+        task = {
+            "id": task_id,
+            "original": file_entry["name"],
+            "original_size": result["original_size"],
+            "new_size": result["new_size"],
+            "changes": changes,
+            "status": result["status"],
+            "output_file": result.get("output_file"),
+            "log": log_lines,
+        }
+        if task["output_file"]:
+            tasks[task_id] = task
+            last_used[task_id] = time.monotonic()
+        else:
+            await run_in_threadpool(_remove_folders, [task_output])
+        return task
+
+    @app.post("/process")
+    async def process(request: Request, file_ids: List[str] = Form([]), dpi: str = Form(""),
+                      format_change: str = Form(""), width: str = Form(""), height: str = Form(""),
+                      aspect_ratio: str = Form(""), percentage: str = Form(""), total_pixels: str = Form("")):
+        error = None
+        results = []
+        try:
+            spec = _spec_from_form(dpi, format_change, width, height, percentage, aspect_ratio, total_pixels)
+            selected = [files[file_id] for file_id in file_ids if file_id in files]
+            if not selected:
+                raise ValueError("Please upload and select at least one image")
+        except ValueError as e:
+            error = str(e)
+        else:
+            plan = spec.compile()
+            results = await asyncio.gather(*(run_task(file_entry, plan, spec) for file_entry in selected))
+        # htmx only swaps 2xx responses, so errors are rendered into the result area
+        return templates.TemplateResponse(request, "process_result.html", {"error": error, "results": results})
+
+    @app.get("/download/{task_id}")
+    async def download(task_id: str):
+        task = tasks.get(task_id)
+        if task is None:
+            raise HTTPException(status_code=404, detail="Unknown task")
+        last_used[task_id] = time.monotonic()
+        output_file = Path(task["output_file"])
+        return FileResponse(output_file, filename=output_file.name)
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m image_handler.web", description="Run the Image Handler web service.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="folder for uploads and outputs (default: temp)")
+    parser.add_argument("--engine", default="thread", choices=ENGINE_MODES,
+                        help="executor used for image work (default: thread)")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="images processed at the same time (default: CPU count)")
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL,
+                        help="seconds uploads and results are kept after they were last used (default: 3600)")
+    args = parser.parse_args(argv)
+
+    app = create_app(args.data_dir, args.engine, args.workers, args.ttl)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
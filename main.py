@@ -1,19 +1,125 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image
 import os
 from pathlib import Path
 import threading
+import queue
+from collections import deque
 from datetime import datetime
 
+from image_handler.archive import ARCHIVE_SUFFIXES, ArchiveWriter, is_archive, scan_archive
+from image_handler.core import JobSpec, run_batch
+from image_handler.encoders import ENCODER_PROFILES
+from image_handler.journal import BatchJournal
+from image_handler.engine import BATCH_ENGINE_MODES, DISTRIBUTED_MODE, create_engine, default_workers
+from image_handler.cache import CACHE_DIRNAME, DEFAULT_CACHE_SIZE, ResultCache
+from image_handler.manifest import Manifest
+from image_handler.prescan import calibrate_throughput, prescan
+from image_handler.logbuffer import DEFAULT_LOG_CAPACITY, LogBuffer
+from image_handler.resample import RESAMPLE_FILTERS
+from image_handler.scanner import parse_patterns, parse_size, scan_images
+from image_handler.timing import BatchStats
+from image_handler.watch import watch_folder
+
+# Log prefixes shown in the log tree, in match order, with their display type
+LOG_PREFIXES = (
+    ("[INPUT] ", "Input"),
+    ("[OUTPUT] ", "Output"),
+    ("[START] ", "Start"),
+    ("[CONFIG] ", "Config"),
+    ("[PATHS] ", "Paths"),
+    ("[FOLDER] ", "Folder"),
+    ("[SCAN] ", "Scan"),
+    ("[PLAN] ", "Plan"),
+    ("[RESUME] ", "Resume"),
+    ("[WATCH] ", "Watch"),
+    ("[PROCESS] ", "Process"),
+    ("  [OPEN] ", "Open"),
+    ("  [DPI] ", "DPI"),
+    ("  [RESIZE] ", "Resize"),
+    ("  [FORMAT] ", "Format"),
+    ("  [CONVERT] ", "Convert"),
+    ("  [SAVE] ", "Save"),
+    ("  [NEW SIZE] ", "Size"),
+    ("  [SKIP] ", "Skip"),
+    ("  [CACHE] ", "Cache"),
+    ("  [RENDITION] ", "Rendition"),
+    ("  [SUCCESS] ", "Success"),
+    ("  [ERROR] ", "Error"),
+    ("[ERROR] ", "Error"),
+    ("[INFO] ", "Info"),
+    ("[STATS] ", "Stats"),
+    ("[END] ", "End"),
+)
+
+# Log tree colors per message type tag
+LOG_TAG_COLORS = {
+    "input": "blue",
+    "output": "blue",
+    "start": "green",
+    "config": "purple",
+    "paths": "gray",
+    "folder": "orange",
+    "scan": "teal",
+    "plan": "teal",
+    "resume": "darkgreen",
+    "watch": "teal",
+    "process": "navy",
+    "open": "darkgreen",
+    "dpi": "maroon",
+    "resize": "darkblue",
+    "format": "darkred",
+    "convert": "olive",
+    "save": "darkcyan",
+    "size": "sienna",
+    "skip": "gray",
+    "cache": "darkcyan",
+    "rendition": "darkblue",
+    "success": "green",
+    "error": "red",
+    "info": "gray",
+    "stats": "darkmagenta",
+    "end": "green",
+    "log": "black",
+}
+
+# UI queue event kinds
+EVENT_LOG = "log"
+EVENT_RESULT = "result"
+EVENT_CALL = "call"
+
+UI_PUMP_INTERVAL_MS = 50  # How often the Tk main loop drains the UI queue
+UI_PUMP_MAX_EVENTS = 2000  # Events handled per tick, keeps the window responsive
+
+DEFAULT_RESULTS_CAPACITY = 50000  # Rows kept in the results table and self.tasks
+LOG_ROW_HEIGHT = 20  # Must match the Treeview rowheight style
+LOG_WHEEL_ROWS = 3  # Rows scrolled per mouse wheel notch
+
+
+# Form variables saved in the batch journal, restored by "Resume Last Batch"
+# (the resize mode first: switching it clears the size fields)
+RESUME_FIELDS = (
+    "resize_mode", "recursive_var", "include_var", "exclude_var", "min_size_var", "max_size_var",
+    "format_var", "dpi_var", "width_var", "height_var", "percentage_var", "aspect_ratio_var",
+    "resample_var", "encoder_var", "fast_downscale_var", "incremental_var", "hash_var", "cache_var",
+    "cache_size_var", "engine_var", "workers_var", "large_image_var", "memory_budget_var",
+    "plan_first_var", "renditions_var", "staged_io_var", "io_buffer_var", "listen_var",
+)
+
+
 class ImageProcessorApp:
-    def __init__(self, root):
+    def __init__(self, root, log_capacity=DEFAULT_LOG_CAPACITY, results_capacity=DEFAULT_RESULTS_CAPACITY):
         self.root = root
         self.root.title("Image Processor")
         self.root.geometry("1400x700")
         
         self.input_folder = tk.StringVar()
         self.output_folder = tk.StringVar()
+        self.recursive_var = tk.BooleanVar(value=False)
+        self.include_var = tk.StringVar(value="")  # Comma separated glob patterns
+        self.exclude_var = tk.StringVar(value="")
+        self.min_size_var = tk.StringVar(value="")  # Bytes or K/M/G suffix
+        self.max_size_var = tk.StringVar(value="")
         self.format_var = tk.StringVar(value="")
         self.dpi_var = tk.StringVar(value="")
         self.width_var = tk.StringVar(value="")
@@ -21,12 +127,40 @@ class ImageProcessorApp:
         self.percentage_var = tk.StringVar(value="")
         self.aspect_ratio_var = tk.StringVar(value="")
         self.resize_mode = tk.StringVar(value="manual")  # manual, aspect, or percentage
+        self.resample_var = tk.StringVar(value="")  # Empty uses Pillow's default filter
+        self.encoder_var = tk.StringVar(value="")  # Encoder profile, empty uses Pillow's save defaults
+        self.fast_downscale_var = tk.BooleanVar(value=False)
+        self.incremental_var = tk.BooleanVar(value=False)  # Skip images already up to date
+        self.force_var = tk.BooleanVar(value=False)  # Reprocess everything even when incremental
+        self.hash_var = tk.BooleanVar(value=False)  # Compare content hashes for touched files
+        self.cache_var = tk.BooleanVar(value=False)  # Reuse outputs for byte-identical inputs
+        self.cache_size_var = tk.StringVar(value="1G")
+        self.engine_var = tk.StringVar(value="serial")  # serial, thread, process, or distributed
+        self.workers_var = tk.StringVar(value=str(default_workers()))
+        self.large_image_var = tk.BooleanVar(value=False)  # Strip-decode huge TIFFs within a memory budget
+        self.memory_budget_var = tk.StringVar(value="512M")  # Per worker
+        self.staged_io_var = tk.BooleanVar(value=False)  # Reader and writer threads around the workers
+        self.io_buffer_var = tk.StringVar(value="256M")  # Read ahead and write behind, each
+        self.watch_var = tk.BooleanVar(value=False)  # Keep processing new files until stopped
+        self.listen_var = tk.StringVar(value="")  # Distributed engine: HOST:PORT remote workers connect to
+        self.secret_var = tk.StringVar(value="")  # Never saved in the journal
+        self.plan_first_var = tk.BooleanVar(value=False)  # Header pre-scan, then largest images first
+        self.renditions_var = tk.StringVar(value="")  # e.g. "large:width=2000,height=1500; thumb:percentage=10"
         
         self.stop_processing = False  # Flag to stop processing
-        self.tasks = []
+        self.results_capacity = results_capacity
+        self.tasks = deque(maxlen=results_capacity)  # Latest results, oldest dropped first
+        self.result_rows = deque()  # Results table item ids, oldest first
+        self.log_buffer = LogBuffer(log_capacity)  # All log records; the log tree only shows a window
+        self.batch_stats = None  # Stage timings of the last batch
+        self.log_view_start = 0  # Sequence number of the first record shown in the log tree
+        self.log_view_rows = 20  # Number of rows that fit in the log tree
+        self.log_follow = True  # Keep the log view pinned to the newest records
         self.input_fields = []  # Store references to all input fields
         self.input_buttons = []  # Store references to all input buttons
+        self.readonly_fields = []  # Input fields restored to "readonly" instead of "normal"
         self.process_button = None  # Reference to process button
+        self.resume_button = None
         self.stop_button = None  # Reference to stop button
         self.width_entry = None  # Reference to width entry
         self.height_entry = None  # Reference to height entry
@@ -35,108 +169,133 @@ class ImageProcessorApp:
         self.manual_radio = None  # Reference to manual radio button
         self.aspect_radio = None  # Reference to aspect radio button
         self.percentage_radio = None  # Reference to percentage radio button
+        self.ui_queue = queue.SimpleQueue()  # Events from any thread, drained on the Tk main loop
         self.create_ui()
+        self.root.after(UI_PUMP_INTERVAL_MS, self._pump_ui_queue)
     
     def log_message(self, message):
-        """Log message to both terminal and UI tree"""
-        print(message)
-        
+        """Queue a message for the terminal and the UI tree (safe from any thread)"""
         # Parse message type and content
         timestamp = datetime.now().strftime("%H:%M:%S")
         
-        if message.startswith("[INPUT]"):
-            msg_type = "Input"
-            content = message.replace("[INPUT] ", "")
-        elif message.startswith("[OUTPUT]"):
-            msg_type = "Output"
-            content = message.replace("[OUTPUT] ", "")
-        elif message.startswith("[START]"):
-            msg_type = "Start"
-            content = message.replace("[START] ", "")
-        elif message.startswith("[CONFIG]"):
-            msg_type = "Config"
-            content = message.replace("[CONFIG] ", "")
-        elif message.startswith("[PATHS]"):
-            msg_type = "Paths"
-            content = message.replace("[PATHS] ", "")
-        elif message.startswith("[FOLDER]"):
-            msg_type = "Folder"
-            content = message.replace("[FOLDER] ", "")
-        elif message.startswith("[SCAN]"):
-            msg_type = "Scan"
-            content = message.replace("[SCAN] ", "")
-        elif message.startswith("[PROCESS]"):
-            msg_type = "Process"
-            content = message.replace("[PROCESS] ", "")
-        elif message.startswith("  [OPEN]"):
-            msg_type = "Open"
-            content = message.replace("  [OPEN] ", "")
-        elif message.startswith("  [DPI]"):
-            msg_type = "DPI"
-            content = message.replace("  [DPI] ", "")
-        elif message.startswith("  [RESIZE]"):
-            msg_type = "Resize"
-            content = message.replace("  [RESIZE] ", "")
-        elif message.startswith("  [FORMAT]"):
-            msg_type = "Format"
-            content = message.replace("  [FORMAT] ", "")
-        elif message.startswith("  [CONVERT]"):
-            msg_type = "Convert"
-            content = message.replace("  [CONVERT] ", "")
-        elif message.startswith("  [SAVE]"):
-            msg_type = "Save"
-            content = message.replace("  [SAVE] ", "")
-        elif message.startswith("  [NEW SIZE]"):
-            msg_type = "Size"
-            content = message.replace("  [NEW SIZE] ", "")
-        elif message.startswith("  [SUCCESS]"):
-            msg_type = "Success"
-            content = message.replace("  [SUCCESS] ", "")
-        elif message.startswith("  [ERROR]"):
-            msg_type = "Error"
-            content = message.replace("  [ERROR] ", "")
-        elif message.startswith("[ERROR]"):
-            msg_type = "Error"
-            content = message.replace("[ERROR] ", "")
-        elif message.startswith("[INFO]"):
-            msg_type = "Info"
-            content = message.replace("[INFO] ", "")
+        # Leading blank lines only separate sections in the terminal
+        tagged = message.lstrip("\n")
+        for prefix, msg_type in LOG_PREFIXES:
+            if tagged.startswith(prefix):
+                content = tagged[len(prefix):]
+                break
         else:
-            # Skip untagged log entries (don't display "Log" type)
-            return
-        
-        # Insert into tree
-        self.log_tree.insert("", "end", text=msg_type, values=(content, timestamp), tags=(msg_type.lower(),))
+            # Untagged log entries are printed but not displayed as "Log" type
+            msg_type = content = None
         
-        # Color code different message types
-        self.log_tree.tag_configure("input", foreground="blue")
-        self.log_tree.tag_configure("output", foreground="blue")
-        self.log_tree.tag_configure("start", foreground="green")
-        self.log_tree.tag_configure("config", foreground="purple")
-        self.log_tree.tag_configure("paths", foreground="gray")
-        self.log_tree.tag_configure("folder", foreground="orange")
-        self.log_tree.tag_configure("scan", foreground="teal")
-        self.log_tree.tag_configure("process", foreground="navy")
-        self.log_tree.tag_configure("open", foreground="darkgreen")
-        self.log_tree.tag_configure("dpi", foreground="maroon")
-        self.log_tree.tag_configure("resize", foreground="darkblue")
-        self.log_tree.tag_configure("format", foreground="darkred")
-        self.log_tree.tag_configure("convert", foreground="olive")
-        self.log_tree.tag_configure("save", foreground="darkcyan")
-        self.log_tree.tag_configure("size", foreground="sienna")
-        self.log_tree.tag_configure("success", foreground="green")
-        self.log_tree.tag_configure("error", foreground="red")
-        self.log_tree.tag_configure("info", foreground="gray")
-        self.log_tree.tag_configure("log", foreground="black")
-        
-        # Auto-scroll to bottom
-        self.log_tree.yview_moveto(1.0)
-        self.root.update_idletasks()
+        self.ui_queue.put((EVENT_LOG, message, msg_type, content, timestamp))
+    
+    def _post(self, func, *args):
+        """Run a widget call on the Tk main loop (safe from any thread)"""
+        self.ui_queue.put((EVENT_CALL, func, args))
+    
+    def _pump_ui_queue(self):
+        """Drain queued events in one batch and reschedule"""
+        printed = []
+        logged = False
+        handled = 0
+        buffer = self.log_buffer
+        try:
+            while handled < UI_PUMP_MAX_EVENTS:
+                try:
+                    event = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                handled += 1
+                kind = event[0]
+                if kind == EVENT_LOG:
+                    _, message, msg_type, content, timestamp = event
+                    printed.append(message)
+                    if msg_type:
+                        buffer.append(msg_type, content, timestamp)
+                        logged = True
+                elif kind == EVENT_RESULT:
+                    self.tasks.append(event[1])
+                    self._insert_result_row(event[1])
+                elif kind == EVENT_CALL:
+                    event[1](*event[2])
+        finally:
+            if printed:
+                print("\n".join(printed))
+            if logged:
+                # Auto-scroll to bottom, or keep the current position
+                self._render_log_view()
+            # Come back right away when there is a backlog
+            delay = 1 if handled >= UI_PUMP_MAX_EVENTS else UI_PUMP_INTERVAL_MS
+            self.root.after(delay, self._pump_ui_queue)
+    
+    def _render_log_view(self):
+        """Show the records of the current window in the log tree"""
+        buffer = self.log_buffer
+        rows = self.log_view_rows
+        last_start = max(buffer.first_seq, buffer.end_seq - rows)
+        if self.log_follow:
+            start = last_start
+        else:
+            start = min(max(self.log_view_start, buffer.first_seq), last_start)
+        self.log_view_start = start
+        
+        selected = self.log_tree.selection()
+        children = self.log_tree.get_children()
+        if children:
+            self.log_tree.delete(*children)
+        for record in buffer.window(start, rows):
+            self.log_tree.insert("", "end", iid=str(record.seq), text=record.msg_type,
+                                 values=(record.content, record.timestamp), tags=(record.msg_type.lower(),))
+        kept = [item for item in selected if self.log_tree.exists(item)]
+        if kept:
+            self.log_tree.selection_set(kept)
+        
+        # Scrollbar reflects the position of the window in the whole buffer
+        total = len(buffer)
+        if total:
+            offset = start - buffer.first_seq
+            self.log_scroll_y.set(offset / total, min(1.0, (offset + rows) / total))
+        else:
+            self.log_scroll_y.set(0.0, 1.0)
+    
+    def _scroll_log_view(self, start):
+        buffer = self.log_buffer
+        last_start = max(buffer.first_seq, buffer.end_seq - self.log_view_rows)
+        self.log_view_start = min(max(int(start), buffer.first_seq), last_start)
+        self.log_follow = self.log_view_start >= last_start
+        self._render_log_view()
+    
+    def on_log_scrollbar(self, action, *args):
+        """Scrollbar command: move the window over the log buffer"""
+        if action == "moveto":
+            buffer = self.log_buffer
+            self._scroll_log_view(buffer.first_seq + float(args[0]) * len(buffer))
+        elif action == "scroll":
+            step = self.log_view_rows if args[1] == "pages" else 1
+            self._scroll_log_view(self.log_view_start + int(args[0]) * step)
+    
+    def on_log_mousewheel(self, event):
+        """Scroll the log window with the mouse wheel (Windows, macOS and X11)"""
+        if event.num == 4 or event.delta > 0:
+            direction = -1
+        else:
+            direction = 1
+        self._scroll_log_view(self.log_view_start + direction * LOG_WHEEL_ROWS)
+        return "break"
+    
+    def on_log_tree_resize(self, event):
+        """Render as many rows as fit in the log tree"""
+        rows = max(1, event.height // LOG_ROW_HEIGHT - 1)  # Minus the heading row
+        if rows != self.log_view_rows:
+            self.log_view_rows = rows
+            self._render_log_view()
     
     def clear_logs(self):
-        """Clear the log tree display"""
-        for item in self.log_tree.get_children():
-            self.log_tree.delete(item)
+        """Clear the log buffer and the log tree display"""
+        self.log_buffer.clear()
+        self.log_follow = True
+        self._render_log_view()
     
     def show_log_context_menu(self, event):
         """FIX 3: Show context menu on right-click"""
@@ -151,15 +310,8 @@ class ImageProcessorApp:
         if not selection:
             return
         
-        lines = []
-        for item in selection:
-            values = self.log_tree.item(item)
-            msg_type = values['text']
-            msg_values = values['values']
-            if msg_values:
-                message = msg_values[0]
-                timestamp = msg_values[1] if len(msg_values) > 1 else ""
-                lines.append(f"[{timestamp}] [{msg_type}] {message}")
+        records = (self.log_buffer.get(int(item)) for item in selection)
+        lines = [record.format() for record in records if record is not None]
         
         if lines:
             text = "\n".join(lines)
@@ -169,30 +321,17 @@ class ImageProcessorApp:
     
     def copy_all_logs(self):
         """FIX 3: Copy all log entries to clipboard"""
-        all_items = self.log_tree.get_children()
-        if not all_items:
+        if not len(self.log_buffer):
             return
         
-        lines = []
-        for item in all_items:
-            values = self.log_tree.item(item)
-            msg_type = values['text']
-            msg_values = values['values']
-            if msg_values:
-                message = msg_values[0]
-                timestamp = msg_values[1] if len(msg_values) > 1 else ""
-                lines.append(f"[{timestamp}] [{msg_type}] {message}")
-        
-        if lines:
-            text = "\n".join(lines)
-            self.root.clipboard_clear()
-            self.root.clipboard_append(text)
-            self.log_message("[INFO] Copied all logs to clipboard")
+        text = "\n".join(self.log_buffer.iter_lines())
+        self.root.clipboard_clear()
+        self.root.clipboard_append(text)
+        self.log_message("[INFO] Copied all logs to clipboard")
     
     def save_log_to_file(self):
         """Save all log entries to a text file in the output folder"""
-        all_items = self.log_tree.get_children()
-        if not all_items:
+        if not len(self.log_buffer):
             messagebox.showinfo("No Logs", "No logs to save")
             return
         
@@ -202,6 +341,10 @@ class ImageProcessorApp:
             messagebox.showerror("Error", "Please select an output folder first")
             return
         
+        # Save next to an output archive
+        if is_archive(output_path):
+            output_path = os.path.dirname(os.path.abspath(output_path))
+        
         # Create output folder if it doesn't exist
         if not os.path.exists(output_path):
             try:
@@ -211,36 +354,40 @@ class ImageProcessorApp:
                 return
         
         # Generate log filename with timestamp
-        log_filename = f"processing_log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        log_filename = f"processing_log_{stamp}.txt"
         log_filepath = os.path.join(output_path, log_filename)
         
-        # Collect log entries
-        lines = []
-        lines.append("="*80)
-        lines.append("IMAGE PROCESSOR - PROCESSING LOG")
-        lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append("="*80)
-        lines.append("")
-        
-        for item in all_items:
-            values = self.log_tree.item(item)
-            msg_type = values['text']
-            msg_values = values['values']
-            if msg_values:
-                message = msg_values[0]
-                timestamp = msg_values[1] if len(msg_values) > 1 else ""
-                lines.append(f"[{timestamp}] [{msg_type:10s}] {message}")
-        
-        lines.append("")
-        lines.append("="*80)
-        lines.append("END OF LOG")
-        lines.append("="*80)
-        
-        # Write to file
+        # Stream log entries straight from the buffer to the file
         try:
             with open(log_filepath, 'w', encoding='utf-8') as f:
-                f.write("\n".join(lines))
-            messagebox.showinfo("Log Saved", f"Log saved successfully to:\n{log_filepath}")
+                f.write("="*80 + "\n")
+                f.write("IMAGE PROCESSOR - PROCESSING LOG\n")
+                f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write("="*80 + "\n")
+                f.write("\n")
+                for line in self.log_buffer.iter_lines(type_width=10):
+                    f.write(line)
+                    f.write("\n")
+                f.write("\n")
+                if self.batch_stats is not None:
+                    f.write("="*80 + "\n")
+                    f.write("STAGE TIMINGS (last batch)\n")
+                    f.write("="*80 + "\n")
+                    for line in self.batch_stats.summary_lines():
+                        f.write(line)
+                        f.write("\n")
+                    f.write("\n")
+                f.write("="*80 + "\n")
+                f.write("END OF LOG\n")
+                f.write("="*80)
+            saved = log_filepath
+            if self.batch_stats is not None:
+                # Same timings, machine readable
+                stats_filepath = os.path.join(output_path, f"processing_stats_{stamp}.json")
+                self.batch_stats.save_json(stats_filepath)
+                saved += f"\n{stats_filepath}"
+            messagebox.showinfo("Log Saved", f"Log saved successfully to:\n{saved}")
             self.log_message(f"[INFO] Log saved to: {log_filename}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save log: {e}")
@@ -259,6 +406,37 @@ class ImageProcessorApp:
         browse_btn1.grid(row=0, column=2)
         self.input_buttons.append(browse_btn1)
         
+        archive_btn1 = ttk.Button(frame1, text="Archive", command=self.select_input_archive)
+        archive_btn1.grid(row=0, column=3, padx=(5, 0))
+        self.input_buttons.append(archive_btn1)
+        
+        # Scan options: sub-folders, glob filters and file size limits
+        scan_frame = ttk.Frame(frame1)
+        scan_frame.grid(row=1, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        recursive_check = ttk.Checkbutton(scan_frame, text="Include sub-folders", variable=self.recursive_var)
+        recursive_check.grid(row=0, column=0, sticky="w")
+        self.input_fields.append(recursive_check)
+        
+        ttk.Label(scan_frame, text="Include:").grid(row=0, column=1, sticky="w", padx=(10, 0))
+        include_entry = ttk.Entry(scan_frame, textvariable=self.include_var, width=14)
+        include_entry.grid(row=0, column=2, sticky="w", padx=5)
+        self.input_fields.append(include_entry)
+        
+        ttk.Label(scan_frame, text="Exclude:").grid(row=0, column=3, sticky="w")
+        exclude_entry = ttk.Entry(scan_frame, textvariable=self.exclude_var, width=14)
+        exclude_entry.grid(row=0, column=4, sticky="w", padx=5)
+        self.input_fields.append(exclude_entry)
+        
+        ttk.Label(scan_frame, text="Min size:").grid(row=1, column=1, sticky="w", padx=(10, 0))
+        min_size_entry = ttk.Entry(scan_frame, textvariable=self.min_size_var, width=14)
+        min_size_entry.grid(row=1, column=2, sticky="w", padx=5)
+        self.input_fields.append(min_size_entry)
+        
+        ttk.Label(scan_frame, text="Max size:").grid(row=1, column=3, sticky="w")
+        max_size_entry = ttk.Entry(scan_frame, textvariable=self.max_size_var, width=14)
+        max_size_entry.grid(row=1, column=4, sticky="w", padx=5)
+        self.input_fields.append(max_size_entry)
+        
         # Output folder selection
         frame2 = ttk.LabelFrame(self.root, text="Output Folder", padding=10)
         frame2.grid(row=1, column=0, sticky="ew", padx=10, pady=5)
@@ -272,6 +450,10 @@ class ImageProcessorApp:
         browse_btn2.grid(row=0, column=2)
         self.input_buttons.append(browse_btn2)
         
+        archive_btn2 = ttk.Button(frame2, text="Archive", command=self.select_output_archive)
+        archive_btn2.grid(row=0, column=3, padx=(5, 0))
+        self.input_buttons.append(archive_btn2)
+        
         # Processing options
         frame3 = ttk.LabelFrame(self.root, text="Processing Options", padding=10)
         frame3.grid(row=2, column=0, sticky="ew", padx=10, pady=5)
@@ -328,6 +510,111 @@ class ImageProcessorApp:
         self.aspect_entry.grid(row=3, column=3, sticky="w", padx=5)
         self.input_fields.append(self.aspect_entry)
         
+        # Execution engine selection
+        ttk.Label(frame3, text="Engine:").grid(row=4, column=0, sticky="w", pady=(10, 0))
+        engine_combo = ttk.Combobox(frame3, textvariable=self.engine_var, values=list(BATCH_ENGINE_MODES),
+                                    width=12, state="readonly")
+        engine_combo.grid(row=4, column=1, sticky="w", padx=5, pady=(10, 0))
+        self.input_fields.append(engine_combo)
+        self.readonly_fields.append(engine_combo)
+        
+        ttk.Label(frame3, text="Workers:").grid(row=4, column=2, sticky="w", pady=(10, 0))
+        workers_entry = ttk.Entry(frame3, textvariable=self.workers_var, width=12)
+        workers_entry.grid(row=4, column=3, sticky="w", padx=5, pady=(10, 0))
+        self.input_fields.append(workers_entry)
+        
+        ttk.Label(frame3, text="Resample:").grid(row=5, column=0, sticky="w", pady=(5, 0))
+        resample_combo = ttk.Combobox(frame3, textvariable=self.resample_var,
+                                      values=[""] + list(RESAMPLE_FILTERS), width=12, state="readonly")
+        resample_combo.grid(row=5, column=1, sticky="w", padx=5, pady=(5, 0))
+        self.input_fields.append(resample_combo)
+        self.readonly_fields.append(resample_combo)
+        
+        fast_check = ttk.Checkbutton(frame3, text="Fast downscale (JPEG draft decode)",
+                                     variable=self.fast_downscale_var)
+        fast_check.grid(row=5, column=2, columnspan=2, sticky="w", pady=(5, 0))
+        self.input_fields.append(fast_check)
+        
+        # Incremental re-runs backed by a manifest in the output folder
+        incremental_frame = ttk.Frame(frame3)
+        incremental_frame.grid(row=6, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        for text, variable in (("Skip up-to-date images", self.incremental_var),
+                               ("Force reprocess", self.force_var),
+                               ("Verify content hash", self.hash_var)):
+            check = ttk.Checkbutton(incremental_frame, text=text, variable=variable)
+            check.pack(side="left", padx=(0, 10))
+            self.input_fields.append(check)
+        
+        # Content-addressed cache for duplicate inputs
+        cache_frame = ttk.Frame(frame3)
+        cache_frame.grid(row=7, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        cache_check = ttk.Checkbutton(cache_frame, text="Reuse results for duplicate images", variable=self.cache_var)
+        cache_check.pack(side="left", padx=(0, 10))
+        self.input_fields.append(cache_check)
+        ttk.Label(cache_frame, text="Cache size:").pack(side="left")
+        cache_size_entry = ttk.Entry(cache_frame, textvariable=self.cache_size_var, width=8)
+        cache_size_entry.pack(side="left", padx=5)
+        self.input_fields.append(cache_size_entry)
+        
+        # Large-image mode for scans that do not fit in memory
+        large_frame = ttk.Frame(frame3)
+        large_frame.grid(row=8, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        large_check = ttk.Checkbutton(large_frame, text="Large image mode (decode huge TIFFs in strips)",
+                                      variable=self.large_image_var)
+        large_check.pack(side="left", padx=(0, 10))
+        self.input_fields.append(large_check)
+        ttk.Label(large_frame, text="Memory/worker:").pack(side="left")
+        memory_budget_entry = ttk.Entry(large_frame, textvariable=self.memory_budget_var, width=8)
+        memory_budget_entry.pack(side="left", padx=5)
+        self.input_fields.append(memory_budget_entry)
+        
+        plan_check = ttk.Checkbutton(frame3, text="Plan batch first (estimate, then largest images first)",
+                                     variable=self.plan_first_var)
+        plan_check.grid(row=9, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        self.input_fields.append(plan_check)
+        
+        # Several outputs per image from a single decode
+        ttk.Label(frame3, text="Renditions:").grid(row=10, column=0, sticky="w", pady=(5, 0))
+        renditions_entry = ttk.Entry(frame3, textvariable=self.renditions_var)
+        renditions_entry.grid(row=10, column=1, columnspan=3, sticky="we", padx=5, pady=(5, 0))
+        self.input_fields.append(renditions_entry)
+        
+        ttk.Label(frame3, text="Encoder:").grid(row=11, column=0, sticky="w", pady=(5, 0))
+        encoder_combo = ttk.Combobox(frame3, textvariable=self.encoder_var,
+                                     values=[""] + list(ENCODER_PROFILES), width=12, state="readonly")
+        encoder_combo.grid(row=11, column=1, sticky="w", padx=5, pady=(5, 0))
+        self.input_fields.append(encoder_combo)
+        self.readonly_fields.append(encoder_combo)
+        
+        # Prefetch inputs and write outputs from separate threads
+        staged_frame = ttk.Frame(frame3)
+        staged_frame.grid(row=12, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        staged_check = ttk.Checkbutton(staged_frame, text="Staged I/O (read ahead, write behind)",
+                                       variable=self.staged_io_var)
+        staged_check.pack(side="left", padx=(0, 10))
+        self.input_fields.append(staged_check)
+        ttk.Label(staged_frame, text="Buffer:").pack(side="left")
+        io_buffer_entry = ttk.Entry(staged_frame, textvariable=self.io_buffer_var, width=8)
+        io_buffer_entry.pack(side="left", padx=5)
+        self.input_fields.append(io_buffer_entry)
+        
+        watch_check = ttk.Checkbutton(frame3, text="Watch input folder (process new files until stopped)",
+                                      variable=self.watch_var)
+        watch_check.grid(row=13, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        self.input_fields.append(watch_check)
+        
+        # Remote workers for the distributed engine (python -m image_handler.distributed HOST:PORT)
+        remote_frame = ttk.Frame(frame3)
+        remote_frame.grid(row=14, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        ttk.Label(remote_frame, text="Listen for workers (HOST:PORT):").pack(side="left")
+        listen_entry = ttk.Entry(remote_frame, textvariable=self.listen_var, width=20)
+        listen_entry.pack(side="left", padx=5)
+        self.input_fields.append(listen_entry)
+        ttk.Label(remote_frame, text="Secret:").pack(side="left")
+        secret_entry = ttk.Entry(remote_frame, textvariable=self.secret_var, width=16, show="*")
+        secret_entry.pack(side="left", padx=5)
+        self.input_fields.append(secret_entry)
+        
         # Bind events to calculate dimensions automatically
         self.percentage_var.trace_add('write', self.calculate_dimensions_from_percentage)
         self.aspect_ratio_var.trace_add('write', self.calculate_dimensions_from_aspect)
@@ -343,6 +630,8 @@ class ImageProcessorApp:
         self.process_button.pack(side="left", padx=5)
         self.stop_button = ttk.Button(frame4, text="Stop Processing", command=self.stop_processing_handler, state="disabled")
         self.stop_button.pack(side="left", padx=5)
+        self.resume_button = ttk.Button(frame4, text="Resume Last Batch", command=self.resume_processing)
+        self.resume_button.pack(side="left", padx=5)
         ttk.Button(frame4, text="Clear Results", command=self.clear_results).pack(side="left", padx=5)
         
         # Results table (UNDER CONTROLS IN LEFT COLUMN)
@@ -353,7 +642,7 @@ class ImageProcessorApp:
         scroll = ttk.Scrollbar(frame5)
         scroll.pack(side="right", fill="y")
         
-        self.tree = ttk.Treeview(frame5, columns=("Filename", "Original Size", "New Size", "Changes", "Status"), 
+        self.tree = ttk.Treeview(frame5, columns=("Filename", "Original Size", "New Size", "Changes", "Status", "Time"), 
                                 height=20, yscrollcommand=scroll.set)
         scroll.config(command=self.tree.yview)
         
@@ -363,6 +652,7 @@ class ImageProcessorApp:
         self.tree.column("New Size", anchor="center", width=80)
         self.tree.column("Changes", anchor="w", width=150)
         self.tree.column("Status", anchor="center", width=60)
+        self.tree.column("Time", anchor="e", width=60)
         
         self.tree.heading("#0", text="", anchor="w")
         self.tree.heading("Filename", text="Filename", anchor="w")
@@ -370,6 +660,12 @@ class ImageProcessorApp:
         self.tree.heading("New Size", text="New Size", anchor="center")
         self.tree.heading("Changes", text="Changes", anchor="w")
         self.tree.heading("Status", text="Status", anchor="center")
+        self.tree.heading("Time", text="Time", anchor="e")
+        
+        self.tree.tag_configure("completed", foreground="green")
+        self.tree.tag_configure("failed", foreground="red")
+        self.tree.tag_configure("skipped", foreground="gray")
+        self.tree.tag_configure("stats", foreground="darkmagenta")
         
         self.tree.pack(fill="both", expand=True)
         
@@ -378,21 +674,21 @@ class ImageProcessorApp:
         frame6.grid(row=0, column=2, rowspan=7, sticky="nsew", padx=10, pady=5)
         
         # Log tree widget with scrollbars (both vertical and horizontal)
-        log_scroll_y = ttk.Scrollbar(frame6, orient="vertical")
-        log_scroll_y.pack(side="right", fill="y")
+        self.log_scroll_y = ttk.Scrollbar(frame6, orient="vertical", command=self.on_log_scrollbar)
+        self.log_scroll_y.pack(side="right", fill="y")
         
         log_scroll_x = ttk.Scrollbar(frame6, orient="horizontal")
         log_scroll_x.pack(side="bottom", fill="x")
         
+        # The tree only holds the visible window of the log buffer, so the
+        # vertical scrollbar is driven by on_log_scrollbar instead of yview
         self.log_tree = ttk.Treeview(frame6, columns=("Message", "Timestamp"), height=20, 
-                                     yscrollcommand=log_scroll_y.set, xscrollcommand=log_scroll_x.set,
-                                     selectmode="extended")
-        log_scroll_y.config(command=self.log_tree.yview)
+                                     xscrollcommand=log_scroll_x.set, selectmode="extended")
         log_scroll_x.config(command=self.log_tree.xview)
         
         # Configure style
         style = ttk.Style()
-        style.configure("Treeview", rowheight=20)
+        style.configure("Treeview", rowheight=LOG_ROW_HEIGHT)
         # Fix selection background to ensure text is visible
         style.map("Treeview", background=[("selected", "#0078D7")], foreground=[("selected", "white")])
         
@@ -407,11 +703,20 @@ class ImageProcessorApp:
         
         self.log_tree.pack(fill="both", expand=True)
         
+        # Color code different message types
+        for tag, color in LOG_TAG_COLORS.items():
+            self.log_tree.tag_configure(tag, foreground=color)
+        
         # FIX 3: Enable text selection and copying
         # Bind right-click for context menu
         self.log_tree.bind('<Button-3>', self.show_log_context_menu)
         # Bind Ctrl+C for copying
         self.log_tree.bind('<Control-c>', self.copy_log_selection)
+        # Scroll and size the virtual log window
+        self.log_tree.bind('<MouseWheel>', self.on_log_mousewheel)
+        self.log_tree.bind('<Button-4>', self.on_log_mousewheel)
+        self.log_tree.bind('<Button-5>', self.on_log_mousewheel)
+        self.log_tree.bind('<Configure>', self.on_log_tree_resize)
         
         # Create context menu for log tree
         self.log_context_menu = tk.Menu(self.root, tearoff=0)
@@ -538,6 +843,7 @@ class ImageProcessorApp:
             widget.config(state="disabled")
         if self.process_button:
             self.process_button.config(state="disabled")
+            self.resume_button.config(state="disabled")
         # Disable all resize mode radio buttons during processing
         if self.manual_radio:
             self.manual_radio.config(state="disabled")
@@ -553,6 +859,7 @@ class ImageProcessorApp:
             widget.config(state="normal")
         if self.process_button:
             self.process_button.config(state="normal")
+            self.resume_button.config(state="normal")
         
         # Enable all 3 radio buttons after processing
         if self.manual_radio:
@@ -566,7 +873,7 @@ class ImageProcessorApp:
         for widget in self.input_fields:
             if widget not in [self.width_entry, self.height_entry, self.percent_entry, 
                              self.aspect_entry, self.manual_radio, self.aspect_radio, self.percentage_radio]:
-                widget.config(state="normal")
+                widget.config(state="readonly" if widget in self.readonly_fields else "normal")
         
         # Restore proper state based on current resize mode
         self.on_resize_mode_change()
@@ -583,16 +890,34 @@ class ImageProcessorApp:
             self.output_folder.set(folder)
             self.log_message(f"[OUTPUT] Selected output folder: {folder}")
     
+    def select_input_archive(self):
+        archive = filedialog.askopenfilename(title="Select Input Archive", filetypes=self._archive_filetypes())
+        if archive:
+            self.input_folder.set(archive)
+            self.log_message(f"[INPUT] Selected input archive: {archive}")
+    
+    def select_output_archive(self):
+        archive = filedialog.asksaveasfilename(title="Select Output Archive", filetypes=self._archive_filetypes(),
+                                               defaultextension=".zip")
+        if archive:
+            self.output_folder.set(archive)
+            self.log_message(f"[OUTPUT] Selected output archive: {archive}")
+    
+    @staticmethod
+    def _archive_filetypes():
+        return [("ZIP/TAR archives", " ".join(f"*{suffix}" for suffix in ARCHIVE_SUFFIXES)), ("All files", "*")]
+    
     def clear_results(self):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        self.tasks = []
+        if self.result_rows:
+            self.tree.delete(*self.result_rows)
+        self.result_rows.clear()
+        self.tasks.clear()
     
     def stop_processing_handler(self):
         """Handle stop button click"""
         self.stop_processing = True
         self.stop_button.config(state="disabled")
-        self.log_message("[INFO] Stop requested by user. Stopping after current image...")
+        self.log_message("[INFO] Stop requested by user. Stopping after images already in progress...")
     
     def validate_inputs(self):
         """Validate essential inputs and sanitize optional ones"""
@@ -602,13 +927,19 @@ class ImageProcessorApp:
             return "Input folder is required"
         if not os.path.exists(input_path):
             return f"Input folder does not exist: {input_path}"
-        if not os.path.isdir(input_path):
-            return f"Input path is not a folder: {input_path}"
+        if not os.path.isdir(input_path) and not is_archive(input_path):
+            return f"Input path is not a folder or a ZIP/TAR archive: {input_path}"
 
         # Validate output folder
         output_path = self.output_folder.get().strip()
         if not output_path:
             return "Output folder is required"
+        if is_archive(output_path):
+            if os.path.isdir(output_path):
+                return f"Output archive is a folder: {output_path}"
+            if self.incremental_var.get() or self.cache_var.get():
+                return "Skip up-to-date images and the duplicate cache need an output folder, not an archive"
+            output_path = os.path.dirname(os.path.abspath(output_path))
         if not os.path.exists(output_path):
             try:
                 os.makedirs(output_path, exist_ok=True)
@@ -616,8 +947,33 @@ class ImageProcessorApp:
                 return f"Cannot create output folder: {e}"
         elif not os.path.isdir(output_path):
             return f"Output path is not a folder: {output_path}"
+        if self.watch_var.get():
+            if not os.path.isdir(input_path) or is_archive(self.output_folder.get().strip()):
+                return "Watching needs an input folder and an output folder, not archives"
+            if os.path.realpath(input_path) == os.path.realpath(output_path):
+                return "Watching needs an output folder other than the input folder"
+            if self.plan_first_var.get():
+                return "Plan batch first cannot be used while watching the input folder"
 
         # Validate optional inputs only when they have values
+        # Validate size filters (only if provided)
+        for size_var in (self.min_size_var, self.max_size_var, self.cache_size_var, self.memory_budget_var,
+                         self.io_buffer_var):
+            size_val = size_var.get().strip()
+            if size_val:
+                try:
+                    parse_size(size_val)
+                except ValueError as e:
+                    return str(e)
+        if self.large_image_var.get():
+            budget_val = self.memory_budget_var.get().strip()
+            if not budget_val or parse_size(budget_val) <= 0:
+                return "Please enter a memory budget per worker for large image mode (e.g. 512M)"
+        if self.staged_io_var.get():
+            buffer_val = self.io_buffer_var.get().strip()
+            if not buffer_val or parse_size(buffer_val) <= 0:
+                return "Please enter a buffer size for staged I/O (e.g. 256M)"
+
         # Validate DPI (only if provided)
         dpi_val = self.dpi_var.get().strip()
         if dpi_val:
@@ -671,6 +1027,44 @@ class ImageProcessorApp:
                 except ValueError:
                     return f"Invalid aspect ratio value: '{aspect_val}'. Must be two positive integers separated by ':'"
 
+        # Validate worker count (only if provided); remote workers may do all the work
+        workers_val = self.workers_var.get().strip()
+        listen_val = self.listen_var.get().strip()
+        distributed = self.engine_var.get() == DISTRIBUTED_MODE
+        if workers_val:
+            try:
+                workers_int = int(workers_val)
+                if workers_int < 0 or (workers_int == 0 and not (distributed and listen_val)):
+                    return f"Invalid workers value: '{workers_val}'. Must be a positive integer"
+            except ValueError:
+                return f"Invalid workers value: '{workers_val}'. Must be a positive integer"
+
+        # Validate the listen address (only if provided)
+        if listen_val:
+            from image_handler.distributed import SECRET_ENV, parse_address
+
+            if not distributed:
+                return "Listening for workers needs the distributed engine"
+            try:
+                parse_address(listen_val)
+            except ValueError as e:
+                return str(e)
+            if not self.secret_var.get() and not os.environ.get(SECRET_ENV):
+                return f"Remote workers need a secret (or the {SECRET_ENV} environment variable)"
+
+        # Validate renditions (only if provided); they replace format, DPI and resize
+        renditions_val = self.renditions_var.get().strip()
+        if renditions_val:
+            if self.cache_var.get():
+                return "The duplicate cache cannot be used with renditions"
+            try:
+                JobSpec.from_strings(format=self.format_var.get(), dpi=dpi_val, width=width_val, height=height_val,
+                                     percentage=percentage_val, aspect_ratio=aspect_val,
+                                     renditions=renditions_val)
+            except ValueError as e:
+                return str(e)
+            return None
+
         # Validate based on selected resize mode
         resize_mode = self.resize_mode.get()
         
@@ -696,7 +1090,32 @@ class ImageProcessorApp:
 
         return None  # No errors
     
-    def process_images(self):
+    def resume_processing(self):
+        """Restore the settings of the interrupted batch in the output folder and continue it"""
+        output_path = self.output_folder.get().strip()
+        if not output_path or not os.path.isdir(output_path):
+            messagebox.showerror("Resume", "Select the output folder of the batch to resume")
+            return
+        journal = BatchJournal.open(output_path)
+        if journal.header is None:
+            messagebox.showinfo("Resume", f"No batch journal found in {output_path}")
+            return
+        if not journal.resumable:
+            messagebox.showinfo("Resume", "The last batch in this output folder already completed")
+            return
+        if journal.input_path:
+            self.input_folder.set(journal.input_path)
+        settings = journal.settings
+        for name in RESUME_FIELDS:
+            if name in settings:
+                getattr(self, name).set(settings[name])
+                if name == "resize_mode":
+                    self.on_resize_mode_change()
+        self.log_message(f"[RESUME] Resuming the batch from {journal.input_path}: "
+                         f"{len(journal.done)} image(s) already done")
+        self.process_images(resume=True)
+    
+    def process_images(self, resume=False):
         # Validate inputs before processing
         validation_error = self.validate_inputs()
         if validation_error:
@@ -718,219 +1137,252 @@ class ImageProcessorApp:
         self.log_message(f"[CONFIG] Height: {self.height_var.get() or 'Not set'}")
         self.log_message(f"[CONFIG] Percentage: {self.percentage_var.get() or 'Not set'}")
         self.log_message(f"[CONFIG] Aspect Ratio: {self.aspect_ratio_var.get() or 'Not set'}")
+        self.log_message(f"[CONFIG] Resample: {self.resample_var.get() or 'Default'}")
+        self.log_message(f"[CONFIG] Encoder: {self.encoder_var.get() or 'Default'}")
+        self.log_message(f"[CONFIG] Fast Downscale: {'On' if self.fast_downscale_var.get() else 'Off'}")
+        # Form values saved in the journal for "Resume Last Batch"
+        settings = {name: getattr(self, name).get() for name in RESUME_FIELDS}
+        
+        # Snapshot the settings once so workers never read Tk variables
+        plan = JobSpec.from_strings(
+            format=self.format_var.get(),
+            dpi=self.dpi_var.get(),
+            width=self.width_var.get(),
+            height=self.height_var.get(),
+            percentage=self.percentage_var.get(),
+            aspect_ratio=self.aspect_ratio_var.get(),
+            resample=self.resample_var.get(),
+            encoder=self.encoder_var.get(),
+            fast_downscale=self.fast_downscale_var.get(),
+            memory_budget=self.memory_budget_var.get() if self.large_image_var.get() else "",
+            renditions=self.renditions_var.get(),
+        ).compile()
+        listen = self.listen_var.get().strip()
+        if self.engine_var.get() == DISTRIBUTED_MODE:
+            engine = create_engine(self.engine_var.get(), self.workers_var.get().strip() or None,
+                                   listen=listen or None, secret=self.secret_var.get() or None)
+            self.log_message(f"[CONFIG] Engine: distributed ({engine.local_workers} local worker(s)"
+                             + (f", listening on {listen} for remote workers)" if listen else ")"))
+        else:
+            engine = create_engine(self.engine_var.get(), self.workers_var.get().strip() or None)
+            self.log_message(f"[CONFIG] Engine: {engine.mode} ({engine.workers} worker(s))")
+        if plan.memory_budget:
+            self.log_message(f"[CONFIG] Large-image mode: {plan.memory_budget // 1024 ** 2} MiB per worker")
+        if plan.renditions:
+            self.log_message(f"[CONFIG] Renditions: {', '.join(output.name for output in plan.renditions)}")
+        io_buffer = parse_size(self.io_buffer_var.get()) if self.staged_io_var.get() else None
+        if io_buffer:
+            self.log_message(f"[CONFIG] Staged I/O: {io_buffer // 1024 ** 2} MiB read ahead and written behind")
+        incremental = self.incremental_var.get()
+        force = self.force_var.get()
+        if incremental:
+            self.log_message(f"[CONFIG] Incremental: On{' (force reprocess)' if force else ''}")
+        
+        input_path = Path(self.input_folder.get().strip())
+        output_path = Path(self.output_folder.get().strip())
+        min_size = self.min_size_var.get().strip()
+        max_size = self.max_size_var.get().strip()
+        scan_options = {
+            "recursive": self.recursive_var.get(),
+            "include": parse_patterns(self.include_var.get()),
+            "exclude": parse_patterns(self.exclude_var.get()),
+            "min_size": parse_size(min_size) if min_size else None,
+            "max_size": parse_size(max_size) if max_size else None,
+        }
+        
+        manifest = Manifest.load(output_path, use_hash=self.hash_var.get()) if incremental else None
+        cache = None
+        if self.cache_var.get():
+            cache_size = self.cache_size_var.get().strip()
+            cache = ResultCache(output_path / CACHE_DIRNAME,
+                                parse_size(cache_size) if cache_size else DEFAULT_CACHE_SIZE)
+            self.log_message(f"[CONFIG] Duplicate cache: On (max {cache_size or 'default size'})")
+        journal = None
+        if not is_archive(output_path) and not self.watch_var.get():
+            # Progress journal in the output folder, so the batch can be resumed after a crash
+            journal = BatchJournal.open(output_path, resume=resume, input_path=input_path, settings=settings)
         
         # Run processing in background thread
-        thread = threading.Thread(target=self._process_images_thread)
+        thread = threading.Thread(target=self._process_images_thread,
+                                  args=(input_path, output_path, scan_options, plan, engine, manifest, force, cache,
+                                        self.plan_first_var.get(), io_buffer, self.watch_var.get(), journal))
         thread.start()
     
-    def _process_images_thread(self):
-        input_path = Path(self.input_folder.get())
-        output_path = Path(self.output_folder.get())
-        
+    def _process_images_thread(self, input_path, output_path, scan_options, plan, engine, manifest, force, cache,
+                               plan_first=False, io_buffer=None, watch=False, journal=None):
         self.log_message(f"[PATHS] Input: {input_path}")
         self.log_message(f"[PATHS] Output: {output_path}")
+        input_archive = is_archive(input_path) and input_path.is_file()
+        output_archive = is_archive(output_path)
+        source = "archive" if input_archive else "folder"
         
         # Create output folder if it doesn't exist
+        output_folder = output_path.parent if output_archive else output_path
         try:
-            output_path.mkdir(parents=True, exist_ok=True)
-            self.log_message(f"[FOLDER] Output folder ready: {output_path}")
+            output_folder.mkdir(parents=True, exist_ok=True)
+            self.log_message(f"[FOLDER] Output folder ready: {output_folder}")
+            writer = ArchiveWriter(output_path) if output_archive else None
         except Exception as e:
-            self.log_message(f"[ERROR] Failed to create output folder: {e}")
+            self.log_message(f"[ERROR] Failed to create output {'archive' if output_archive else 'folder'}: {e}")
+            self._post(self._finish_processing)
             return
         
-        # Get image files - only supported formats (PNG, JPEG, JPG, TIFF, WEBP)
-        supported_extensions = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp'}
-        image_files = [f for f in input_path.iterdir() if f.suffix.lower() in supported_extensions]
+        # Stream image files - only supported formats (PNG, JPEG, JPG, TIFF, WEBP) -
+        # so processing starts while the rest of the folder is still being scanned
+        scanned = [0]
+        
+        def image_files():
+            if input_archive:
+                options = {name: value for name, value in scan_options.items() if name != "recursive"}
+                entries = scan_archive(input_path, **options)
+            else:
+                entries = scan_images(input_path, **scan_options)
+            for entry in entries:
+                scanned[0] += 1
+                yield entry
+        
+        work = image_files()
+        if plan_first:
+            # Read every header up front, then hand out the largest images first
+            self.log_message("[PLAN] Reading image headers...")
+            batch_plan = prescan(work, plan, calibrate_throughput(plan), engine.workers,
+                                 should_stop=lambda: self.stop_processing)
+            for line in batch_plan.summary_lines():
+                self.log_message(line)
+            if input_archive:
+                # The plan does not keep member data, and archives are read in their own order
+                self.log_message("[PLAN] Archive input is processed in archive order, not largest first")
+                scanned[0] = 0
+                work = image_files()
+            else:
+                work = batch_plan.ordered()
+        
+        batch_options = dict(manifest=manifest, force=force, cache=cache, prefetch_bytes=io_buffer,
+                             write_behind_bytes=io_buffer)
+        if watch:
+            on_watch = lambda watcher: self.log_message(
+                f"[WATCH] Watching {input_path} ({watcher.backend}) for new images, press Stop to end")
+            results = watch_folder(input_path, output_path, plan, engine, should_stop=lambda: self.stop_processing,
+                                   on_watch=on_watch, **scan_options, **batch_options)
+        else:
+            results = run_batch(work, writer or output_path, plan, engine,
+                                should_stop=lambda: self.stop_processing, journal=journal, **batch_options)
         
-        self.log_message(f"[SCAN] Found {len(image_files)} image(s) in input folder")
+        processed = 0
+        skipped = 0
+        stats = BatchStats()
+        try:
+            for image_file, log_lines, task in results:
+                processed += 1
+                stats.add(task)
+                if "Skipped" in task["status"]:
+                    skipped += 1
+                self.log_message(f"\n[PROCESS] [{processed}] Processing: {task['filename']}")
+                self._report_result(log_lines, task)
+        except Exception as e:
+            # A corrupt input archive, or a full disk under the output archive or the write-behind stage
+            self.log_message(f"[ERROR] Processing aborted: {e}")
+        finally:
+            stats.stop()
+            if writer is not None:
+                writer.close()
+                self.log_message(f"[INFO] Wrote {writer.count} image(s) to archive {output_path}")
+        
+        if watch:
+            scanned[0] = processed  # The watcher lists files itself
+            self.log_message(f"[WATCH] Stopped watching after {processed} image(s)")
+        elif self.stop_processing:
+            self.log_message(f"[SCAN] Scanned {scanned[0]} image(s) before stopping")
+        else:
+            self.log_message(f"[SCAN] Found {scanned[0]} image(s) in input {source}")
         
-        if not image_files:
-            messagebox.showinfo("Info", "No image files found in the selected folder")
+        if not scanned[0] and not watch:
+            self._post(messagebox.showinfo, "Info", f"No image files found in the selected {source}")
             self.log_message("[INFO] No image files found")
-            self.stop_button.config(state="disabled")
-            self.enable_inputs()
+            self._post(self._finish_processing)
             return
         
-        for idx, image_file in enumerate(image_files, 1):
-            # Check if stop was requested
-            if self.stop_processing:
-                self.log_message(f"\n[INFO] Processing stopped by user at image {idx}/{len(image_files)}")
-                break
-            
-            self.log_message(f"\n[PROCESS] [{idx}/{len(image_files)}] Processing: {image_file.name}")
-            self._process_single_image(image_file, output_path)
-        
         # Processing complete - re-enable inputs and disable stop button
+        cache_stats = f" {cache.stats()}" if cache is not None else ""
         if self.stop_processing:
-            self.log_message(f"\n[END] Image processing stopped! Processed {idx-1} of {len(image_files)} images.")
+            self.log_message(f"\n[INFO] Processing stopped by user after {processed} image(s)")
+            self.log_message(f"\n[END] Image processing stopped! Processed {processed} of {scanned[0]} scanned images.{cache_stats}")
         else:
-            self.log_message(f"\n[END] Image processing completed!")
-        
+            self.log_message(f"\n[END] Image processing completed!{cache_stats}")
+        if journal is not None and journal.resumed:
+            self.log_message(f"[RESUME] Skipped {journal.resumed} image(s) finished before the interruption")
+        if skipped:
+            self.log_message(f"[INFO] Skipped {skipped} up-to-date image(s)")
+        for line in stats.summary_lines():
+            self.log_message(line)
+        self.batch_stats = stats
+        self._post(self._insert_stats_row, stats)
+        
+        self._post(self._finish_processing)
+    
+    def _finish_processing(self):
+        """Re-enable inputs and disable the stop button once a batch ends"""
         self.stop_button.config(state="disabled")
         self.enable_inputs()
     
-    def _process_single_image(self, image_file, output_path):
-        try:
-            img = Image.open(image_file)
-            original_size = img.size
-            self.log_message(f"  [OPEN] Opened image - Size: {original_size[0]}x{original_size[1]}, Mode: {img.mode}, Format: {img.format}")
-            
-            # Get original DPI from input image
-            original_dpi = img.info.get('dpi', (72, 72))  # Default to 72 if not set
-            if isinstance(original_dpi, (tuple, list)) and len(original_dpi) >= 2:
-                original_dpi_str = f"{int(original_dpi[0])}x{int(original_dpi[1])}"
-            else:
-                original_dpi_str = "Default (72)"
-            self.log_message(f"  [DPI] Input image DPI: {original_dpi_str}")
-            
-            changes = {}
-            
-            # Get DPI
-            dpi_val = self.dpi_var.get().strip()
-            if dpi_val:
-                self.log_message(f"  [DPI] Will apply DPI: {dpi_val}")
-            
-            # Resize
-            width_val = self.width_var.get().strip()
-            height_val = self.height_var.get().strip()
-            
-            # Check if width/height are actual numbers (not auto-calculated text)
-            is_valid_width = width_val and width_val not in ["Auto-calculated per image", "Will be calculated"]
-            is_valid_height = height_val and height_val not in ["Auto-calculated per image", "Will be calculated"]
-            
-            # Manual mode: both width and height must be provided (validated earlier)
-            if is_valid_width and is_valid_height:
-                w = int(width_val)
-                h = int(height_val)
-                img = img.resize((w, h))
-                changes["size"] = f"{w}x{h}"
-                self.log_message(f"  [RESIZE] Resized to {w}x{h}")
-            elif self.percentage_var.get().strip():
-                percentage = float(self.percentage_var.get())
-                w, h = img.size
-                new_w = int(w * percentage / 100)
-                new_h = int(h * percentage / 100)
-                img = img.resize((new_w, new_h))
-                changes["size"] = f"{percentage}% -> {new_w}x{new_h}"
-                self.log_message(f"  [RESIZE] Scaled by {percentage}% -> {new_w}x{new_h}")
-            elif self.aspect_ratio_var.get().strip():
-                aspect_ratio = self.aspect_ratio_var.get().strip()
-                w, h = img.size
-                ar_w, ar_h = map(int, aspect_ratio.split(':'))
-                new_h = int(w * ar_h / ar_w)
-                img = img.resize((w, new_h))
-                changes["size"] = f"aspect {aspect_ratio} -> {w}x{new_h}"
-                self.log_message(f"  [RESIZE] Applied aspect ratio {aspect_ratio} -> {w}x{new_h}")
-            
-            # Convert format
-            format_val = self.format_var.get()
-            dpi_tuple = None
-            
-            # Prepare DPI parameter
-            if dpi_val:
-                try:
-                    dpi_int = int(dpi_val)
-                    dpi_tuple = (dpi_int, dpi_int)
-                except ValueError:
-                    self.log_message(f"  [ERROR] Invalid DPI value: {dpi_val}")
-                    dpi_tuple = None
-            
-            if format_val:
-                # FIX 4: Show exact format with correct extension in logs
-                self.log_message(f"  [FORMAT] Converting to {format_val}")
-                if format_val.upper() in ['JPEG', 'JPG'] and img.mode != 'RGB':
-                    img = img.convert('RGB')
-                    self.log_message(f"  [CONVERT] Converted image mode to RGB for {format_val}")
-                
-                format_upper = format_val.upper()
-                format_map = {
-                    'JPG': 'JPEG',
-                    'JPEG': 'JPEG',
-                    'PNG': 'PNG',
-                    'TIF': 'TIFF',
-                    'TIFF': 'TIFF',
-                    'WEBP': 'WEBP'
-                }
-                # FIX 4: Use the user-selected format for extension, not the PIL format
-                pil_format = format_map.get(format_upper, format_upper)
-                extension = format_val.lower()  # Keep user's chosen extension (.jpg or .jpeg, .tif or .tiff)
-                output_filename = f"{image_file.stem}.{extension}"
-                output_file = output_path / output_filename
-                
-                # FIX 4: Log with the user-selected format showing correct extension
-                self.log_message(f"  [SAVE] Saving as {format_val.upper()} (.{extension}) to {output_file}")
-                save_kwargs = {}
-                if dpi_tuple:
-                    save_kwargs['dpi'] = dpi_tuple
-                img.save(output_file, pil_format, **save_kwargs)
-                
-                changes["format"] = pil_format
-            else:
-                extension = image_file.suffix.lower().lstrip('.')
-                output_filename = image_file.name
-                output_file = output_path / output_filename
-                
-                self.log_message(f"  [SAVE] Saving with original format to {output_file}")
-                save_kwargs = {}
-                if dpi_tuple:
-                    save_kwargs['dpi'] = dpi_tuple
-                img.save(output_file, **save_kwargs)
-            
-            self.log_message(f"  [NEW SIZE] {img.size[0]}x{img.size[1]}")
-            
-            # Log DPI info
-            if dpi_val:
-                self.log_message(f"  [DPI] Output DPI applied: {dpi_val}x{dpi_val}")
-            else:
-                self.log_message(f"  [DPI] Output DPI: unchanged (kept original DPI)")
-            
-            # Add to results
-            task = {
-                "filename": image_file.name,
-                "original_size": f"{original_size[0]}x{original_size[1]}",
-                "new_size": f"{img.size[0]}x{img.size[1]}",
-                "changes": changes,
-                "status": "✓ Completed"
-            }
-            self.tasks.append(task)
-            self._update_table(task)
-            self.log_message(f"  [SUCCESS] Image processed successfully")
-        
-        except Exception as e:
-            self.log_message(f"  [ERROR] Failed to process: {str(e)}")
-            task = {
-                "filename": image_file.name,
-                "original_size": "N/A",
-                "new_size": "N/A",
-                "changes": {},
-                "status": f"✗ Failed: {str(e)}"
-            }
-            self.tasks.append(task)
-            self._update_table(task)
+    def _report_result(self, log_lines, task):
+        """Replay a worker's log lines and add its result to the table"""
+        for line in log_lines:
+            self.log_message(line)
+        self._update_table(task)
     
     def _update_table(self, task):
+        """Queue a result row for the table (safe from any thread)"""
+        self.ui_queue.put((EVENT_RESULT, task))
+    
+    def _insert_result_row(self, task):
         changes_str = ", ".join([f"{k}: {v}" for k, v in task["changes"].items()])
-        status_color = "green" if "Completed" in task["status"] else "red"
+        # Color the status cell
+        if "Completed" in task["status"]:
+            status_tag = "completed"
+        elif "Skipped" in task["status"]:
+            status_tag = "skipped"
+        else:
+            status_tag = "failed"
         
         item_id = self.tree.insert("", "end", values=(
             task["filename"],
             task["original_size"],
             task["new_size"],
             changes_str,
-            task["status"]
-        ))
-        
-        # Color the status cell
-        if "Completed" in task["status"]:
-            self.tree.item(item_id, tags=("completed",))
-        else:
-            self.tree.item(item_id, tags=("failed",))
-        
-        self.tree.tag_configure("completed", foreground="green")
-        self.tree.tag_configure("failed", foreground="red")
+            task["status"],
+            f"{sum(task['timings'].values()) * 1000:.0f} ms" if task.get("timings") else ""
+        ), tags=(status_tag,))
+        self._append_result_row(item_id)
+    
+    def _insert_stats_row(self, stats):
+        """Summarise the batch throughput and slowest stages below its results"""
+        report = stats.to_dict()
+        stages = ", ".join(f"{stage} p50 {values['p50'] * 1000:.0f}/p95 {values['p95'] * 1000:.0f}/"
+                           f"max {values['max'] * 1000:.0f} ms" for stage, values in report["stages"].items())
+        item_id = self.tree.insert("", "end", values=(
+            f"Batch: {report['images']} image(s)",
+            f"{report['mb_read_per_sec']:.1f} MB/s read",
+            f"{report['mb_written_per_sec']:.1f} MB/s written",
+            stages,
+            f"{report['images_per_sec']:.1f} images/s",
+            f"{report['elapsed']:.1f} s"
+        ), tags=("stats",))
+        self._append_result_row(item_id)
+    
+    def _append_result_row(self, item_id):
+        # Keep the table bounded like self.tasks
+        self.result_rows.append(item_id)
+        if len(self.result_rows) > self.results_capacity:
+            self.tree.delete(self.result_rows.popleft())
 
 
 if __name__ == "__main__":
+    # Imported here rather than at the top: only a frozen build needs it before
+    # the window opens, and the process engine imports it when first used
+    import multiprocessing
+
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ImageProcessorApp(root)
     root.mainloop()
\ No newline at end of file